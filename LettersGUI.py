@@ -1,16 +1,13 @@
 import os
-import pytesseract
-from PIL import Image
-from docx.shared import Pt
-from fitz import Tools
-import re
+from lettersocr.pipeline import find_pdfs
+from lettersocr.review import ReviewPipeline
+from PIL import ImageTk
 import xlsxwriter
-from docx import Document
-from persiantools.jdatetime import JalaliDate
-import fitz
 import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
-from pdf2image import convert_from_path
+from tkinter import filedialog, messagebox
+
+# Milliseconds between checks for a prepared letter or finished renames
+POLL_INTERVAL = 100
 
 
 class PDFConverterApp:
@@ -32,102 +29,174 @@ class PDFConverterApp:
             master, text="Convert PDFs", command=self.convert_pdfs)
         self.convert_button.pack()
 
+        self.status_label = tk.Label(master, text="")
+        self.status_label.pack()
+
+        # Review area: page previews, then the editable fields
+        self.preview_frame = tk.Frame(master)
+        self.preview_frame.pack(padx=5, pady=5)
+
+        fields_frame = tk.Frame(master)
+        fields_frame.pack(fill=tk.X, padx=5)
+        self.subject_var = tk.StringVar()
+        self.date_var = tk.StringVar()
+        self.subject_info = tk.StringVar()
+        self.date_info = tk.StringVar()
+        for row, (text, var, info) in enumerate((
+                ("Subject:", self.subject_var, self.subject_info),
+                ("Date:", self.date_var, self.date_info))):
+            tk.Label(fields_frame, text=text).grid(row=row, column=0,
+                                                   sticky=tk.W)
+            tk.Entry(fields_frame, textvariable=var, width=60,
+                     justify=tk.RIGHT).grid(row=row, column=1, sticky=tk.EW)
+            tk.Label(fields_frame, textvariable=info).grid(row=row, column=2,
+                                                           sticky=tk.W)
+        fields_frame.columnconfigure(1, weight=1)
+
+        buttons_frame = tk.Frame(master)
+        buttons_frame.pack(pady=5)
+        self.confirm_button = tk.Button(
+            buttons_frame, text="Confirm (Enter)", command=self.confirm_letter,
+            state=tk.DISABLED)
+        self.confirm_button.pack(side=tk.LEFT, padx=5)
+        self.skip_button = tk.Button(
+            buttons_frame, text="Skip", command=self.skip_letter,
+            state=tk.DISABLED)
+        self.skip_button.pack(side=tk.LEFT, padx=5)
+        master.bind('<Return>', lambda event: self.confirm_letter())
+
+        self.pipeline = None
+        self.pending = None
+        self.letter = None
+        self.reviewed = 0
+        self.pdf_folder_path = None
+        self.photos = []
+        master.protocol("WM_DELETE_WINDOW", self.close)
+
+    # Stops preparing letters; confirmed renames still finish
+    def close(self):
+        if self.pipeline is not None:
+            self.pipeline.close()
+        self.master.destroy()
+
     def browse_folder(self):
         folder_selected = filedialog.askdirectory()
         self.folder_path_entry.delete(0, tk.END)
         self.folder_path_entry.insert(0, folder_selected)
 
+    # Starts the review: letters are OCRed in the background while the
+    # operator confirms the ones already prepared
     def convert_pdfs(self):
         pdf_folder_path = self.folder_path_entry.get()
-        
+
         if not pdf_folder_path:
             messagebox.showerror("Error", "Please select a PDF folder.")
             return
 
-        data = []
-
-        for root, dirs, files in os.walk(pdf_folder_path):
-            for file in files:
-                if file.endswith('.pdf'):
-                    pdf_path = os.path.join(root, file)
-                    print(f'Converting {pdf_path} to Word document...')
-                    images = convert_from_path(pdf_path)
-                    doc = Document()
-                    paragraph_style = doc.styles['Normal']
-                    paragraph_style.font.size = Pt(12)
-                    paragraph_style.font.name = 'Times New Roman'
-                    for i, image in enumerate(images):
-                        # Save the image as a temporary file
-                        image_path = f'temp_image_{i}.jpg'
-                        image.save(image_path, 'JPEG')
-
-                        # Extract text using OCR
-                        text = pytesseract.image_to_string(
-                            Image.open(image_path), lang='fas')
-
-                        # Add a new page to the Word document
-                        if i > 0:
-                            doc.add_page_break()
-
-                        # Add the extracted text to the Word document
-                        paragraph = doc.add_paragraph(text)
-                        paragraph.style = paragraph_style
-
-                    try:
-                        
-                        subject = ''
-                        date_str = ''
-                        for para in doc.paragraphs:
-                            if 'موضوع' in para.text:
-                                subject = para.text.split(
-                                    'موضوع')[1][:30].strip()
-                                subject = re.sub(
-                                    r'[\\.,#+[\](\)\\/:*?<>|]', '-', subject)
-                                # Add PDF name to the beginning of the subject with a hyphen
-                                subject = f"{os.path.splitext(file)[0]}-{subject}"
-
-                            elif 'تاریخ' in para.text:
-                                date_str = para.text.split(
-                                    'تاریخ')[1][:15].strip()
-                                date_str = re.sub(
-                                    r'[\\.,-_#+[\](\)\\/:*?<>|]', '-', date_str)
-                        pdf_doc = fitz.open(pdf_path)
-
-                        for page_num in range(pdf_doc.page_count):
-                            page = pdf_doc[page_num]
-                            pix = page.get_pixmap()
-                            img = Image.frombytes(
-                                "RGB", (pix.width, pix.height), pix.samples)
-                            img.show()
-
-                        # Wait for user to view and close
-                        confirm_subject = messagebox.askyesno("Subject Confirmation", f"Extracted subject: {subject}. Do you want to change it?")
-                        if confirm_subject:
-                            new_subject = simpledialog.askstring("New Subject", "Enter new subject:")
-                            if new_subject:
-                                subject = new_subject
-
-                        confirm_date = messagebox.askyesno("Date Confirmation", f"Extracted date: {date_str}. Do you want to change it?")
-                        if confirm_date:
-                            new_date = simpledialog.askstring("New Date", "Enter new date:")
-                            if new_date:
-                                date_str = new_date
-
-                        # Convert Jalali date to Gregorian
-                        date_gregorian = self.convert_to_gregorian(date_str)
-
-                        data.append((subject, date_str, date_gregorian))
-
-                        # Rename the PDF file with the new subject
-                        new_pdf_name = f"{subject}.pdf"
-                        new_pdf_path = os.path.join(root, new_pdf_name)
-                        os.rename(pdf_path, new_pdf_path)
-
-                    except Exception as e:
-                        print(f"Error processing {pdf_path}: {e}")
+        pdf_paths = find_pdfs([pdf_folder_path])
+        if not pdf_paths:
+            messagebox.showerror("Error", "No PDF files found.")
+            return
+
+        self.pdf_folder_path = pdf_folder_path
+        self.reviewed = 0
+        self.pipeline = ReviewPipeline(pdf_paths)
+        self.convert_button.config(state=tk.DISABLED)
+        self.show_next_letter()
+
+    def show_next_letter(self):
+        self.letter = None
+        self.confirm_button.config(state=tk.DISABLED)
+        self.skip_button.config(state=tk.DISABLED)
+        self.pending = self.pipeline.next_letter()
+        if self.pending is None:
+            self.clear_preview()
+            self.finish_review()
+        else:
+            self.wait_for_letter()
+
+    # Polls the prepared letter from the Tk loop instead of blocking on it
+    def wait_for_letter(self):
+        if not self.pending.done():
+            self.status_label.config(
+                text=f"Reading letter {self.reviewed + 1} of "
+                     f"{self.pipeline.total}...")
+            self.master.after(POLL_INTERVAL, self.wait_for_letter)
+            return
+
+        letter = self.pending.result()
+        self.pending = None
+        if letter['error']:
+            print(f"Error processing {letter['path']}: {letter['error']}")
+            self.reviewed += 1
+            self.show_next_letter()
+            return
+        self.show_letter(letter)
+
+    def show_letter(self, letter):
+        self.letter = letter
+        self.clear_preview()
+        # PhotoImages must be created on the Tk thread and kept referenced
+        self.photos = [ImageTk.PhotoImage(image)
+                       for image in letter['thumbnails']]
+        for photo in self.photos:
+            tk.Label(self.preview_frame, image=photo).pack(side=tk.RIGHT,
+                                                           padx=2)
+        hidden = letter['page_count'] - len(self.photos)
+        if hidden > 0:
+            tk.Label(self.preview_frame,
+                     text=f"+{hidden} more pages").pack(side=tk.RIGHT)
+
+        self.subject_var.set(letter['subject'])
+        self.date_var.set(letter['date'])
+        fields = letter['fields']
+        for name, info in (('subject', self.subject_info),
+                           ('date', self.date_info)):
+            field = fields[name]
+            info.set(f"{field['confidence']:.0%}" if field else "not found")
+
+        self.status_label.config(
+            text=f"Letter {self.reviewed + 1} of {self.pipeline.total}: "
+                 f"{os.path.basename(letter['path'])} "
+                 f"({self.pipeline.ready_count()} ready ahead)")
+        self.confirm_button.config(state=tk.NORMAL)
+        self.skip_button.config(state=tk.NORMAL)
+
+    def clear_preview(self):
+        for widget in self.preview_frame.winfo_children():
+            widget.destroy()
+        self.photos = []
+
+    # Hands the reviewed values to the pipeline and moves on at once; the
+    # rename happens in the background
+    def confirm_letter(self):
+        if self.letter is None:
+            return
+        self.pipeline.confirm(self.letter, self.subject_var.get().strip(),
+                              self.date_var.get().strip())
+        self.reviewed += 1
+        self.show_next_letter()
+
+    def skip_letter(self):
+        if self.letter is None:
+            return
+        self.reviewed += 1
+        self.show_next_letter()
+
+    def finish_review(self):
+        pending = self.pipeline.pending_confirmations()
+        if pending:
+            self.status_label.config(text=f"Renaming {pending} files...")
+            self.master.after(POLL_INTERVAL, self.finish_review)
+            return
+
+        data = self.pipeline.results()
+        self.pipeline.close()
+        self.pipeline = None
 
         # Create Excel file and add worksheet
-        excel_file_path = os.path.join(pdf_folder_path, 'exported_data.xlsx')
+        excel_file_path = os.path.join(self.pdf_folder_path,
+                                       'exported_data.xlsx')
         workbook = xlsxwriter.Workbook(excel_file_path)
         worksheet = workbook.add_worksheet()
 
@@ -145,18 +214,11 @@ class PDFConverterApp:
 
         workbook.close()
 
+        self.status_label.config(text="")
+        self.convert_button.config(state=tk.NORMAL)
         messagebox.showinfo("Conversion Complete",
                             "PDFs converted and data exported successfully.")
 
-    def convert_to_gregorian(self, persian_date):
-        try:
-            year, month, day = map(int, persian_date.split('-'))
-            gregorian_date = JalaliDate(year, month, day).to_gregorian()
-            return gregorian_date.strftime("%d/%m/%Y")
-        except Exception as e:
-            print(f"Error converting date {persian_date} to Gregorian: {e}")
-            return ''
-
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,50 +1,28 @@
-import os
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import sys
+from lettersocr.pipeline import convert_pdfs, find_pdfs
+
 
 # Function to convert PDF to Word document
 def convert_pdf_to_word(pdf_path):
-    # Convert the PDF to images
-    images = convert_from_path(pdf_path)
-
-    # Create a new Word document
-    doc = Document()
-    paragraph_format = doc.styles['Normal'].paragraph_format
-    paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-    # Loop through each image and extract text using OCR
-    for i, image in enumerate(images):
-        # Save the image as a temporary file
-        image_path = f'temp_image_{i}.jpg'
-        image.save(image_path, 'JPEG')
-
-        # Extract text using OCR
-        text = pytesseract.image_to_string(Image.open(image_path), lang='fas+equ')
-
-        # Add a new page to the Word document
-        if i > 0:
-            doc.add_page_break()
-
-        # Add the extracted text to the Word document
-        paragraph = doc.add_paragraph(text)
-        paragraph.style = doc.styles['Normal']
-
-    # Save the Word document with the same name as the PDF file
-    docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-    doc.save(docx_path)
-
-# Set the path to the folder containing the PDF files
-pdf_folder_path = input('Please enter the folder address: ')
-
-# Traverse through the directory and subdirectories
-for root, dirs, files in os.walk(pdf_folder_path):
-    for file in files:
-        # Check if the file is a PDF file
-        if file.endswith('.pdf'):
-            pdf_path = os.path.join(root, file)
-            print(f'Converting {pdf_path} to Word document...')
-            convert_pdf_to_word(pdf_path)
+    return not convert_pdfs([pdf_path], 'fas+equ', skip_existing=False)
+
+
+def print_progress(value):
+    print(f"\r{value:5.1f}%", end='', file=sys.stderr, flush=True)
+
+
+def print_file_done(pdf_path, success):
+    print(f"\r{'Converted' if success else 'Failed to convert'} {pdf_path}")
+
+
+if __name__ == "__main__":
+    # Set the path to the folder containing the PDF files
+    pdf_folder_path = input('Please enter the folder address: ')
+
+    # Traverse through the directory and subdirectories; every PDF is
+    # converted again, even when its Word document exists
+    pdf_files = find_pdfs([pdf_folder_path])
+    for pdf_path in pdf_files:
+        print(f'Converting {pdf_path} to Word document...')
+    convert_pdfs(pdf_files, 'fas+equ', progress_callback=print_progress,
+                 file_callback=print_file_done, skip_existing=False)
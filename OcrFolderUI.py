@@ -1,69 +1,60 @@
-import os
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-from docx import Document
-from tkinter import Tk, Label, Button, filedialog
 import multiprocessing
-import tempfile
+from tkinter import Tk, Label, Button, filedialog, messagebox
+from lettersocr.gui_runner import BackgroundConversion
+from lettersocr.pipeline import convert_pdfs, find_pdfs
+from lettersocr.startup import warm_up_in_background
 
-# Function to check if a corresponding docx file exists
+conversion = None
 
-
-def docx_exists(pdf_path):
-    docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-    return os.path.exists(docx_path)
-
-# Function to convert PDF to Word document only if a corresponding docx file doesn't exist
+# Function to convert PDF to Word document only if a corresponding docx file doesn't exist.
+# Pages are checkpointed in the folder's job manifest, so a rerun resumes from
+# the first unfinished page.
 
 
 def convert_pdf_to_word(pdf_path):
-    if not docx_exists(pdf_path):
-        try:
-            # Convert the PDF to images
-            images = convert_from_path(pdf_path)
+    return not convert_pdfs([pdf_path], 'fas+equ', workers=None)
 
-            # Create a new Word document
-            doc = Document()
 
-            # Loop through each image and extract text using OCR
-            for i, image in enumerate(images):
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    image_path = temp_file.name
-                    image.save(image_path, 'JPEG')
+def update_progress(value):
+    result_label.config(text=f"Converting... {value:.0f}%")
 
-                # Extract text using OCR
-                text = pytesseract.image_to_string(
-                    Image.open(image_path), lang='fas+equ')
 
-                # Add the extracted text to the Word document
-                doc.add_paragraph(text)
+# Shows an error of the background conversion; runs on the Tk thread
+def show_error(message):
+    messagebox.showerror("Error", message)
 
-                # Remove the temporary file
-                os.remove(image_path)
 
-            # Save the Word document with the same name as the PDF file
-            docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-            doc.save(docx_path)
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {e}")
+def conversion_done(failed_files, cancelled):
+    convert_button.config(state='normal')
+    if cancelled:
+        result_label.config(text="Conversion cancelled.")
+    elif failed_files:
+        result_label.config(
+            text=f"Conversion complete, {len(failed_files)} file(s) failed.")
+    else:
+        result_label.config(text="Conversion complete.")
 
-# Function to handle folder selection and OCR on all PDF files in the folder
+# Function to handle folder selection and OCR on all PDF files in the folder.
+# The files are converted in the background, so the window stays responsive.
 
 
 def select_folder_and_convert():
+    global conversion
     folder_path = filedialog.askdirectory()
     if folder_path:
-        pdf_files = [os.path.join(root, file) for root, _, files in os.walk(
-            folder_path) for file in files if file.endswith('.pdf')]
-        with multiprocessing.Pool() as pool:
-            pool.map(convert_pdf_to_word, pdf_files)
-        result_label.config(text="Conversion complete.")
+        pdf_files = find_pdfs([folder_path])
+        conversion = BackgroundConversion(
+            result_label, on_progress=update_progress, on_error=show_error,
+            on_done=conversion_done)
+        conversion.start(pdf_files, 'fas+equ')
+        convert_button.config(state='disabled')
+        result_label.config(text="Converting...")
 
 # Create UI
 
 
 def create_ui():
+    global convert_button, result_label
     root = Tk()
     root.title("PDF to Docx Converter")
 
@@ -76,13 +67,24 @@ def create_ui():
         root, text="Select Folder and Convert", command=select_folder_and_convert)
     convert_button.pack(pady=10)
 
-    global result_label
     result_label = Label(root, text="")
     result_label.pack(pady=10)
 
+    # Stop a running conversion before the window goes away
+    def close():
+        if conversion is not None:
+            conversion.cancel()
+        root.destroy()
+    root.protocol("WM_DELETE_WINDOW", close)
+
+    # Load the OCR stack while the user picks a folder
+    warm_up_in_background()
+
     # Run the UI loop
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # Needed for the worker pool in a frozen executable
+    multiprocessing.freeze_support()
     create_ui()
@@ -1,125 +1,14 @@
+import time
+# Taken before any other import, for --profile-startup
+STARTED = time.perf_counter()
+
 import os
-import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
-from pdf2image import convert_from_path
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import multiprocessing
-import tempfile
-import cv2
-import numpy as np
-from threading import Thread
-
-
-def set_rtl(paragraph):
-    pPr = paragraph._p.get_or_add_pPr()
-    bidi = OxmlElement('w:bidi')
-    pPr.append(bidi)
-
-def docx_exists(pdf_path):
-    docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-    return os.path.exists(docx_path)
-
-
-def preprocess_image(image):
-    image = image.convert('L')
-    image = ImageEnhance.Contrast(image).enhance(2)
-    image = image.filter(ImageFilter.SHARPEN)
-    return image
-
-
-def detect_and_process_tables(image):
-    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(
-        gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
-
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-    horizontal_lines = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    vertical_lines = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
-
-    table_mask = cv2.bitwise_or(horizontal_lines, vertical_lines)
-    contours, _ = cv2.findContours(
-        table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    table_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 1000]
-
-    return table_contours
-
-
-def convert_pdf_to_word(pdf_path, language, save_dir, progress_callback=None):
-    output_path = os.path.join(save_dir, os.path.basename(
-        os.path.splitext(pdf_path)[0]) + '.docx')
-    if not os.path.exists(output_path):
-        try:
-            images = convert_from_path(pdf_path)
-            doc = Document()
-
-            style = doc.styles['Normal']
-            style.font.name = 'Arial' if language != 'fas' else 'B Nazanin'
-            style.font.size = Pt(11)
-
-            total_images = len(images)
-            for i, image in enumerate(images):
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                        image_path = temp_file.name
-                        image = preprocess_image(image)
-                        image.save(image_path, 'JPEG')
-
-                    custom_config = r'--oem 3 --psm 6'
-                    if language == 'fas':
-                        custom_config += ' -l fas+ara+equ'
-                    elif language == 'eng':
-                        custom_config += ' -l eng'
-                    elif language == 'deu':
-                        custom_config += ' -l deu'
-                    elif language == 'math':
-                        custom_config += ' -l eng+equ'
-
-                    text = pytesseract.image_to_string(
-                        image, config=custom_config)
-
-                    # Split text into paragraphs and add them to the document
-                    paragraphs = text.split('\n\n')
-                    for para_text in paragraphs:
-                        paragraph = doc.add_paragraph(para_text.strip())
-                        if language == 'fas':
-                            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-                        else:
-                            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-
-                    os.remove(image_path)
-
-                    if progress_callback:
-                        progress_callback((i + 1) / total_images * 100)
-                except Exception as e:
-                    print(f"Error processing page {
-                          i+1} of {pdf_path}: {str(e)}")
-
-            doc.save(output_path)
-
-            # Verify the docx file
-            try:
-                Document(output_path)
-                return True
-            except Exception as e:
-                print(f"Error verifying the created document {
-                      output_path}: {str(e)}")
-                return False
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {str(e)}")
-            return False
-    return True
-
+from lettersocr.gui_runner import BackgroundConversion
+from lettersocr.startup import StartupProfile, warm_up_in_background
 
 
 class SabaatPDFOCR(tk.Tk):
@@ -134,7 +23,9 @@ class SabaatPDFOCR(tk.Tk):
         # Replace with your icon path
         self.iconbitmap(r"F:\Code\LettersOCR\icon BLACK.ico")
 
+        self.conversion = None
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_widgets(self):
         style = ttk.Style()
@@ -144,6 +35,8 @@ class SabaatPDFOCR(tk.Tk):
         style.configure('TButton', background='#FFFFFF', foreground='#000000')
         style.configure('TRadiobutton', background='#E0E0E0',
                         foreground='#000000')
+        style.configure('TCheckbutton', background='#E0E0E0',
+                        foreground='#000000')
         style.configure('TEntry', fieldbackground='#FFFFFF',
                         foreground='#000000')
 
@@ -164,6 +57,10 @@ class SabaatPDFOCR(tk.Tk):
         for text, value in langs:
             ttk.Radiobutton(
                 lang_frame, text=text, variable=self.lang_var, value=value).pack(side=tk.LEFT)
+        # With detection on, the language above is only a hint
+        self.auto_language_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(main_frame, text="Detect the language of each page",
+                        variable=self.auto_language_var).pack(anchor=tk.W)
 
         # File or folder selection
         self.file_type_var = tk.StringVar(value="folder")
@@ -182,6 +79,14 @@ class SabaatPDFOCR(tk.Tk):
         ttk.Button(input_frame, text="Browse",
                    command=self.browse_input).pack(side=tk.LEFT)
 
+        # Worker processes for page-level parallel OCR
+        workers_frame = ttk.Frame(main_frame)
+        workers_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(workers_frame, text="Workers:").pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(workers_frame, from_=1, to=os.cpu_count() or 1,
+                    textvariable=self.workers_var, width=5).pack(side=tk.LEFT)
+
         # Output directory selection
         output_frame = ttk.Frame(main_frame)
         output_frame.pack(fill=tk.X, pady=5)
@@ -191,10 +96,20 @@ class SabaatPDFOCR(tk.Tk):
         ttk.Button(output_frame, text="Browse",
                    command=self.browse_output).pack(side=tk.LEFT)
 
-        # Convert button
-        convert_button = ttk.Button(
-            main_frame, text="Convert", command=self.start_conversion)
-        convert_button.pack(fill=tk.X, pady=10)
+        # Convert, pause and cancel buttons
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.pack(fill=tk.X, pady=10)
+        self.convert_button = ttk.Button(
+            buttons_frame, text="Convert", command=self.start_conversion)
+        self.convert_button.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.pause_button = ttk.Button(
+            buttons_frame, text="Pause", command=self.toggle_pause,
+            state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT)
+        self.cancel_button = ttk.Button(
+            buttons_frame, text="Cancel", command=self.cancel_conversion,
+            state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT)
 
         # Progress bar
         self.progress_var = tk.DoubleVar()
@@ -249,39 +164,75 @@ class SabaatPDFOCR(tk.Tk):
 
         self.progress_var.set(0)
         self.status_label.config(text="Converting...")
-
-    
-
-        Thread(target=self.process_files, args=(
-            pdf_files, language, output_path)).start()
-
-    def process_files(self, pdf_files, language, save_dir):
+        self.converted_count = 0
+        self.total_files = len(pdf_files)
+
+        self.conversion = BackgroundConversion(
+            self, on_progress=self.update_progress, on_file=self.file_done,
+            on_error=self.show_error,
+            on_done=lambda failed_files, cancelled: self.conversion_done(
+                pdf_files, output_path, failed_files, cancelled))
+        self.conversion.start(pdf_files, language, output_path,
+                              workers=self.workers_var.get(),
+                              auto_language=self.auto_language_var.get())
+        self.convert_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL, text="Pause")
+        self.cancel_button.config(state=tk.NORMAL)
+
+    # Shows an error of the background conversion; runs on the Tk thread
+    def show_error(self, message):
+        messagebox.showerror("Error", message)
+
+    def toggle_pause(self):
+        if self.conversion.control.paused:
+            self.conversion.resume()
+            self.pause_button.config(text="Pause")
+            self.status_label.config(text="Converting...")
+        else:
+            self.conversion.pause()
+            self.pause_button.config(text="Resume")
+            self.status_label.config(
+                text="Paused, finishing the pages in progress...")
+
+    def cancel_conversion(self):
+        self.conversion.cancel()
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...")
+
+    def file_done(self, pdf_path, success):
+        if success:
+            self.converted_count += 1
+        if not self.conversion.control.paused and \
+                not self.conversion.control.cancelled:
+            self.status_label.config(
+                text=f"Converting... {self.converted_count}/"
+                     f"{self.total_files} files done")
+
+    # Runs on the Tk thread once the background conversion has ended
+    def conversion_done(self, pdf_files, save_dir, failed_files, cancelled):
+        self.convert_button.config(state=tk.NORMAL)
+        self.pause_button.config(state=tk.DISABLED, text="Pause")
+        self.cancel_button.config(state=tk.DISABLED)
         total_files = len(pdf_files)
-        converted_files = 0
-        failed_files = []
 
-        for pdf_file in pdf_files:
-            try:
-                success = convert_pdf_to_word(
-                    pdf_file, language, save_dir, self.update_progress)
-                if success:
-                    converted_files += 1
-                else:
-                    failed_files.append(pdf_file)
-            except Exception as e:
-                print(f"Error processing {pdf_file}: {str(e)}")
-                failed_files.append(pdf_file)
+        if cancelled:
+            self.status_label.config(
+                text=f"Conversion cancelled. {self.converted_count}/"
+                     f"{total_files} files converted. Converting again "
+                     "resumes where it stopped.")
+            return
 
-            self.progress_var.set((converted_files / total_files) * 100)
-            self.update_idletasks()
+        converted_files = total_files - len(failed_files)
 
         if failed_files:
             error_message = "The following files failed to convert or verify:\n" + \
                 "\n".join(failed_files)
             messagebox.showerror("Conversion Errors", error_message)
 
-        self.status_label.config(text=f"Conversion complete. {
-                                converted_files}/{total_files} files converted successfully.")
+        self.status_label.config(
+            text=f"Conversion complete. {converted_files}/{total_files} "
+                 "files converted successfully.")
 
         # Try to open one of the successfully converted files
         if converted_files > 0:
@@ -305,9 +256,41 @@ class SabaatPDFOCR(tk.Tk):
 
     def update_progress(self, value):
         self.progress_var.set(value)
-        self.update_idletasks()
+
+    # Stops a running conversion before the window goes away
+    def close(self):
+        if self.conversion is not None:
+            self.conversion.cancel()
+        self.destroy()
+
+
+# Function to report the startup timeline once the warm-up is done and close
+# the app. The windowed executable has no console, so the report is shown in
+# a dialog there.
+def finish_startup_profile(app, profile, warm_up_thread):
+    if warm_up_thread.is_alive():
+        app.after(20, finish_startup_profile, app, profile, warm_up_thread)
+        return
+    report = profile.report()
+    if sys.stdout is None:
+        messagebox.showinfo("Startup profile", report)
+    else:
+        print(report)
+    app.destroy()
 
 
 if __name__ == "__main__":
+    # Needed for the worker pool in the frozen executable
+    multiprocessing.freeze_support()
+    profile = StartupProfile(STARTED) if '--profile-startup' in sys.argv[1:] else None
+    if profile:
+        profile.mark('modules imported')
     app = SabaatPDFOCR()
+    if profile:
+        app.update()
+        profile.mark('window shown')
+    # Load the OCR stack while the user picks files
+    warm_up_thread = warm_up_in_background(profile)
+    if profile:
+        app.after(0, finish_startup_profile, app, profile, warm_up_thread)
     app.mainloop()
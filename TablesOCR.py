@@ -1,136 +1,7 @@
 import os
-import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
-from pdf2image import convert_from_path
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import multiprocessing
-import tempfile
-import cv2
-import numpy as np
-from threading import Thread
-
-
-def set_rtl(paragraph):
-    pPr = paragraph._p.get_or_add_pPr()
-    bidi = OxmlElement('w:bidi')
-    pPr.append(bidi)
-
-
-def docx_exists(pdf_path):
-    docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-    return os.path.exists(docx_path)
-
-
-def preprocess_image(image):
-    image = image.convert('L')
-    image = ImageEnhance.Contrast(image).enhance(2)
-    image = image.filter(ImageFilter.SHARPEN)
-    return image
-
-
-def detect_and_process_tables(image):
-    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(
-        gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
-
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-    horizontal_lines = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    vertical_lines = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
-
-    table_mask = cv2.bitwise_or(horizontal_lines, vertical_lines)
-    contours, _ = cv2.findContours(
-        table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    table_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 1000]
-
-    table_images = []
-    for contour in table_contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        table_image = image.crop((x, y, x+w, y+h))
-        table_images.append(table_image)
-
-    return table_images
-
-
-def convert_pdf_to_word(pdf_path, language, save_dir, progress_callback=None):
-    output_path = os.path.join(save_dir, os.path.basename(
-        os.path.splitext(pdf_path)[0]) + '.docx')
-    if not os.path.exists(output_path):
-        try:
-            images = convert_from_path(pdf_path)
-            doc = Document()
-
-            style = doc.styles['Normal']
-            style.font.name = 'Arial' if language != 'fas' else 'B Nazanin'
-            style.font.size = Pt(11)
-
-            total_images = len(images)
-            for i, image in enumerate(images):
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                        image_path = temp_file.name
-                        image = preprocess_image(image)
-                        image.save(image_path, 'JPEG')
-
-                    custom_config = r'--oem 3 --psm 6'
-                    if language == 'fas':
-                        custom_config += ' -l fas+ara+equ'
-                    elif language == 'eng':
-                        custom_config += ' -l eng'
-                    elif language == 'deu':
-                        custom_config += ' -l deu'
-                    elif language == 'math':
-                        custom_config += ' -l eng+equ'
-
-                    table_images = detect_and_process_tables(image)
-                    for table_image in table_images:
-                        table_text = pytesseract.image_to_string(
-                            table_image, config=custom_config)
-                        table_text = table_text.replace('\t', '|')
-                        table_lines = table_text.split('\n')
-
-                        # Create a table in the Word document
-                        table = doc.add_table(rows=len(table_lines), cols=1)
-                        for row_idx, row_text in enumerate(table_lines):
-                            row_cells = table.rows[row_idx].cells
-                            row_cells[0].text = row_text.strip()
-                            if language == 'fas':
-                                row_cells[0].paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-                            else:
-                                row_cells[0].paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-
-                    os.remove(image_path)
-
-                    if progress_callback:
-                        progress_callback((i + 1) / total_images * 100)
-                except Exception as e:
-                    print(f"Error processing page {
-                          i+1} of {pdf_path}: {str(e)}")
-
-            doc.save(output_path)
-
-            # Verify the docx file
-            try:
-                Document(output_path)
-                return True
-            except Exception as e:
-                print(f"Error verifying the created document {
-                      output_path}: {str(e)}")
-                return False
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {str(e)}")
-            return False
-    return True
+from lettersocr.gui_runner import BackgroundConversion
 
 
 class SabaatPDFOCR(tk.Tk):
@@ -145,7 +16,9 @@ class SabaatPDFOCR(tk.Tk):
         # Replace with your icon path
         self.iconbitmap(r"F:\Code\LettersOCR\icon BLACK.ico")
 
+        self.conversion = None
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_widgets(self):
         style = ttk.Style()
@@ -202,10 +75,20 @@ class SabaatPDFOCR(tk.Tk):
         ttk.Button(output_frame, text="Browse",
                    command=self.browse_output).pack(side=tk.LEFT)
 
-        # Convert button
-        convert_button = ttk.Button(
-            main_frame, text="Convert", command=self.start_conversion)
-        convert_button.pack(fill=tk.X, pady=10)
+        # Convert, pause and cancel buttons
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.pack(fill=tk.X, pady=10)
+        self.convert_button = ttk.Button(
+            buttons_frame, text="Convert", command=self.start_conversion)
+        self.convert_button.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.pause_button = ttk.Button(
+            buttons_frame, text="Pause", command=self.toggle_pause,
+            state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT)
+        self.cancel_button = ttk.Button(
+            buttons_frame, text="Cancel", command=self.cancel_conversion,
+            state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT)
 
         # Progress bar
         self.progress_var = tk.DoubleVar()
@@ -239,7 +122,6 @@ class SabaatPDFOCR(tk.Tk):
 
     def update_progress(self, value):
         self.progress_var.set(value)
-        self.update_idletasks()
 
     def start_conversion(self):
         input_path = self.input_entry.get()
@@ -251,44 +133,60 @@ class SabaatPDFOCR(tk.Tk):
                 "Error", "Please select input and output paths")
             return
 
-        self.status_label.config(text="Conversion in progress...")
-        self.progress_var.set(0)
-        self.update_idletasks()
-
         if self.file_type_var.get() == "file":
-            self.convert_file(input_path, language, output_dir)
+            if not input_path.lower().endswith('.pdf'):
+                messagebox.showerror("Error", "Selected file is not a PDF")
+                return
+            pdf_files = [input_path]
         else:
-            self.convert_folder(input_path, language, output_dir)
-
-    def convert_file(self, pdf_path, language, output_dir):
-        if not pdf_path.lower().endswith('.pdf'):
-            messagebox.showerror("Error", "Selected file is not a PDF")
-            return
-
-        success = convert_pdf_to_word(
-            pdf_path, language, output_dir, self.update_progress)
-        self.show_conversion_result(success)
-
-    def convert_folder(self, folder_path, language, output_dir):
-        pdf_files = [f for f in os.listdir(
-            folder_path) if f.lower().endswith('.pdf')]
-        if not pdf_files:
-            messagebox.showerror(
-                "Error", "No PDF files found in the selected folder")
-            return
-
-        total_files = len(pdf_files)
-        for i, pdf_file in enumerate(pdf_files):
-            pdf_path = os.path.join(folder_path, pdf_file)
-            success = convert_pdf_to_word(
-                pdf_path, language, output_dir, self.update_progress)
-            self.update_progress((i + 1) / total_files * 100)
-
-            if not success:
-                self.show_conversion_result(success)
+            pdf_files = [os.path.join(input_path, f) for f in os.listdir(
+                input_path) if f.lower().endswith('.pdf')]
+            if not pdf_files:
+                messagebox.showerror(
+                    "Error", "No PDF files found in the selected folder")
                 return
 
-        self.show_conversion_result(True)
+        self.status_label.config(text="Conversion in progress...")
+        self.progress_var.set(0)
+
+        # The conversion runs in the background; the window stays responsive
+        self.conversion = BackgroundConversion(
+            self, on_progress=self.update_progress, on_error=self.show_error,
+            on_done=self.conversion_done)
+        self.conversion.start(pdf_files, language, output_dir,
+                              table_mode='only')
+        self.convert_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL, text="Pause")
+        self.cancel_button.config(state=tk.NORMAL)
+
+    # Shows an error of the background conversion; runs on the Tk thread
+    def show_error(self, message):
+        messagebox.showerror("Error", message)
+
+    def toggle_pause(self):
+        if self.conversion.control.paused:
+            self.conversion.resume()
+            self.pause_button.config(text="Pause")
+            self.status_label.config(text="Conversion in progress...")
+        else:
+            self.conversion.pause()
+            self.pause_button.config(text="Resume")
+            self.status_label.config(text="Conversion paused")
+
+    def cancel_conversion(self):
+        self.conversion.cancel()
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...")
+
+    def conversion_done(self, failed_files, cancelled):
+        self.convert_button.config(state=tk.NORMAL)
+        self.pause_button.config(state=tk.DISABLED, text="Pause")
+        self.cancel_button.config(state=tk.DISABLED)
+        if cancelled:
+            self.status_label.config(text="Conversion cancelled")
+        else:
+            self.show_conversion_result(not failed_files)
 
     def show_conversion_result(self, success):
         if success:
@@ -299,6 +197,12 @@ class SabaatPDFOCR(tk.Tk):
             self.status_label.config(text="Conversion failed")
             messagebox.showerror("Error", "PDF conversion failed")
 
+    # Stops a running conversion before the window goes away
+    def close(self):
+        if self.conversion is not None:
+            self.conversion.cancel()
+        self.destroy()
+
 
 if __name__ == "__main__":
     app = SabaatPDFOCR()
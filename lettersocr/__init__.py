@@ -0,0 +1,51 @@
+# Headless OCR pipeline shared by the GUIs and the command line
+# (python -m lettersocr): rasterize -> preprocess -> OCR -> write.
+#
+# Names are resolved on first access, so `import lettersocr` does not load
+# numpy, cv2 or tesseract before a GUI has drawn its window.
+import importlib
+
+_EXPORTS = {
+    'ADAPTIVE_DPI': 'page_source',
+    'PageSource': 'page_source',
+    'count_pages': 'page_source',
+    'render_page': 'page_source',
+    'is_blank': 'blank_page',
+    'PageIndex': 'page_index',
+    'page_hash': 'page_index',
+    'BackgroundConversion': 'gui_runner',
+    'LANGUAGES': 'pipeline',
+    'TABLE_MODES': 'pipeline',
+    'BLANK_PAGE_MODES': 'pipeline',
+    'build_config': 'pipeline',
+    'convert_pdf_to_word': 'pipeline',
+    'convert_pdfs': 'pipeline',
+    'find_pdfs': 'pipeline',
+    'ocr_image': 'pipeline',
+    'process_page': 'pipeline',
+    'RunControl': 'pipeline',
+    'Preprocessor': 'preprocess',
+    'estimate_rotation': 'preprocess',
+    'preprocess_image': 'preprocess',
+    'StartupProfile': 'startup',
+    'warm_up': 'startup',
+    'warm_up_in_background': 'startup',
+    'OUTPUT_FORMATS': 'writers',
+    'output_path_for': 'writers',
+    'write_outputs': 'writers',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,469 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+
+from .page_source import ADAPTIVE_DPI
+
+# Throughput benchmark: python -m lettersocr.benchmark [-o result.json]
+#
+# Builds a deterministic corpus of synthetic scanned PDFs, then times every
+# pipeline stage per page in this process (rasterize, preprocess, table
+# detection, OCR) plus the docx write per file, and finally runs the whole
+# corpus through convert_pdfs with a worker pool. The OCR cache is disabled
+# so repeated runs measure real work. Everything runs offline; only
+# tesseract (and poppler for pdf2image) must be installed.
+
+CORPUS_KINDS = ('fas_letter', 'eng', 'deu', 'table')
+KIND_LANGUAGES = {'fas_letter': 'fas', 'eng': 'eng', 'deu': 'deu',
+                  'table': 'fas'}
+DEFAULT_SCAN_DPIS = (150, 200, 300)
+DEFAULT_PAGES_PER_FILE = 3
+DEFAULT_SEED = 1403
+# A4 in inches
+PAGE_SIZE = (8.27, 11.69)
+FONT_POINTS = 12
+MAX_SKEW_DEGREES = 2.0
+MAX_NOISE_SIGMA = 12.0
+# 2024-01-01
+CORPUS_DATE = time.gmtime(1704067200)
+STAGES = ('rasterize', 'preprocess', 'table_detect', 'ocr', 'docx_write')
+# Fonts tried in order; Pillow looks bare file names up in the system font
+# folders. The first ones cover Persian.
+FONT_NAMES = ('Vazirmatn-Regular.ttf', 'NotoNaskhArabic-Regular.ttf',
+              'DejaVuSans.ttf', 'FreeSerif.ttf', 'tahoma.ttf', 'arial.ttf')
+
+FAS_WORDS = ('نامه', 'اداره', 'کل', 'درخواست', 'پیوست', 'گزارش', 'پروژه',
+             'بررسی', 'شرکت', 'قرارداد', 'پرداخت', 'مبلغ', 'ریال', 'جلسه',
+             'هماهنگی', 'اطلاعات', 'مدیریت', 'مالی', 'فنی', 'اجرای',
+             'خواهشمند', 'است', 'دستور', 'فرمایید', 'با', 'احترام', 'در',
+             'مورد', 'به', 'از', 'این', 'که', 'و', 'برای', 'تا', 'پایان',
+             'سال', 'ماه', 'جاری', 'ارسال', 'گردد')
+ENG_WORDS = ('the', 'report', 'project', 'contract', 'payment', 'meeting',
+             'department', 'request', 'attached', 'please', 'review', 'and',
+             'of', 'to', 'for', 'with', 'budget', 'schedule', 'delivery',
+             'quarter', 'results', 'committee', 'approval', 'invoice')
+DEU_WORDS = ('der', 'die', 'das', 'Bericht', 'Vertrag', 'Zahlung', 'Sitzung',
+             'Abteilung', 'Anfrage', 'beigefügt', 'bitte', 'prüfen', 'und',
+             'für', 'mit', 'über', 'Größe', 'Lieferung', 'Quartal', 'Ergebnis',
+             'Ausschuss', 'Genehmigung', 'Rechnung', 'schließlich')
+PERSIAN_DIGITS = str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹')
+
+
+def _rng(seed, *parts):
+    return random.Random('-'.join(str(p) for p in (seed,) + parts))
+
+
+def _np_rng(seed, *parts):
+    import numpy as np
+    key = '-'.join(str(p) for p in (seed,) + parts)
+    return np.random.default_rng(zlib.crc32(key.encode()))
+
+
+def load_font(size):
+    from PIL import ImageFont
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has only the fixed size bitmap font
+        return ImageFont.load_default()
+
+
+# Function to prepare right-to-left text for drawing: Pillow shapes it
+# itself when built with raqm, otherwise arabic_reshaper/python-bidi are
+# used when installed, else the text is drawn as is
+def _rtl_text(text):
+    from PIL import features
+    if features.check('raqm'):
+        return text, {'direction': 'rtl'}
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+        return get_display(arabic_reshaper.reshape(text)), {}
+    except ImportError:
+        return text, {}
+
+
+def _sentence(rng, words, count):
+    return ' '.join(rng.choice(words) for _ in range(count))
+
+
+# Function to build the text lines of one page, returns (lines, rtl, table)
+def page_content(kind, rng):
+    if kind == 'fas_letter':
+        date = (f"{rng.randint(1395, 1403)}/{rng.randint(1, 12):02d}/"
+                f"{rng.randint(1, 29):02d}").translate(PERSIAN_DIGITS)
+        lines = [f"شماره: {rng.randint(1000, 9999)}".translate(PERSIAN_DIGITS),
+                 f"تاریخ: {date}",
+                 f"موضوع: {_sentence(rng, FAS_WORDS, rng.randint(3, 6))}", '']
+        lines += [_sentence(rng, FAS_WORDS, rng.randint(8, 12))
+                  for _ in range(rng.randint(12, 20))]
+        return lines, True, None
+    if kind in ('eng', 'deu'):
+        words = ENG_WORDS if kind == 'eng' else DEU_WORDS
+        lines = [_sentence(rng, words, rng.randint(8, 12)).capitalize()
+                 for _ in range(rng.randint(20, 30))]
+        return lines, False, None
+    rows, cols = rng.randint(4, 8), rng.randint(3, 5)
+    table = [[_sentence(rng, FAS_WORDS, 2) for _ in range(cols)]]
+    table += [[str(rng.randint(1, 99999)).translate(PERSIAN_DIGITS)
+               for _ in range(cols)] for _ in range(rows - 1)]
+    lines = [f"موضوع: {_sentence(rng, FAS_WORDS, 4)}", '']
+    return lines, True, table
+
+
+# Function to draw one synthetic page as a clean grayscale image
+def draw_page(kind, dpi, rng):
+    from PIL import Image, ImageDraw
+
+    width, height = (int(inches * dpi) for inches in PAGE_SIZE)
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    font_size = round(FONT_POINTS * dpi / 72)
+    font = load_font(font_size)
+    margin = dpi
+    line_height = int(font_size * 1.6)
+
+    lines, rtl, table = page_content(kind, rng)
+    y = margin
+    for line in lines:
+        if line:
+            text, options = _rtl_text(line) if rtl else (line, {})
+            if rtl:
+                draw.text((width - margin, y), text, fill=0, font=font,
+                          anchor='ra', **options)
+            else:
+                draw.text((margin, y), text, fill=0, font=font)
+        y += line_height
+
+    if table:
+        cols = len(table[0])
+        cell_width = (width - 2 * margin) // cols
+        cell_height = line_height * 2
+        thickness = max(1, dpi // 100)
+        for r, row in enumerate(table):
+            for c, cell in enumerate(row):
+                # Right to left: the first column is on the right
+                x0 = width - margin - (c + 1) * cell_width
+                y0 = y + r * cell_height
+                draw.rectangle((x0, y0, x0 + cell_width, y0 + cell_height),
+                               outline=0, width=thickness)
+                text, options = _rtl_text(cell)
+                draw.text((x0 + cell_width - font_size // 2,
+                           y0 + cell_height // 2), text, fill=0, font=font,
+                          anchor='rm', **options)
+    return image
+
+
+# Function to make a clean page look scanned: slight rotation, blur and
+# gaussian sensor noise
+def degrade(image, skew, noise_sigma, np_rng):
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    if skew:
+        image = image.rotate(skew, resample=Image.BICUBIC, fillcolor=255)
+    image = image.filter(ImageFilter.GaussianBlur(0.6))
+    if noise_sigma:
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels = pixels + np_rng.normal(0, noise_sigma, pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def corpus_file_name(kind, dpi, pages, seed):
+    return f"{kind}-{dpi}dpi-{pages}p-seed{seed}.pdf"
+
+
+# Function to write the synthetic corpus to corpus_dir, reusing files that
+# already exist (their names encode every generation parameter). Pages
+# alternate between clean and skewed/noisy scans. Returns a list of
+# (pdf_path, kind, dpi).
+def build_corpus(corpus_dir, kinds=CORPUS_KINDS, dpis=DEFAULT_SCAN_DPIS,
+                 pages=DEFAULT_PAGES_PER_FILE, seed=DEFAULT_SEED):
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = []
+    for kind in kinds:
+        for dpi in dpis:
+            pdf_path = os.path.join(corpus_dir,
+                                    corpus_file_name(kind, dpi, pages, seed))
+            if not os.path.exists(pdf_path):
+                images = []
+                for page_number in range(1, pages + 1):
+                    rng = _rng(seed, kind, dpi, page_number)
+                    image = draw_page(kind, dpi, rng)
+                    if page_number % 2 == 0:
+                        skew = rng.uniform(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES)
+                        sigma = rng.uniform(MAX_NOISE_SIGMA / 2, MAX_NOISE_SIGMA)
+                        image = degrade(image, skew, sigma,
+                                        _np_rng(seed, kind, dpi, page_number))
+                    else:
+                        image = degrade(image, 0, 0, None)
+                    images.append(image)
+                # Fixed dates keep the files byte for byte reproducible
+                images[0].save(pdf_path, 'PDF', resolution=dpi, save_all=True,
+                               append_images=images[1:],
+                               creationDate=CORPUS_DATE, modDate=CORPUS_DATE)
+            corpus.append((pdf_path, kind, dpi))
+    return corpus
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest rank
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {'count': len(values), 'total': sum(values),
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95),
+            'max': max(values)}
+
+
+# Function to read the peak resident set size of this process and of its
+# largest finished child, in MB. None where the platform does not say.
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    per_mb = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / per_mb)
+
+
+def _timed(timings, stage, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+# Function to time every stage of every page in this process. Returns the
+# per-page records and the docx write time of every file.
+def run_stages(corpus, dpi):
+    from . import ocr_engine, tables, writers
+    from .page_source import count_pages, render_page, render_page_adaptive
+    from .pipeline import build_config, is_rtl
+    from .preprocess import preprocess_image
+
+    records = []
+    docx_times = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for pdf_path, kind, scan_dpi in corpus:
+            language = KIND_LANGUAGES[kind]
+            pages = []
+            for page_number in range(1, count_pages(pdf_path) + 1):
+                timings = {}
+                record = {'file': os.path.basename(pdf_path), 'kind': kind,
+                          'scan_dpi': scan_dpi, 'page': page_number,
+                          'error': None}
+                try:
+                    if dpi == ADAPTIVE_DPI:
+                        image, render_dpi = _timed(
+                            timings, 'rasterize', render_page_adaptive,
+                            pdf_path, page_number)
+                    else:
+                        render_dpi = dpi
+                        image = _timed(timings, 'rasterize', render_page,
+                                       pdf_path, page_number, dpi)
+                    record['render_dpi'] = render_dpi
+                    record['pixels'] = image.size[0] * image.size[1]
+                    gray = _timed(timings, 'preprocess', preprocess_image,
+                                  image)
+                    _timed(timings, 'table_detect',
+                           tables.detect_and_process_tables, gray)
+                    # Straight to the engine: the OCR cache would turn
+                    # repeated runs into lookups
+                    text = _timed(timings, 'ocr', ocr_engine.image_to_string,
+                                  gray, None, build_config(language,
+                                                           render_dpi))
+                except Exception as e:
+                    record['error'] = str(e)
+                    text = ''
+                record['stages'] = timings
+                record['latency'] = sum(timings.values())
+                records.append(record)
+                pages.append({'page': page_number, 'text': text,
+                              'source': 'ocr', 'error': record['error']})
+
+            start = time.perf_counter()
+            writers.write_docx(pages, os.path.join(out_dir, 'out.docx'),
+                               is_rtl(language))
+            docx_times.append(time.perf_counter() - start)
+    return records, docx_times
+
+
+# Function to run the corpus through convert_pdfs, one call per language
+def run_end_to_end(corpus, workers, dpi):
+    from .pipeline import convert_pdfs
+
+    by_language = {}
+    for pdf_path, kind, _ in corpus:
+        by_language.setdefault(KIND_LANGUAGES[kind], []).append(pdf_path)
+    start = time.perf_counter()
+    failed_files = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for language, pdf_paths in by_language.items():
+            failed_files += convert_pdfs(
+                pdf_paths, language, out_dir, workers=workers, dpi=dpi,
+                use_text_layer=False)
+    return time.perf_counter() - start, failed_files
+
+
+def tesseract_version():
+    try:
+        import pytesseract
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return None
+
+
+# Measure OCR, not cache lookups: the OCR cache is off inside this block,
+# also for the pool workers started in it, and as before afterwards
+@contextmanager
+def _ocr_cache_disabled():
+    previous = os.environ.get('LETTERSOCR_CACHE_MAX_MB')
+    os.environ['LETTERSOCR_CACHE_MAX_MB'] = '0'
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop('LETTERSOCR_CACHE_MAX_MB', None)
+        else:
+            os.environ['LETTERSOCR_CACHE_MAX_MB'] = previous
+
+
+# Function to run the whole benchmark and return the report dict
+def run_benchmark(corpus_dir=None, kinds=CORPUS_KINDS, scan_dpis=DEFAULT_SCAN_DPIS,
+                  pages=DEFAULT_PAGES_PER_FILE, seed=DEFAULT_SEED,
+                  dpi=ADAPTIVE_DPI, workers=None, end_to_end=True):
+    with _ocr_cache_disabled(), tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        corpus = build_corpus(corpus_dir or temp_dir, kinds, scan_dpis, pages,
+                              seed)
+        corpus_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        records, docx_times = run_stages(corpus, dpi)
+        stage_seconds = time.perf_counter() - start
+
+        report = {
+            'benchmark': 'lettersocr',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tesseract': tesseract_version(),
+            'cpu_count': os.cpu_count(),
+            'parameters': {'kinds': list(kinds), 'scan_dpis': list(scan_dpis),
+                           'pages_per_file': pages, 'seed': seed,
+                           'dpi': dpi, 'workers': workers},
+            'corpus_seconds': corpus_seconds,
+            'pages': len(records),
+            'errors': sum(1 for record in records if record['error']),
+            'wall_seconds': stage_seconds,
+            'pages_per_second': len(records) / stage_seconds if stage_seconds else None,
+            'latency': summarize([record['latency'] for record in records]),
+            'stages': {stage: summarize([record['stages'][stage]
+                                         for record in records
+                                         if stage in record['stages']])
+                       for stage in STAGES if stage != 'docx_write'},
+            'by_kind': {},
+        }
+        report['stages']['docx_write'] = summarize(docx_times)
+        for kind in kinds:
+            latencies = [record['latency'] for record in records
+                         if record['kind'] == kind]
+            report['by_kind'][kind] = summarize(latencies)
+        report['page_records'] = records
+
+        if end_to_end:
+            seconds, failed_files = run_end_to_end(corpus, workers, dpi)
+            report['end_to_end'] = {
+                'workers': workers or os.cpu_count(),
+                'wall_seconds': seconds,
+                'pages_per_second': len(records) / seconds if seconds else None,
+                'failed_files': [os.path.basename(p) for p in failed_files]}
+
+    report['peak_rss_mb'], report['peak_child_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def _int_list(value):
+    return tuple(int(v) for v in value.split(',') if v.strip())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m lettersocr.benchmark',
+        description='Time the OCR pipeline on a synthetic scanned corpus '
+                    'and print the results as JSON.')
+    parser.add_argument('-o', '--output',
+                        help='write the JSON report to this file')
+    parser.add_argument('--corpus-dir',
+                        help='keep the generated PDFs here and reuse them '
+                             '(default: a temporary folder)')
+    parser.add_argument('--kinds', default=','.join(CORPUS_KINDS),
+                        help=f"comma separated page kinds (default: {','.join(CORPUS_KINDS)})")
+    parser.add_argument('--scan-dpis', type=_int_list,
+                        default=DEFAULT_SCAN_DPIS,
+                        help='comma separated scan resolutions of the corpus')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_FILE,
+                        help='pages per generated PDF')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--dpi', default=ADAPTIVE_DPI,
+                        help=f"rasterization resolution or '{ADAPTIVE_DPI}' "
+                             "(default)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes for the end-to-end run '
+                             '(default: CPU count)')
+    parser.add_argument('--no-end-to-end', action='store_true',
+                        help='only time the stages in this process')
+    parser.add_argument('--no-page-records', action='store_true',
+                        help='leave the per-page timings out of the report')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    kinds = tuple(k.strip() for k in args.kinds.split(',') if k.strip())
+    unknown = set(kinds) - set(CORPUS_KINDS)
+    if unknown:
+        print(f"Unknown page kinds: {sorted(unknown)}", file=sys.stderr)
+        return 2
+    dpi = args.dpi if args.dpi == ADAPTIVE_DPI else int(args.dpi)
+
+    report = run_benchmark(args.corpus_dir, kinds, args.scan_dpis, args.pages,
+                           args.seed, dpi, args.jobs, not args.no_end_to_end)
+    if args.no_page_records:
+        del report['page_records']
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# Cheap blank page check so empty backs of duplex scans and separator sheets
+# never reach tesseract. The page is shrunk, anything clearly darker than
+# the paper counts as ink, and a page is blank when it has almost no ink
+# and only a few marks bigger than dust. The border is ignored, where scans
+# have edge shadows and punch holes, and faint show-through from the other
+# side of the sheet is not dark enough to count.
+
+# Long side of the downscaled copy the statistics are taken on
+BLANK_SIZE = 600
+# Share of each side ignored as scanner border
+MARGIN = 0.05
+# Grey levels below the paper at which a pixel is ink
+INK_CONTRAST = 60
+# Marks smaller than this (pixels of the downscaled copy) are dust
+MIN_MARK_AREA = 4
+# A page is blank with at most this share of ink and this many marks
+MAX_INK = 0.002
+MAX_MARKS = 3
+
+
+# Function to find the ink of a page image (PIL or uint8 array), as a 0/1
+# mask of the downscaled page without its border
+def ink_mask(image):
+    import cv2
+    import numpy as np
+
+    gray = np.asarray(image)
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    top, left = int(height * MARGIN), int(width * MARGIN)
+    gray = gray[top:height - top, left:width - left]
+    # Area averaging at a whole factor, so thin strokes are dimmed but kept
+    factor = -(-max(gray.shape) // BLANK_SIZE)
+    if factor > 1:
+        gray = cv2.resize(gray, None, fx=1 / factor, fy=1 / factor,
+                          interpolation=cv2.INTER_AREA)
+    paper = float(np.median(gray))
+    return (gray < paper - INK_CONTRAST).view(np.uint8)
+
+
+# Function to count the marks on an ink mask that are bigger than dust
+def count_marks(ink):
+    import cv2
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    return int((stats[1:, cv2.CC_STAT_AREA] >= MIN_MARK_AREA).sum())
+
+
+# Function to tell whether a page is blank or nearly so
+def is_blank(image, max_ink=MAX_INK, max_marks=MAX_MARKS):
+    ink = ink_mask(image)
+    if ink.sum() > max_ink * ink.size:
+        # Plainly a written page, counting its marks would only cost time
+        return False
+    return count_marks(ink) <= max_marks
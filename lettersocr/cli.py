@@ -0,0 +1,152 @@
+import argparse
+import os
+import sys
+
+from . import instrumentation
+from .page_source import ADAPTIVE_DPI
+from .blank_page import MAX_INK, MAX_MARKS
+from .page_index import DEFAULT_MAX_DISTANCE, HASH_BITS, MAX_DISTANCE
+from .pipeline import (BLANK_PAGE_MODES, LANGUAGES, TABLE_MODES, convert_pdfs,
+                       find_pdfs)
+from .writers import OUTPUT_FORMATS
+
+
+def parse_dpi(value):
+    if value == ADAPTIVE_DPI:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected a number or '{ADAPTIVE_DPI}', got '{value}'")
+
+
+def parse_formats(value):
+    formats = tuple(f.strip() for f in value.split(',') if f.strip())
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(
+            f"formats must be a comma separated list of {', '.join(OUTPUT_FORMATS)}")
+    return formats
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='lettersocr',
+        description='OCR scanned PDF files into Word, text or JSON files.')
+    parser.add_argument('inputs', nargs='+',
+                        help='PDF files and/or folders containing PDF files')
+    parser.add_argument(
+        '-l', '--language', default='fas',
+        help=f"one of {', '.join(LANGUAGES)} or tesseract languages such "
+             "as 'fas+equ' (default: fas)")
+    parser.add_argument(
+        '-o', '--output-dir',
+        help='folder for the output files (default: next to each PDF)')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1,
+        help='worker processes OCRing pages in parallel (default: CPU count)')
+    parser.add_argument(
+        '-f', '--formats', type=parse_formats, default=('docx',),
+        help=f"comma separated output formats: {', '.join(OUTPUT_FORMATS)} "
+             "(default: docx)")
+    parser.add_argument(
+        '--tables', choices=TABLE_MODES, default='off',
+        help='extract ruled tables: only the tables, or after the page text')
+    parser.add_argument(
+        '--dpi', type=parse_dpi, default=ADAPTIVE_DPI,
+        help=f"rasterization resolution, or '{ADAPTIVE_DPI}' to pick it per "
+             "page (default)")
+    parser.add_argument(
+        '--no-text-layer', action='store_true',
+        help='OCR every page even when the PDF already contains text')
+    parser.add_argument(
+        '--auto-language', action='store_true',
+        help='treat --language as a hint and OCR each page with only the '
+             'models for the script detected on it')
+    parser.add_argument(
+        '--orient-pages', action='store_true',
+        help='turn pages scanned sideways or upside down upright before OCR')
+    parser.add_argument(
+        '--blank-pages', choices=BLANK_PAGE_MODES, default='empty',
+        help='blank pages are not OCRed: keep them as empty pages (default), '
+             'drop them from the outputs, or OCR them anyway')
+    parser.add_argument(
+        '--blank-max-ink', type=float, default=MAX_INK, metavar='FRACTION',
+        help=f"most ink a blank page may have, as a share of its area "
+             f"(default: {MAX_INK})")
+    parser.add_argument(
+        '--blank-max-marks', type=int, default=MAX_MARKS, metavar='N',
+        help=f"most marks bigger than dust a blank page may have "
+             f"(default: {MAX_MARKS})")
+    parser.add_argument(
+        '--reuse-duplicates', action='store_true',
+        help='reuse the OCR result of a near-duplicate page read before '
+             'instead of OCRing the page again')
+    parser.add_argument(
+        '--duplicate-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+        choices=range(MAX_DISTANCE + 1), metavar='BITS',
+        help=f"how many of the {HASH_BITS} hash bits a near-duplicate page "
+             f"may differ in (default: {DEFAULT_MAX_DISTANCE})")
+    parser.add_argument(
+        '--no-recursive', action='store_true',
+        help='do not look for PDF files in subfolders')
+    parser.add_argument(
+        '--events-log', metavar='PATH',
+        help='append a JSON line per pipeline stage event to this file')
+    parser.add_argument(
+        '--metrics-file', metavar='PATH',
+        help='write stage timings for the Prometheus node_exporter textfile '
+             'collector (a .prom file)')
+    parser.add_argument(
+        '--stage-summary', action='store_true',
+        help='print where the time went, per stage and language, at the end')
+    return parser
+
+
+def print_progress(value):
+    print(f"\r{value:5.1f}%", end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    pdf_files = find_pdfs(args.inputs, recursive=not args.no_recursive)
+    if not pdf_files:
+        print('No PDF files were found.', file=sys.stderr)
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    sinks = []
+    if args.events_log:
+        sinks.append(instrumentation.JsonLinesSink(args.events_log))
+    if args.metrics_file:
+        sinks.append(instrumentation.PrometheusTextfileSink(args.metrics_file))
+    summary = instrumentation.AggregatingSink() if args.stage_summary else None
+    if summary:
+        sinks.append(summary)
+    for sink in sinks:
+        instrumentation.add_sink(sink)
+    try:
+        failed_files = convert_pdfs(
+            pdf_files, args.language, args.output_dir, print_progress,
+            workers=max(1, args.jobs), formats=args.formats,
+            use_text_layer=not args.no_text_layer, dpi=args.dpi,
+            table_mode=args.tables, auto_language=args.auto_language,
+            orient_pages=args.orient_pages, blank_pages=args.blank_pages,
+            blank_thresholds={'max_ink': args.blank_max_ink,
+                              'max_marks': args.blank_max_marks},
+            duplicate_distance=(args.duplicate_distance
+                                if args.reuse_duplicates else None))
+    finally:
+        for sink in sinks:
+            instrumentation.remove_sink(sink)
+            sink.close()
+    print(file=sys.stderr)
+    if summary:
+        print(summary.format_summary(), file=sys.stderr)
+
+    print(f"{len(pdf_files) - len(failed_files)}/{len(pdf_files)} files converted.")
+    for pdf_file in failed_files:
+        print(f"Failed: {pdf_file}", file=sys.stderr)
+    return 1 if failed_files else 0
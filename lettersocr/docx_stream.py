@@ -0,0 +1,180 @@
+import io
+import logging
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+# Writes word/document.xml straight into the zip, block by block, instead of
+# building python-docx's element tree for the whole document. Everything
+# else (styles, fonts, settings, theme, section properties) comes from a
+# python-docx document configured as before, so the result opens in Word
+# exactly like the DOM-built file. The XML produced per paragraph, page
+# break and table is the same python-docx would produce.
+
+DOCUMENT_PART = 'word/document.xml'
+REQUIRED_PARTS = ('[Content_Types].xml', '_rels/.rels', DOCUMENT_PART,
+                  'word/_rels/document.xml.rels', 'word/styles.xml')
+TWIPS_PER_EMU = 1 / 635
+
+# Characters XML 1.0 cannot carry; python-docx refuses them outright
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# Run.text splits text the same way: tabs and line breaks become elements
+RUN_SPECIAL_CHARS = re.compile('([\t\n\r])')
+
+
+def _text_element(text):
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<w:t{space}>{escape(text)}</w:t>'
+
+
+def run_xml(text):
+    parts = []
+    for piece in RUN_SPECIAL_CHARS.split(INVALID_XML_CHARS.sub('', text)):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\n', '\r'):
+            parts.append('<w:br/>')
+        elif piece:
+            parts.append(_text_element(piece))
+    if not parts:
+        return '<w:r/>'
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+def paragraph_xml(text, rtl):
+    if rtl:
+        properties = '<w:pPr><w:bidi/><w:jc w:val="right"/></w:pPr>'
+    else:
+        properties = '<w:pPr><w:jc w:val="left"/></w:pPr>'
+    return f'<w:p>{properties}{run_xml(text)}</w:p>'
+
+
+class DocxStreamWriter:
+    def __init__(self, path, rtl=False, font_name=None, font_size=11):
+        from docx import Document
+        from docx.opc.oxml import serialize_part_xml
+        from docx.shared import Pt
+
+        self.path = path
+        self.rtl = rtl
+        self._skeleton = Document()
+        style = self._skeleton.styles['Normal']
+        style.font.name = font_name or ('B Nazanin' if rtl else 'Arial')
+        style.font.size = Pt(font_size)
+
+        section = self._skeleton.sections[0]
+        self._block_width = section.page_width - section.left_margin - \
+            section.right_margin
+        document_xml = serialize_part_xml(
+            self._skeleton.element).decode('utf-8')
+        body_start = document_xml.index('<w:body>') + len('<w:body>')
+        section_start = document_xml.index('<w:sectPr', body_start)
+        self._head = document_xml[:body_start]
+        self._tail = document_xml[section_start:]
+
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self._stream = self._zip.open(DOCUMENT_PART, 'w', force_zip64=True)
+        self._written = 0
+        self._write(self._head)
+
+    def _write(self, xml):
+        data = xml.encode('utf-8')
+        self._stream.write(data)
+        self._written += len(data)
+
+    def add_paragraph(self, text):
+        self._write(paragraph_xml(text, self.rtl))
+
+    def add_page_break(self):
+        self._write('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    # Same markup as Document.add_table with the 'Table Grid' style and
+    # merged cells: gridSpan for columns, vMerge for rows
+    def add_table(self, table):
+        rows, cols = table['rows'], table['cols']
+        width = int(self._block_width // cols * TWIPS_PER_EMU)
+        origins = {(cell['row'], cell['col']): cell for cell in table['cells']}
+        covered = {}
+        for cell in table['cells']:
+            for r in range(cell['row'], cell['row'] + cell['row_span']):
+                for c in range(cell['col'], cell['col'] + cell['col_span']):
+                    if (r, c) != (cell['row'], cell['col']):
+                        covered[(r, c)] = cell
+
+        parts = ['<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/>'
+                 '<w:tblW w:type="auto" w:w="0"/><w:tblLook w:firstColumn="1" '
+                 'w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" '
+                 'w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>']
+        parts += [f'<w:gridCol w:w="{width}"/>'] * cols
+        parts.append('</w:tblGrid>')
+        for r in range(rows):
+            parts.append('<w:tr>')
+            c = 0
+            while c < cols:
+                cell = origins.get((r, c))
+                above = covered.get((r, c))
+                if cell is not None:
+                    span = cell['col_span']
+                    content = paragraph_xml(cell['text'], self.rtl)
+                    merge = '<w:vMerge w:val="restart"/>' \
+                        if cell['row_span'] > 1 else ''
+                elif above is not None and above['col'] == c:
+                    # Continuation of a cell merged down from a row above
+                    span = above['col_span']
+                    content = '<w:p/>'
+                    merge = '<w:vMerge/>'
+                else:
+                    span, content, merge = 1, '<w:p/>', ''
+                grid_span = f'<w:gridSpan w:val="{span}"/>' if span > 1 else ''
+                parts.append(f'<w:tc><w:tcPr><w:tcW w:type="dxa" '
+                             f'w:w="{width * span}"/>{grid_span}{merge}'
+                             f'</w:tcPr>{content}</w:tc>')
+                c += span
+            parts.append('</w:tr>')
+        parts.append('</w:tbl>')
+        self._write(''.join(parts))
+
+    # Function to finish the document, returns True when verify() passes
+    def close(self, comments=None):
+        self._write(self._tail)
+        self._stream.close()
+        if comments is not None:
+            self._skeleton.core_properties.comments = comments
+        skeleton = io.BytesIO()
+        self._skeleton.save(skeleton)
+        with zipfile.ZipFile(skeleton) as source:
+            for info in source.infolist():
+                if info.filename != DOCUMENT_PART:
+                    self._zip.writestr(info, source.read(info.filename),
+                                       zipfile.ZIP_DEFLATED)
+        self._zip.close()
+        return self.verify()
+
+    # Structural check instead of re-parsing the document: the central
+    # directory reads back, every required part is there and the document
+    # part has exactly the bytes that were streamed into it
+    def verify(self):
+        try:
+            with zipfile.ZipFile(self.path) as written:
+                names = set(written.namelist())
+                missing = [part for part in REQUIRED_PARTS if part not in names]
+                if missing:
+                    raise ValueError(f"missing parts {missing}")
+                size = written.getinfo(DOCUMENT_PART).file_size
+                if size != self._written:
+                    raise ValueError(
+                        f"{DOCUMENT_PART} has {size} bytes, expected {self._written}")
+            return True
+        except (OSError, zipfile.BadZipFile, ValueError) as e:
+            logger.error("Error verifying the created document %s: %s",
+                         self.path, e)
+            return False
+
+    # Closes the zip without finishing it, e.g. after an error
+    def abort(self):
+        try:
+            self._stream.close()
+        finally:
+            self._zip.close()
@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+
+from .pipeline import RunControl, convert_pdfs
+
+# Runs convert_pdfs for a Tk window. The conversion (and its process pool)
+# lives on a background thread that never touches Tk: progress, finished
+# files and errors go through a queue, and the Tk loop drains the queue
+# with after(). Every callback therefore runs on the Tk thread.
+
+# Milliseconds between checks of the event queue
+POLL_INTERVAL = 50
+# Seconds between progress bar redraws; later values replace earlier ones
+PROGRESS_INTERVAL = 0.25
+
+
+class BackgroundConversion:
+    def __init__(self, widget, on_progress=None, on_file=None, on_error=None,
+                 on_done=None, poll_interval=POLL_INTERVAL,
+                 progress_interval=PROGRESS_INTERVAL):
+        self.widget = widget
+        self.on_progress = on_progress
+        self.on_file = on_file
+        self.on_error = on_error
+        self.on_done = on_done
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.control = RunControl()
+        self._events = queue.Queue()
+        self._thread = None
+        self._progress = None
+        self._progress_shown = None
+        self._progress_drawn_at = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Function to start converting; on_done(failed_files, cancelled) is
+    # called once everything has finished or been cancelled
+    def start(self, pdf_paths, language, save_dir=None, **options):
+        pdf_paths = list(pdf_paths)
+        self._thread = threading.Thread(
+            target=self._run, args=(pdf_paths, language, save_dir, options),
+            name='conversion', daemon=True)
+        self._thread.start()
+        self.widget.after(self.poll_interval, self._poll)
+
+    def _run(self, pdf_paths, language, save_dir, options):
+        try:
+            failed_files = convert_pdfs(
+                pdf_paths, language, save_dir,
+                progress_callback=lambda value: self._events.put(
+                    ('progress', value)),
+                file_callback=lambda pdf_path, success: self._events.put(
+                    ('file', (pdf_path, success))),
+                control=self.control, **options)
+        except Exception as e:
+            self._events.put(('error', f"Error processing files: {str(e)}"))
+            failed_files = list(pdf_paths)
+        self._events.put(('done', failed_files))
+
+    def _poll(self):
+        failed_files = None
+        while True:
+            try:
+                kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self._progress = value
+            elif kind == 'file' and self.on_file:
+                self.on_file(*value)
+            elif kind == 'error' and self.on_error:
+                self.on_error(value)
+            elif kind == 'done':
+                failed_files = value
+
+        finished = failed_files is not None
+        now = time.monotonic()
+        if self.on_progress and self._progress != self._progress_shown and (
+                finished or now - self._progress_drawn_at >=
+                self.progress_interval):
+            self.on_progress(self._progress)
+            self._progress_shown = self._progress
+            self._progress_drawn_at = now
+
+        if finished:
+            if self.on_done:
+                self.on_done(failed_files, self.control.cancelled)
+        else:
+            self.widget.after(self.poll_interval, self._poll)
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        self.control.cancel()
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Structured timing events for the pipeline stages. Code wraps a stage in
+# `with stage('ocr') as event:` and may add fields to the event; when the
+# block ends the event gets its duration (and error, if it raised) and goes
+# to every registered sink. Pool workers collect their events with
+# collect() and hand them back with the page, so sinks only ever run in the
+# process that called convert_pdfs.
+
+# Fields every event has, None when they do not apply
+EVENT_FIELDS = ('timestamp', 'pid', 'file', 'page', 'stage', 'duration',
+                'width', 'height', 'bytes', 'language', 'error')
+# Upper bounds (seconds) of the Prometheus histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                    60.0)
+# Slowest events the aggregator remembers per stage
+SLOWEST_EVENTS = 5
+
+_local = threading.local()
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+# Logs failures with the messages the pipeline always printed; registered
+# by default so errors are not lost when nothing else listens
+class ConsoleErrorSink:
+    MESSAGES = {
+        'text_layer': "Error reading text layer of page {page} of {file}: {error}",
+        'page': "Error processing page {page} of {file}: {error}",
+        'open': "Error processing {file}: {error}",
+        'write': "Error processing {file}: {error}",
+        'duplicate_lookup':
+            "Error looking up duplicates of page {page} of {file}: {error}",
+        'duplicate_add': "Error adding page {page} of {file} to the "
+                         "duplicate index: {error}",
+    }
+
+    def handle(self, event):
+        message = self.MESSAGES.get(event['stage'])
+        if event['error'] and message:
+            logger.error(message.format(**event))
+
+    def close(self):
+        pass
+
+
+# Appends every event as one JSON object per line
+class JsonLinesSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def handle(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Keeps count, total, max, errors and histogram buckets per (stage,
+# language), plus the slowest few events of every stage, e.g. to find the
+# one pathological scan in a batch
+class AggregatingSink:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.slowest = {}
+
+    def handle(self, event):
+        duration = event['duration'] or 0.0
+        key = (event['stage'], event['language'] or '')
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'errors': 0,
+                    'pixels': 0, 'bytes': 0,
+                    'buckets': [0] * len(DURATION_BUCKETS)}
+            stats['count'] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+            if event['error']:
+                stats['errors'] += 1
+            if event['width'] and event['height']:
+                stats['pixels'] += event['width'] * event['height']
+            stats['bytes'] += event['bytes'] or 0
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][i] += 1
+                    break
+
+            slowest = self.slowest.setdefault(event['stage'], [])
+            if len(slowest) < SLOWEST_EVENTS or duration > slowest[-1]['duration']:
+                slowest.append(dict(event, duration=duration))
+                slowest.sort(key=lambda e: e['duration'], reverse=True)
+                del slowest[SLOWEST_EVENTS:]
+
+    # Function to list the stats, most total time first
+    def summary(self):
+        with self._lock:
+            rows = [dict(stats, stage=stage, language=language,
+                         mean=stats['total'] / stats['count'],
+                         buckets=list(stats['buckets']))
+                    for (stage, language), stats in self.stats.items()]
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def format_summary(self):
+        lines = [f"{'stage':<12} {'language':<14} {'count':>6} {'total s':>9} "
+                 f"{'mean s':>8} {'max s':>8} {'errors':>6}"]
+        for row in self.summary():
+            lines.append(
+                f"{row['stage']:<12} {row['language']:<14} {row['count']:>6} "
+                f"{row['total']:>9.2f} {row['mean']:>8.3f} {row['max']:>8.3f} "
+                f"{row['errors']:>6}")
+        return '\n'.join(lines)
+
+    def close(self):
+        pass
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+# Writes the aggregated stats for node_exporter's textfile collector. The
+# file is rewritten atomically at most every `interval` seconds and on
+# close, so a long batch shows up while it runs.
+class PrometheusTextfileSink(AggregatingSink):
+    def __init__(self, path, interval=15.0):
+        super().__init__()
+        self.path = path
+        self.interval = interval
+        self._written = 0.0
+
+    def handle(self, event):
+        super().handle(event)
+        if time.monotonic() - self._written >= self.interval:
+            self.write()
+
+    def write(self):
+        lines = [
+            '# HELP lettersocr_stage_duration_seconds Time spent in each '
+            'pipeline stage.',
+            '# TYPE lettersocr_stage_duration_seconds histogram',
+        ]
+        errors = ['# HELP lettersocr_stage_errors_total Pipeline stage '
+                  'failures.',
+                  '# TYPE lettersocr_stage_errors_total counter']
+        for row in sorted(self.summary(),
+                          key=lambda row: (row['stage'], row['language'])):
+            labels = (f'stage="{_label(row["stage"])}",'
+                      f'language="{_label(row["language"])}"')
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, row['buckets']):
+                cumulative += count
+                lines.append(f'lettersocr_stage_duration_seconds_bucket'
+                             f'{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'lettersocr_stage_duration_seconds_bucket'
+                         f'{{{labels},le="+Inf"}} {row["count"]}')
+            lines.append(f'lettersocr_stage_duration_seconds_sum{{{labels}}} '
+                         f'{row["total"]:.6f}')
+            lines.append(f'lettersocr_stage_duration_seconds_count{{{labels}}} '
+                         f'{row["count"]}')
+            errors.append(f'lettersocr_stage_errors_total{{{labels}}} '
+                          f'{row["errors"]}')
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines + errors) + '\n')
+        os.replace(temp_path, self.path)
+        self._written = time.monotonic()
+
+    def close(self):
+        self.write()
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+# Function to deliver finished events to the sinks. A failing sink is
+# reported once per event and never breaks the conversion.
+def emit(events):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for event in events:
+        for sink in sinks:
+            try:
+                sink.handle(event)
+            except Exception as e:
+                logger.error("Error in instrumentation sink %s: %s",
+                             type(sink).__name__, e)
+
+
+def _new_event(name, fields):
+    event = dict.fromkeys(EVENT_FIELDS)
+    context = getattr(_local, 'context', None)
+    if context:
+        event.update(context)
+    event.update(fields)
+    event.update(stage=name, timestamp=time.time(), pid=os.getpid())
+    return event
+
+
+# Times the block as one stage event. The yielded dict can be given extra
+# fields (width, height, bytes, ...); exceptions are recorded and re-raised.
+@contextmanager
+def stage(name, **fields):
+    event = _new_event(name, fields)
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event['error'] = str(e)
+        raise
+    finally:
+        event['duration'] = time.perf_counter() - start
+        collected = getattr(_local, 'collected', None)
+        if collected is not None:
+            collected.append(event)
+        else:
+            emit([event])
+
+
+# Holds back the events of this thread (e.g. a pool worker's page) in the
+# yielded list instead of emitting them, and adds `fields` (file, page,
+# language) to each of them
+@contextmanager
+def collect(**fields):
+    previous = getattr(_local, 'collected', None), getattr(_local, 'context', None)
+    _local.collected = []
+    _local.context = dict(previous[1] or {}, **fields)
+    try:
+        yield _local.collected
+    finally:
+        _local.collected, _local.context = previous
+
+
+add_sink(ConsoleErrorSink())
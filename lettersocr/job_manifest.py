@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default manifest file name, kept in the output folder of a run
+MANIFEST_NAME = '.lettersocr_manifest.sqlite'
+
+
+def manifest_path_for(folder):
+    return os.path.join(folder, MANIFEST_NAME)
+
+
+def file_fingerprint(pdf_path):
+    stat = os.stat(pdf_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# SQLite record of a batch run: every input file and the OCR result of each
+# page as soon as it is finished, so an interrupted run can resume from the
+# first unfinished page and build its output from the stored results.
+# Safe to share between processes; each process opens its own instance.
+class JobManifest:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                pdf_path TEXT PRIMARY KEY,
+                output_path TEXT,
+                fingerprint TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                pdf_path TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                source TEXT,
+                error TEXT,
+                data TEXT,
+                PRIMARY KEY (pdf_path, page_number)
+            );
+        ''')
+        # Manifests written before page data (tables, dpi) was stored
+        columns = {row[1] for row in self._conn.execute(
+            'PRAGMA table_info(pages)')}
+        if 'data' not in columns:
+            self._conn.execute('ALTER TABLE pages ADD COLUMN data TEXT')
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Registers a file and returns the page numbers already finished for it.
+    # Results recorded for an older version of the file are discarded.
+    def start_file(self, pdf_path, output_path, page_count):
+        pdf_path = os.path.abspath(pdf_path)
+        fingerprint = file_fingerprint(pdf_path)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT fingerprint FROM files WHERE pdf_path = ?',
+                    (pdf_path,)).fetchone()
+                if row is not None and row[0] != fingerprint:
+                    self._conn.execute('DELETE FROM pages WHERE pdf_path = ?',
+                                       (pdf_path,))
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                    (pdf_path, output_path, fingerprint, page_count,
+                     'running', time.time()))
+                # Pages that failed are tried again
+                finished = {n for (n,) in self._conn.execute(
+                    'SELECT page_number FROM pages '
+                    'WHERE pdf_path = ? AND error IS NULL', (pdf_path,))}
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return finished
+
+    # Stores a page result dict ('page', 'text', 'source', 'error' and any
+    # other JSON-serializable fields such as 'tables')
+    def record_page(self, pdf_path, page):
+        data = {key: value for key, value in page.items()
+                if key not in ('page', 'text', 'source', 'error')}
+        self._execute(
+            'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+            (os.path.abspath(pdf_path), page['page'], page.get('text', ''),
+             page.get('source'), page.get('error'),
+             json.dumps(data, ensure_ascii=False)))
+
+    # Returns the stored page result dicts in page order
+    def page_results(self, pdf_path):
+        pages = []
+        for page_number, text, source, error, data in self._execute(
+                'SELECT page_number, text, source, error, data FROM pages '
+                'WHERE pdf_path = ? ORDER BY page_number',
+                (os.path.abspath(pdf_path),)):
+            page = json.loads(data) if data else {}
+            page.update(page=page_number, text=text, source=source,
+                        error=error)
+            pages.append(page)
+        return pages
+
+    # Returns a file's status ('running', 'done' or 'failed'), or None for a
+    # file this manifest has not seen
+    def file_status(self, pdf_path):
+        rows = self._execute('SELECT status FROM files WHERE pdf_path = ?',
+                             (os.path.abspath(pdf_path),))
+        return rows[0][0] if rows else None
+
+    def finish_file(self, pdf_path, success=True):
+        self._execute(
+            'UPDATE files SET status = ?, updated = ? WHERE pdf_path = ?',
+            ('done' if success else 'failed', time.time(),
+             os.path.abspath(pdf_path)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,252 @@
+import re
+import threading
+
+import fitz
+from PIL import Image
+
+from . import ocr_engine
+
+SUBJECT_LABEL = 'موضوع'
+DATE_LABEL = 'تاریخ'
+
+# The letterhead block (date, number, subject) sits in the top part of page 1
+HEADER_FRACTION = 0.35
+HEADER_DPI = 300
+FULL_PAGE_DPI = 200
+
+# PyMuPDF is not thread-safe: every fitz call made by threads that prepare
+# letters at the same time goes through this lock, only the OCR runs in
+# parallel
+fitz_lock = threading.Lock()
+
+# Longest subject kept, it ends up in the renamed file's name
+SUBJECT_LENGTH = 30
+SUBJECT_CLEANUP = re.compile(r'[\\.,#+[\](\)\\/:*?<>|]')
+
+# Persian and Arabic-Indic digits to ASCII, Arabic yeh/kaf to the Persian
+# letters, and tatweel, diacritics and direction marks dropped, so OCR
+# output and labels compare equal however the letter was typed
+NORMALIZE_TABLE = str.maketrans({
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', '٫': '/', '٬': ',',
+    **dict.fromkeys(map(chr, range(0x064B, 0x0653))),
+    'ـ': None, '‎': None, '‏': None,
+    **dict.fromkeys(map(chr, range(0x202A, 0x202F))),
+})
+# A label word, optionally glued to its colon and to the start of the value
+LABEL_PATTERNS = {
+    'subject': re.compile(rf'^{SUBJECT_LABEL}\s*[:：]?\s*(.*)$'),
+    'date': re.compile(rf'^{DATE_LABEL}\s*[:：]?\s*(.*)$'),
+}
+# Year/month/day or day/month/year, with any of the usual separators
+DATE_PATTERN = re.compile(
+    r'(?<!\d)(\d{1,4})\s*[/\-.]\s*(\d{1,2})\s*[/\-.]\s*(\d{1,4})(?!\d)')
+COLON_ONLY = re.compile(r'^[:：]+$')
+# A wider gap than this many line heights ends a value, e.g. where the next
+# column of the letterhead starts
+VALUE_GAP_LINES = 3
+
+# Confidence of a field is the mean OCR confidence of its words, scaled by
+# how it was found
+LABELED_WEIGHT = 1.0
+# A date anywhere in the header, without its label
+UNLABELED_WEIGHT = 0.6
+# A date that needed its two digit year or its order guessed
+REPAIRED_WEIGHT = 0.8
+
+
+def normalize(text):
+    return text.translate(NORMALIZE_TABLE)
+
+
+# Function to turn Tesseract's TSV output into the recognized words, each a
+# dict with its text, box and confidence (0-1)
+def parse_tsv(tsv):
+    words = []
+    for row in tsv.splitlines()[1:]:
+        columns = row.split('\t', 11)
+        if len(columns) < 12 or columns[0] != '5':
+            continue
+        text = normalize(columns[11]).strip()
+        if not text:
+            continue
+        left, top, width, height = map(int, columns[6:10])
+        words.append({
+            'text': text,
+            'left': left, 'top': top, 'width': width, 'height': height,
+            'confidence': max(0.0, float(columns[10])) / 100,
+        })
+    return words
+
+
+# Function to list the words following `label` on the same visual line, in
+# reading order, up to the first wide gap. Tesseract sometimes puts a label
+# and its value into different blocks, so lines are matched by vertical
+# overlap, not by line ids.
+def words_after(words, label, rtl=True):
+    middle = label['top'] + label['height'] / 2
+    max_gap = label['height'] * VALUE_GAP_LINES
+    following = []
+    for word in words:
+        if word is label or not word['top'] <= middle <= word['top'] + \
+                word['height']:
+            continue
+        if rtl and word['left'] + word['width'] <= label['left'] + 1:
+            following.append(word)
+        elif not rtl and word['left'] >= label['left'] + label['width'] - 1:
+            following.append(word)
+    following.sort(key=lambda word: word['left'], reverse=rtl)
+
+    value = []
+    edge = label['left'] if rtl else label['left'] + label['width']
+    for word in following:
+        if rtl:
+            gap, next_edge = edge - word['left'] - word['width'], word['left']
+        else:
+            gap, next_edge = word['left'] - edge, word['left'] + word['width']
+        if gap > max_gap:
+            break
+        value.append(word)
+        edge = next_edge
+    return value
+
+
+def _box(words):
+    left = min(word['left'] for word in words)
+    top = min(word['top'] for word in words)
+    right = max(word['left'] + word['width'] for word in words)
+    bottom = max(word['top'] + word['height'] for word in words)
+    return left, top, right - left, bottom - top
+
+
+def _field(value, text, words, weight):
+    return {
+        'value': value,
+        'text': text,
+        'confidence': round(weight * sum(word['confidence'] for word in words)
+                            / len(words), 3),
+        'box': _box(words),
+    }
+
+
+# Function to read a Jalali date from text, returns (JalaliDate, repaired)
+# or None when there is no valid date
+def parse_date(text):
+    from persiantools.jdatetime import JalaliDate
+
+    for match in DATE_PATTERN.finditer(text):
+        first, month, last = match.groups()
+        repaired = False
+        if len(first) < 3 and len(last) >= 3:
+            # Day first, as some letterheads print it
+            first, last = last, first
+            repaired = True
+        year, month, day = int(first), int(month), int(last)
+        if year < 100:
+            # '02/05/12' in a letter from this century of the Jalali calendar
+            year += 1300 if year > 50 else 1400
+            repaired = True
+        try:
+            return JalaliDate(year, month, day), repaired
+        except ValueError:
+            continue
+    return None
+
+
+# Function to find the letter's subject and date in OCR word boxes. Returns
+# {'subject': field, 'date': field}, a field being None when it was not
+# found, or a dict with the typed 'value' (str, JalaliDate), its 'text'
+# ('1402-05-12' for dates), 'confidence' between 0 and 1 and pixel 'box'.
+def find_fields(tsv, rtl=True):
+    words = parse_tsv(tsv)
+    fields = {'subject': None, 'date': None}
+    for word in words:
+        for name, pattern in LABEL_PATTERNS.items():
+            match = pattern.match(word['text'])
+            if fields[name] is not None or match is None:
+                continue
+            value_words = [w for w in words_after(words, word, rtl)
+                           if not COLON_ONLY.match(w['text'])]
+            texts = [w['text'] for w in value_words]
+            # The value may be glued to the label in the same word
+            if match.group(1):
+                value_words.insert(0, word)
+                texts.insert(0, match.group(1))
+            if not value_words:
+                continue
+            if name == 'subject':
+                subject = SUBJECT_CLEANUP.sub(
+                    '-', ' '.join(texts)[:SUBJECT_LENGTH].strip())
+                fields[name] = _field(subject, subject, value_words,
+                                      LABELED_WEIGHT)
+                continue
+            # Digits read left to right whatever the script around them
+            if rtl:
+                texts.reverse()
+            date = parse_date(' '.join(texts))
+            if date is not None:
+                weight = REPAIRED_WEIGHT if date[1] else LABELED_WEIGHT
+                fields[name] = _field(date[0], date[0].isoformat(),
+                                      value_words, weight)
+
+    if fields['date'] is None:
+        # Some letterheads print the date without a label
+        for word in words:
+            date = parse_date(word['text'])
+            if date is not None:
+                weight = UNLABELED_WEIGHT * (REPAIRED_WEIGHT if date[1] else 1)
+                fields['date'] = _field(date[0], date[0].isoformat(), [word],
+                                        weight)
+                break
+    return fields
+
+
+# Function to keep, per field, the more confident of two results
+def merge_fields(fields, other):
+    merged = {}
+    for name, field in fields.items():
+        alternative = other.get(name)
+        if field is None or (alternative is not None and
+                             alternative['confidence'] > field['confidence']):
+            field = alternative
+        merged[name] = field
+    return merged
+
+
+# Function to get (subject, date) as the strings the letter tools show and
+# store, '' for a missing field
+def field_texts(fields):
+    return tuple(fields[name]['text'] if fields[name] else ''
+                 for name in ('subject', 'date'))
+
+
+# Function to render part of a page (or all of it) as a grayscale image.
+# Callers on threads hold fitz_lock.
+def render_region(page, dpi, clip=None):
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY)
+    return Image.frombytes('L', (pix.width, pix.height), pix.samples)
+
+
+# Function to read subject and date fields from a letter by OCRing only the
+# header of page 1 at high resolution; the full first page is OCRed only
+# when one of the fields is not in the header
+def extract_letter_fields(pdf_path, lang='fas'):
+    with fitz_lock, fitz.open(pdf_path) as pdf_doc:
+        page = pdf_doc[0]
+        header = fitz.Rect(page.rect.x0, page.rect.y0, page.rect.x1,
+                           page.rect.y0 + page.rect.height * HEADER_FRACTION)
+        header_image = render_region(page, HEADER_DPI, header)
+    fields = find_fields(ocr_engine.image_to_data(header_image, lang=lang))
+    if all(fields.values()):
+        return fields
+
+    with fitz_lock, fitz.open(pdf_path) as pdf_doc:
+        page_image = render_region(pdf_doc[0], FULL_PAGE_DPI)
+    return merge_fields(fields, find_fields(ocr_engine.image_to_data(
+        page_image, lang=lang)))
+
+
+# Function to read (subject, date) strings from a letter, '' when missing
+def extract_fields(pdf_path, lang='fas'):
+    return field_texts(extract_letter_fields(pdf_path, lang))
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from . import ocr_engine
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_MB = 1024
+CACHE_FILE = 'ocr_cache.sqlite'
+
+# Entries are evicted down to this fraction of the limit, so a full cache
+# does not evict on every single insert
+EVICT_TO = 0.9
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def default_cache_dir():
+    if os.environ.get('LETTERSOCR_CACHE_DIR'):
+        return os.environ['LETTERSOCR_CACHE_DIR']
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'lettersocr')
+
+
+# Function to build the cache key of a (preprocessed) page image and the
+# tesseract config it is OCRed with
+def cache_key(image, config):
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(image, np.ndarray):
+        image = np.ascontiguousarray(image)
+        layout = f"{image.dtype}:{'x'.join(map(str, image.shape))}"
+        pixels = image.data
+    else:
+        layout = f"{image.mode}:{image.size[0]}x{image.size[1]}"
+        pixels = image.tobytes()
+    digest.update(f"{layout}:{config}\0".encode())
+    digest.update(pixels)
+    return digest.hexdigest()
+
+
+# Size-bounded LRU store of OCR results in SQLite. Every process opens its
+# own connection; SQLite's locking makes concurrent readers and writers safe.
+class OcrCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                tsv TEXT,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+            CREATE TABLE IF NOT EXISTS meta (total INTEGER NOT NULL);
+            INSERT INTO meta (total)
+                SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta);
+        ''')
+
+    # Returns {'text': ..., 'tsv': ...} or None, and marks the entry as used
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT text, tsv FROM pages WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE pages SET last_used = ? WHERE key = ?',
+                               (time.time(), key))
+        return {'text': row[0], 'tsv': row[1]}
+
+    def put(self, key, text, tsv=None):
+        size = len(key) + len(text.encode()) + len((tsv or '').encode())
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                    (key, text, tsv, size, time.time()))
+                self._conn.execute('UPDATE meta SET total = total + ?',
+                                   (size - (row[0] if row else 0),))
+                total = self._conn.execute(
+                    'SELECT total FROM meta').fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    # Drops least recently used entries; runs inside put's transaction
+    def _evict(self, total):
+        target = self.max_bytes * EVICT_TO
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute(
+                'SELECT key, size FROM pages ORDER BY last_used'):
+            if total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany('DELETE FROM pages WHERE key = ?', victims)
+        self._conn.execute('UPDATE meta SET total = total - ?', (freed,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Function to get this process's cache, or None when caching is disabled
+# (LETTERSOCR_CACHE_MAX_MB=0)
+def get_cache():
+    global _cache, _cache_pid
+    max_mb = float(os.environ.get('LETTERSOCR_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    if max_mb <= 0:
+        return None
+    with _cache_lock:
+        # SQLite connections must not be carried over into forked children
+        if _cache is None or _cache_pid != os.getpid():
+            try:
+                _cache = OcrCache(os.path.join(default_cache_dir(), CACHE_FILE),
+                                  int(max_mb * 1024 * 1024))
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("OCR cache disabled: %s", e)
+                _cache = None
+            _cache_pid = os.getpid()
+        return _cache
+
+
+def _lookup(image, config, cache):
+    if cache is None:
+        return None, None
+    key = cache_key(image, config)
+    try:
+        return key, cache.get(key)
+    except sqlite3.Error as e:
+        logger.error("Error reading OCR cache: %s", e)
+        return None, None
+
+
+def _store(cache, key, text, tsv):
+    if cache is None or key is None:
+        return
+    try:
+        cache.put(key, text, tsv)
+    except sqlite3.Error as e:
+        logger.error("Error writing OCR cache: %s", e)
+
+
+# Cached ocr_engine.image_to_string. The word boxes are stored alongside the
+# text whenever the engine produces them in the same pass.
+def image_to_string(image, config='', cache=None):
+    cache = cache or get_cache()
+    key, entry = _lookup(image, config, cache)
+    if entry is not None:
+        return entry['text']
+
+    if ocr_engine.get_engine(ocr_engine.parse_config(config)) is not None:
+        text, tsv = ocr_engine.image_to_string_and_data(image, config=config)
+    else:
+        text, tsv = ocr_engine.image_to_string(image, config=config), None
+    _store(cache, key, text, tsv)
+    return text
+
+
+# Cached ocr_engine.image_to_data (TSV word boxes)
+def image_to_data(image, config='', cache=None):
+    cache = cache or get_cache()
+    key, entry = _lookup(image, config, cache)
+    if entry is not None and entry['tsv'] is not None:
+        return entry['tsv']
+
+    text, tsv = ocr_engine.image_to_string_and_data(image, config=config)
+    _store(cache, key, text, tsv)
+    return tsv
@@ -0,0 +1,272 @@
+import ctypes
+import ctypes.util
+import locale
+import logging
+import os
+import shlex
+import threading
+
+import numpy as np
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Library names tried in order when TESSERACT_LIBRARY is not set
+LIBRARY_NAMES = ('tesseract', 'libtesseract.so.5', 'libtesseract.so.4',
+                 'libtesseract-5', 'libtesseract-4', 'libtesseract.5.dylib')
+
+# Same header line pytesseract.image_to_data returns
+TSV_HEADER = ('level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t'
+              'left\ttop\twidth\theight\tconf\ttext\n')
+
+_lib = None
+_lib_loaded = False
+# Held while loading, so a background warm-up and the first OCR call do not
+# race each other
+_lib_lock = threading.Lock()
+# Engines live per thread, so threads (e.g. table cell OCR) recognize in
+# parallel instead of queueing on one handle
+_local = threading.local()
+
+
+# Function to load libtesseract through ctypes, returns None when unavailable
+def load_library():
+    global _lib_loaded
+    with _lib_lock:
+        if not _lib_loaded:
+            _load_library()
+            _lib_loaded = True
+        return _lib
+
+
+def _load_library():
+    global _lib
+
+    candidates = []
+    if os.environ.get('TESSERACT_LIBRARY'):
+        candidates.append(os.environ['TESSERACT_LIBRARY'])
+    # On Windows the DLL sits next to the tesseract executable
+    cmd_dir = os.path.dirname(pytesseract.pytesseract.tesseract_cmd)
+    for name in LIBRARY_NAMES:
+        found = ctypes.util.find_library(name)
+        if found:
+            candidates.append(found)
+        candidates.append(name)
+        if cmd_dir:
+            candidates.append(os.path.join(cmd_dir, name + '.dll'))
+
+    for candidate in candidates:
+        try:
+            lib = ctypes.CDLL(candidate)
+            break
+        except OSError:
+            continue
+    else:
+        return
+
+    try:
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIInit2.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+        lib.TessBaseAPISetVariable.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetSourceResolution.argtypes = [
+            ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+            ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+        lib.TessBaseAPIGetTsvText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+    except AttributeError:
+        # Not a libtesseract with the C API
+        return
+
+    _lib = lib
+
+
+# Function to split a tesseract command line config into its parts
+def parse_config(config='', lang=None):
+    options = {'lang': lang or 'eng', 'oem': 3, 'psm': 3, 'dpi': None,
+               'variables': [], 'unsupported': []}
+    args = shlex.split(config or '')
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if arg == '-l' and value:
+            options['lang'] = value
+            i += 2
+        elif arg == '--oem' and value:
+            options['oem'] = int(value)
+            i += 2
+        elif arg == '--psm' and value:
+            options['psm'] = int(value)
+            i += 2
+        elif arg == '--dpi' and value:
+            options['dpi'] = int(value)
+            i += 2
+        elif arg == '-c' and value and '=' in value:
+            options['variables'].append(tuple(value.split('=', 1)))
+            i += 2
+        else:
+            options['unsupported'].append(arg)
+            i += 1
+    return options
+
+
+# One initialized TessBaseAPI handle, reused for every image it is given
+class TesseractEngine:
+    def __init__(self, lib, lang, oem, variables=()):
+        self._lib = lib
+        self.lang = lang
+        # Tesseract refuses to initialize unless numbers use the C locale
+        locale.setlocale(locale.LC_NUMERIC, 'C')
+        self._handle = lib.TessBaseAPICreate()
+        if lib.TessBaseAPIInit2(self._handle, None, lang.encode(), oem) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+            raise RuntimeError(f"Could not initialize tesseract for '{lang}'")
+        for name, value in variables:
+            lib.TessBaseAPISetVariable(
+                self._handle, name.encode(), value.encode())
+        self._lock = threading.Lock()
+
+    # Accepts PIL images and uint8 arrays (grayscale, or RGB channel order)
+    def _set_image(self, image, psm, dpi):
+        if isinstance(image, np.ndarray):
+            array = np.ascontiguousarray(image, dtype=np.uint8)
+        else:
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert(
+                    'L' if image.mode in ('1', 'LA') else 'RGB')
+            array = np.asarray(image)
+        if array.ndim == 3 and array.shape[2] == 4:
+            array = np.ascontiguousarray(array[:, :, :3])
+        height, width = array.shape[:2]
+        bytes_per_pixel = 1 if array.ndim == 2 else array.shape[2]
+        self._lib.TessBaseAPISetPageSegMode(self._handle, psm)
+        # Tesseract copies the pixels during SetImage
+        self._lib.TessBaseAPISetImage(
+            self._handle, array.ctypes.data_as(ctypes.c_char_p), width,
+            height, bytes_per_pixel, array.strides[0])
+        if dpi:
+            self._lib.TessBaseAPISetSourceResolution(self._handle, dpi)
+
+    def _take_text(self, pointer):
+        if not pointer:
+            return ''
+        try:
+            return ctypes.string_at(pointer).decode('utf-8', errors='replace')
+        finally:
+            self._lib.TessDeleteText(pointer)
+
+    def image_to_string(self, image, psm=3, dpi=None):
+        with self._lock:
+            self._set_image(image, psm, dpi)
+            try:
+                return self._take_text(
+                    self._lib.TessBaseAPIGetUTF8Text(self._handle))
+            finally:
+                self._lib.TessBaseAPIClear(self._handle)
+
+    # Recognizes once and returns both the text and the word boxes as TSV
+    def image_to_string_and_data(self, image, psm=3, dpi=None):
+        with self._lock:
+            self._set_image(image, psm, dpi)
+            try:
+                text = self._take_text(
+                    self._lib.TessBaseAPIGetUTF8Text(self._handle))
+                tsv = self._take_text(
+                    self._lib.TessBaseAPIGetTsvText(self._handle, 0))
+                return text, TSV_HEADER + tsv
+            finally:
+                self._lib.TessBaseAPIClear(self._handle)
+
+    def close(self):
+        if getattr(self, '_handle', None):
+            self._lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+    # Handles of finished threads are released with their thread-local
+    __del__ = close
+
+
+def _thread_state():
+    # Handles are never shared with forked children
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.engines = {}
+        _local.failed_keys = set()
+        _local.pid = os.getpid()
+    return _local
+
+
+# Function to get this thread's cached engine for a parsed config, or None
+# to fall back to pytesseract
+def get_engine(options):
+    if options['unsupported']:
+        return None
+    lib = load_library()
+    if lib is None:
+        return None
+
+    state = _thread_state()
+    key = (options['lang'], options['oem'], tuple(options['variables']))
+    if key in state.failed_keys:
+        return None
+    engine = state.engines.get(key)
+    if engine is None:
+        try:
+            engine = TesseractEngine(
+                lib, options['lang'], options['oem'], options['variables'])
+        except RuntimeError as e:
+            logger.warning("Falling back to pytesseract: %s", e)
+            state.failed_keys.add(key)
+            return None
+        state.engines[key] = engine
+    return engine
+
+
+# Drop-in replacement for pytesseract.image_to_string that keeps one
+# tesseract instance per language/config alive for each worker thread
+def image_to_string(image, lang=None, config=''):
+    options = parse_config(config, lang)
+    engine = get_engine(options)
+    if engine is None:
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+    return engine.image_to_string(image, options['psm'], options['dpi'])
+
+
+# Function returning (text, tsv) for an image; a single recognition pass when
+# the in-process engine is available
+def image_to_string_and_data(image, lang=None, config=''):
+    options = parse_config(config, lang)
+    engine = get_engine(options)
+    if engine is None:
+        return (pytesseract.image_to_string(image, lang=lang, config=config),
+                pytesseract.image_to_data(image, lang=lang, config=config))
+    return engine.image_to_string_and_data(
+        image, options['psm'], options['dpi'])
+
+
+# Drop-in replacement for pytesseract.image_to_data (TSV output)
+def image_to_data(image, lang=None, config=''):
+    options = parse_config(config, lang)
+    engine = get_engine(options)
+    if engine is None:
+        return pytesseract.image_to_data(image, lang=lang, config=config)
+    return engine.image_to_string_and_data(
+        image, options['psm'], options['dpi'])[1]
+
+
+# Function to release the cached tesseract handles of the calling thread
+def shutdown():
+    state = _thread_state()
+    for engine in state.engines.values():
+        engine.close()
+    state.engines.clear()
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent index of perceptual page hashes, so a page that was OCRed
+# before (a circular, an attachment, a letterhead-only page) reuses the
+# stored result when a rescan of it turns up in another PDF. Unlike the OCR
+# cache, which needs the very same pixels, near-duplicates match within a
+# Hamming distance.
+#
+# The hash is a pHash: the page is cropped to its ink, shrunk to a
+# thumbnail and the signs of its lowest DCT frequencies against their median
+# give HASH_BITS bits, which survive rescanning, noise and a different
+# resolution. Lookups use multi-index hashing: the hash is cut into CHUNKS
+# pieces stored in an indexed table, and two hashes within distance d agree
+# on at least one piece to within d // CHUNKS bits, so only pages sharing a
+# (nearly) equal piece are compared in full.
+#
+# numpy, cv2 and the OCR cache are imported by the functions that use them,
+# so the command line tools can read the constants below without loading
+# the OCR stack.
+
+INDEX_FILE = 'page_index.sqlite'
+
+# Long side (at most) of the copy the thumbnail is taken from, and
+# thumbnail side
+BOX_SIZE = 1024
+THUMBNAIL_SIZE = 64
+# Lowest frequencies kept per axis, giving FREQUENCIES ** 2 bits
+FREQUENCIES = 16
+HASH_BITS = FREQUENCIES ** 2
+CHUNKS = 16
+CHUNK_BITS = HASH_BITS // CHUNKS
+# Percent of the ink left outside the crop on each side, so stray specks
+# and noise at the edges do not move it
+BOX_PERCENTILE = 2
+
+# Rescans of a page are mostly within 24 bits of each other and different
+# letters 60 or more apart, but the same form filled in differently can
+# come within 34: larger distances risk reusing the text of another page.
+DEFAULT_MAX_DISTANCE = 24
+# Lookups probe each chunk's value and its one bit neighbours at most
+MAX_DISTANCE = 2 * CHUNKS - 1
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+
+# Function to compute the perceptual hash of a grayscale page (uint8
+# array), as HASH_BITS // 8 bytes. Returns None for a page without ink.
+def page_hash(gray):
+    import cv2
+    import numpy as np
+
+    # Area averaging at a whole factor, which is fast
+    factor = -(-max(gray.shape) // BOX_SIZE)
+    small = cv2.resize(gray, None, fx=1 / factor, fy=1 / factor,
+                       interpolation=cv2.INTER_AREA) if factor > 1 else gray
+    level = cv2.threshold(small, 0, 255,
+                          cv2.THRESH_BINARY + cv2.THRESH_OTSU)[0]
+    # The ink is found at full resolution, where thin rules and table
+    # borders are not yet washed out to grey
+    binary = cv2.threshold(gray, level, 1, cv2.THRESH_BINARY_INV)[1]
+    bounds = []
+    for axis in (1, 0):
+        ink = np.cumsum(cv2.reduce(binary, axis, cv2.REDUCE_SUM,
+                                   dtype=cv2.CV_32S).ravel())
+        if not ink[-1]:
+            return None
+        # The crop leaves out BOX_PERCENTILE percent of the ink on each side
+        bounds.append(np.searchsorted(
+            ink, ink[-1] * np.array((BOX_PERCENTILE, 100 - BOX_PERCENTILE))
+            / 100) // factor)
+    (top, bottom), (left, right) = bounds
+    if right <= left or bottom <= top:
+        return None
+    thumbnail = cv2.resize(small[top:bottom + 1, left:right + 1],
+                           (THUMBNAIL_SIZE, THUMBNAIL_SIZE),
+                           interpolation=cv2.INTER_AREA)
+    frequencies = cv2.dct(thumbnail.astype(np.float32))[:FREQUENCIES,
+                                                        :FREQUENCIES]
+    return np.packbits(frequencies > np.median(frequencies)).tobytes()
+
+
+def hash_distance(first, second):
+    return (int.from_bytes(first, 'big') ^
+            int.from_bytes(second, 'big')).bit_count()
+
+
+# Function to cut a hash into its CHUNKS pieces. Piece i takes every
+# CHUNKS-th bit from bit i, so every piece mixes low and high frequencies.
+def hash_chunks(page_hash):
+    import numpy as np
+
+    bits = np.unpackbits(np.frombuffer(page_hash, dtype=np.uint8))
+    pieces = np.packbits(bits.reshape(CHUNK_BITS, CHUNKS).T, axis=1)
+    return [int.from_bytes(piece.tobytes(), 'big') for piece in pieces]
+
+
+def _probe_keys(page_hash, max_distance):
+    radius = max_distance // CHUNKS
+    keys = []
+    for i, value in enumerate(hash_chunks(page_hash)):
+        keys.append(i << CHUNK_BITS | value)
+        if radius:
+            keys.extend(i << CHUNK_BITS | value ^ 1 << bit
+                        for bit in range(CHUNK_BITS))
+    return keys
+
+
+# The index in SQLite: one row per OCRed page and one row per piece of its
+# hash. Every process opens its own connection, like the OCR cache.
+class PageIndex:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                hash BLOB NOT NULL,
+                config TEXT NOT NULL,
+                text TEXT NOT NULL,
+                tables TEXT,
+                origin TEXT,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                key INTEGER NOT NULL,
+                page_id INTEGER NOT NULL,
+                PRIMARY KEY (key, page_id)
+            ) WITHOUT ROWID;
+        ''')
+
+    # Returns the closest stored page OCRed with `config` within
+    # max_distance bits, as {'text', 'tables', 'origin', 'distance'}, or
+    # None. `tables` is the JSON the page's tables were stored as.
+    def find(self, page_hash, config, max_distance=DEFAULT_MAX_DISTANCE):
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(
+                f"max_distance must be between 0 and {MAX_DISTANCE}")
+        keys = _probe_keys(page_hash, max_distance)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, hash FROM pages '
+                'WHERE config = ? AND id IN (SELECT page_id FROM chunks '
+                'WHERE key IN '
+                f"({','.join('?' * len(keys))}))",
+                [config] + keys).fetchall()
+            best_id = best_distance = None
+            for page_id, stored_hash in rows:
+                distance = hash_distance(page_hash, stored_hash)
+                if distance <= max_distance and (best_id is None or
+                                                 distance < best_distance):
+                    best_id, best_distance = page_id, distance
+            if best_id is None:
+                return None
+            # Only the best candidate's text and tables are read
+            text, tables, origin = self._conn.execute(
+                'SELECT text, tables, origin FROM pages WHERE id = ?',
+                (best_id,)).fetchone()
+        return {'text': text, 'tables': tables, 'origin': origin,
+                'distance': best_distance}
+
+    def add(self, page_hash, config, text, tables=None, origin=None):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                page_id = self._conn.execute(
+                    'INSERT INTO pages (hash, config, text, tables, origin, '
+                    'created) VALUES (?, ?, ?, ?, ?, ?)',
+                    (page_hash, config, text, tables, origin,
+                     time.time())).lastrowid
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO chunks VALUES (?, ?)',
+                    [(i << CHUNK_BITS | value, page_id)
+                     for i, value in enumerate(hash_chunks(page_hash))])
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Function to get this process's page index. When it cannot be opened the
+# error is raised once per process and later calls return None.
+# LETTERSOCR_PAGE_INDEX overrides its path.
+def get_index():
+    from .ocr_cache import default_cache_dir
+
+    global _index, _index_pid
+    with _index_lock:
+        # SQLite connections must not be carried over into forked children
+        if _index_pid != os.getpid():
+            _index = None
+            _index_pid = os.getpid()
+            path = os.environ.get('LETTERSOCR_PAGE_INDEX') or os.path.join(
+                default_cache_dir(), INDEX_FILE)
+            _index = PageIndex(path)
+        return _index
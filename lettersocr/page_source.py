@@ -0,0 +1,106 @@
+# pdf2image, numpy and cv2 are imported on first use, so importing this module
+# (e.g. for ADAPTIVE_DPI) stays cheap at GUI startup
+
+# pdf2image's own default resolution
+DEFAULT_DPI = 200
+
+# Pass as dpi to choose the resolution per page from its text size
+ADAPTIVE_DPI = 'auto'
+PREVIEW_DPI = 72
+MIN_DPI = 150
+MAX_DPI = 400
+# Median glyph height in pixels; puts the x-height near the ~20 px tesseract
+# recognizes best
+TARGET_GLYPH_HEIGHT = 22
+
+
+# Function to read the number of pages without rasterizing anything
+def count_pages(pdf_path):
+    from pdf2image import pdfinfo_from_path
+    return pdfinfo_from_path(pdf_path)['Pages']
+
+
+# Function to rasterize a single page (1-based), e.g. inside a worker process
+def render_page(pdf_path, page_number, dpi=DEFAULT_DPI):
+    from pdf2image import convert_from_path
+    return convert_from_path(pdf_path, dpi=dpi, first_page=page_number,
+                             last_page=page_number)[0]
+
+
+# Function to estimate the typical glyph height of a page, in points, from
+# the connected components of a cheap low resolution preview. Returns None
+# when the page has no text-like components.
+def estimate_glyph_height(pdf_path, page_number):
+    import cv2
+    import numpy as np
+    from pdf2image import convert_from_path
+
+    preview = convert_from_path(pdf_path, dpi=PREVIEW_DPI, grayscale=True,
+                                first_page=page_number,
+                                last_page=page_number)[0]
+    gray = np.asarray(preview)
+    binary = cv2.threshold(
+        gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary,
+                                                          connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Drop specks, rules, table borders and pictures
+    glyphs = (heights >= 2) & (heights <= gray.shape[0] // 20) & \
+        (widths <= heights * 4)
+    if not glyphs.any():
+        return None
+    return float(np.median(heights[glyphs])) * 72 / PREVIEW_DPI
+
+
+# Function to pick the resolution that puts a page's glyphs at
+# TARGET_GLYPH_HEIGHT pixels, within [min_dpi, max_dpi]
+def choose_dpi(pdf_path, page_number, min_dpi=MIN_DPI, max_dpi=MAX_DPI):
+    glyph_height = estimate_glyph_height(pdf_path, page_number)
+    if glyph_height is None:
+        # Nothing to read, so the cheapest rendering will do
+        return min_dpi
+    dpi = TARGET_GLYPH_HEIGHT * 72 / glyph_height
+    return int(min(max(round(dpi / 10) * 10, min_dpi), max_dpi))
+
+
+# Function to rasterize a page at the DPI choose_dpi picks, returns both
+def render_page_adaptive(pdf_path, page_number, min_dpi=MIN_DPI,
+                         max_dpi=MAX_DPI):
+    dpi = choose_dpi(pdf_path, page_number, min_dpi, max_dpi)
+    return render_page(pdf_path, page_number, dpi), dpi
+
+
+# Lazily rasterizes a PDF a few pages at a time, so only `window` page
+# images are alive at once no matter how long the document is. With
+# dpi=ADAPTIVE_DPI every page is rendered at its own resolution. Iteration
+# starts at first_page, e.g. to resume an interrupted run.
+class PageSource:
+    def __init__(self, pdf_path, dpi=DEFAULT_DPI, window=1, first_page=1):
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.window = max(1, int(window))
+        self.first_page = max(1, int(first_page))
+        self.page_count = count_pages(pdf_path)
+
+    def __len__(self):
+        return self.page_count
+
+    def __iter__(self):
+        from pdf2image import convert_from_path
+
+        if self.dpi == ADAPTIVE_DPI:
+            for page_number in range(self.first_page, self.page_count + 1):
+                yield render_page_adaptive(self.pdf_path, page_number)[0]
+            return
+        for first_page in range(self.first_page, self.page_count + 1,
+                                self.window):
+            last_page = min(first_page + self.window - 1, self.page_count)
+            images = convert_from_path(
+                self.pdf_path, dpi=self.dpi,
+                first_page=first_page, last_page=last_page)
+            # Hand pages out one by one and drop our reference to each, so a
+            # consumer that discards the page lets it be freed immediately.
+            images.reverse()
+            while images:
+                yield images.pop()
@@ -0,0 +1,491 @@
+import os
+import threading
+
+from . import instrumentation
+from .job_manifest import JobManifest, manifest_path_for
+from .page_source import (ADAPTIVE_DPI, count_pages, render_page,
+                          render_page_adaptive)
+from .writers import OUTPUT_FORMATS, output_path_for, write_outputs
+
+# The OCR stack (numpy, cv2, tesseract, PyMuPDF) is imported by the functions
+# that use it, so a GUI importing this module opens its window right away
+# and pool workers only load what their pages need. See startup.warm_up.
+
+# UI language choices and the tesseract models they use; any other value is
+# passed to tesseract as is (e.g. 'fas+equ')
+LANGUAGES = {
+    'fas': 'fas+ara+equ',
+    'eng': 'eng',
+    'deu': 'deu',
+    'math': 'eng+equ',
+}
+RTL_LANGUAGES = ('fas', 'ara')
+
+# Table handling: ignore tables, write only the tables of each page, or
+# write the tables after the page text
+TABLE_MODES = ('off', 'only', 'append')
+
+# Blank pages (backs of duplex scans, separator sheets) are not OCRed: they
+# are kept as empty pages, left out of the outputs, or OCRed like any page
+BLANK_PAGE_MODES = ('empty', 'drop', 'ocr')
+
+
+def tesseract_languages(language):
+    return LANGUAGES.get(language, language)
+
+
+def is_rtl(language):
+    return any(code in RTL_LANGUAGES
+               for code in tesseract_languages(language).split('+'))
+
+
+# Function to decide whether a file's document is right-to-left from the
+# tesseract languages its pages were OCRed with (see auto_language), falling
+# back to the language the file was converted with
+def document_is_rtl(pages, language):
+    languages = [page['language'] for page in pages if page.get('language')]
+    if not languages:
+        return is_rtl(language)
+    return sum(map(is_rtl, languages)) * 2 >= len(languages)
+
+
+# `models` overrides the tesseract languages the language stands for, e.g.
+# with the set chosen by script detection
+def build_config(language, dpi=None, models=None):
+    custom_config = r'--oem 3 --psm 6 -l ' + (models or
+                                              tesseract_languages(language))
+    if dpi:
+        custom_config += f' --dpi {dpi}'
+    return custom_config
+
+
+# Function to list the pages that go into a file's outputs
+def output_pages(pages, blank_pages='empty'):
+    if blank_pages != 'drop':
+        return pages
+    return [page for page in pages if page['source'] != 'blank']
+
+
+# Function to OCR one rasterized page, returns (text, tables). Each step is
+# timed as an instrumentation stage. With orient, a page scanned sideways or
+# upside down is turned upright first.
+def ocr_image(image, language, dpi=None, table_mode='off',
+              parallel_cells=True, models=None, orient=False):
+    image = _preprocess(image, language, orient)
+    config = build_config(language, dpi, models)
+    return _ocr_preprocessed(image, language, config, table_mode,
+                             parallel_cells)
+
+
+def _preprocess(image, language, orient=False):
+    from .preprocess import DEFAULT_STEPS, ORIENT_STEPS, preprocess_image
+
+    with instrumentation.stage('preprocess', language=language) as event:
+        image = preprocess_image(image,
+                                 ORIENT_STEPS if orient else DEFAULT_STEPS)
+        event.update(height=image.shape[0], width=image.shape[1],
+                     bytes=image.nbytes)
+    return image
+
+
+def _ocr_preprocessed(image, language, config, table_mode, parallel_cells):
+    from . import ocr_cache
+
+    text = ''
+    if table_mode != 'only':
+        with instrumentation.stage('ocr', language=language) as event:
+            text = ocr_cache.image_to_string(image, config=config)
+            event.update(height=image.shape[0], width=image.shape[1],
+                         bytes=len(text.encode('utf-8')))
+    page_tables = []
+    if table_mode != 'off':
+        from . import tables
+        with instrumentation.stage('tables', language=language) as event:
+            page_tables = tables.extract_tables(image, config, parallel_cells)
+            event.update(height=image.shape[0], width=image.shape[1])
+    return text, page_tables
+
+
+# Function to OCR a page, or reuse the result of a near-duplicate page found
+# in the page index. OCRed pages are added to the index, with `origin` as
+# the place they were read from. Returns (text, tables, origin of the reused
+# page or None).
+def _ocr_or_reuse(image, language, dpi, models, table_mode, parallel_cells,
+                  orient, max_distance, origin):
+    import json
+
+    from . import page_index
+
+    image = _preprocess(image, language, orient)
+    # Text and tables depend on the table mode as well as on the config. The
+    # DPI is left out, so a page rescanned at another resolution still
+    # matches.
+    key = f"{build_config(language, None, models)} tables={table_mode}"
+    index = page_hash = found = None
+    try:
+        with instrumentation.stage('duplicate_lookup', language=language):
+            index = page_index.get_index()
+            if index is not None:
+                page_hash = page_index.page_hash(image)
+            if page_hash is not None:
+                found = index.find(page_hash, key, max_distance)
+    except Exception:
+        # Reported by the stage event; OCR the page instead
+        page_hash = None
+    if found is not None:
+        return (found['text'], json.loads(found['tables'] or '[]'),
+                found['origin'])
+
+    text, page_tables = _ocr_preprocessed(
+        image, language, build_config(language, dpi, models), table_mode,
+        parallel_cells)
+    if page_hash is not None:
+        try:
+            with instrumentation.stage('duplicate_add', language=language):
+                index.add(page_hash, key, text,
+                          json.dumps(page_tables, ensure_ascii=False),
+                          origin)
+        except Exception:
+            # Reported by the stage event; the page itself was OCRed fine
+            pass
+    return text, page_tables, None
+
+
+# Worker entry point: reads or OCRs one page, so only a page number and the
+# resulting page dict ever cross the process boundary. The source is 'text'
+# when the PDF's own text layer was good enough, 'blank' for a blank page
+# that was not OCRed, 'duplicate' for a page whose OCR result was reused
+# from a near-duplicate (named by page['duplicate_of']) and 'ocr'
+# otherwise. The page's instrumentation events travel back in
+# page['events'].
+def process_page(task):
+    pdf_path, page_number, options = task
+    page = {'page': page_number, 'text': '', 'source': 'ocr', 'error': None}
+    with instrumentation.collect(file=pdf_path, page=page_number,
+                                 language=options['language']) as events:
+        try:
+            with instrumentation.stage('page'):
+                _process_page(pdf_path, page_number, options, page)
+        except Exception as e:
+            page['error'] = str(e)
+    page['events'] = events
+    return pdf_path, page
+
+
+def _process_page(pdf_path, page_number, options, page):
+    if options['use_text_layer'] and options['table_mode'] != 'only':
+        from . import text_layer
+        try:
+            with instrumentation.stage('text_layer') as event:
+                text = text_layer.page_text(pdf_path, page_number)
+                event['bytes'] = len(text.encode('utf-8')) if text else 0
+        except Exception:
+            # Reported by the stage event; OCR the page instead
+            text = None
+        if text is not None:
+            page.update(text=text, source='text')
+            return
+
+    with instrumentation.stage('rasterize') as event:
+        if options['dpi'] == ADAPTIVE_DPI:
+            image, dpi = render_page_adaptive(pdf_path, page_number)
+        else:
+            dpi = options['dpi']
+            image = render_page(pdf_path, page_number, dpi)
+        event.update(width=image.width, height=image.height,
+                     bytes=image.width * image.height * len(image.getbands()))
+    if options['blank_pages'] != 'ocr':
+        from .blank_page import is_blank
+        with instrumentation.stage('blank_check'):
+            blank = is_blank(image, **options['blank_thresholds'])
+        if blank:
+            page.update(source='blank', dpi=dpi)
+            return
+    models = None
+    if options['auto_language']:
+        from .script_detect import detect_languages
+        with instrumentation.stage('detect_script') as event:
+            models = detect_languages(image, options['language'])
+            event['language'] = models or tesseract_languages(
+                options['language'])
+        page['language'] = event['language']
+    if options['duplicate_distance'] is None:
+        text, page_tables = ocr_image(
+            image, options['language'], dpi, options['table_mode'],
+            options['parallel_cells'], models, options['orient_pages'])
+    else:
+        text, page_tables, duplicate_of = _ocr_or_reuse(
+            image, options['language'], dpi, models, options['table_mode'],
+            options['parallel_cells'], options['orient_pages'],
+            options['duplicate_distance'], f"{pdf_path}#{page_number}")
+        if duplicate_of is not None:
+            page.update(source='duplicate', duplicate_of=duplicate_of)
+    page.update(text=text, dpi=dpi)
+    if page_tables:
+        page['tables'] = page_tables
+
+
+# Function to list the PDFs in the given files and folders
+def find_pdfs(paths, recursive=True):
+    pdf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                pdf_files.extend(
+                    os.path.join(root, file)
+                    for root, _, files in os.walk(path)
+                    for file in sorted(files) if file.lower().endswith('.pdf'))
+            else:
+                pdf_files.extend(
+                    os.path.join(path, file) for file in sorted(os.listdir(path))
+                    if file.lower().endswith('.pdf'))
+        else:
+            pdf_files.append(path)
+    return pdf_files
+
+
+# Pause, resume and cancel for a running convert_pdfs, from any thread.
+# Pausing stops handing out pages; the pages already being OCRed finish.
+# Cancelling stops at the next finished page and abandons the pages still
+# in flight. Finished pages stay checkpointed, so converting the same files
+# again resumes the job.
+class RunControl:
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._slots = None
+        self._closed = False
+        self.cancelled = False
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        # Wake up a paused run so it can stop
+        self._running.set()
+
+    # Function to pass tasks through while running, waiting while paused.
+    # A pool takes every task it is given at once, so at most `in_flight`
+    # tasks are let through until task_done() reports them finished.
+    # The gate runs in the pool's task thread, so it must also give up once
+    # the run is over (close()) or the pool could never be terminated.
+    def gate(self, tasks, in_flight):
+        self._slots = threading.Semaphore(in_flight)
+        self._closed = False
+        for task in tasks:
+            while not self._slots.acquire(timeout=0.1):
+                if self._stopping:
+                    return
+            while not self._running.wait(timeout=0.1):
+                if self._stopping:
+                    return
+            if self._stopping:
+                return
+            yield task
+
+    @property
+    def _stopping(self):
+        return self.cancelled or self._closed
+
+    def task_done(self):
+        self._slots.release()
+
+    # Function to stop handing out pages once a run has ended, also when it
+    # ended with an error; unlike cancel() the run does not count as
+    # cancelled
+    def close(self):
+        self._closed = True
+
+
+# Function to close the PDF the text layer reader of this process keeps
+# open, without importing PyMuPDF when it was never used
+def close_text_layer():
+    import sys
+
+    text_layer = sys.modules.get(__package__ + '.text_layer')
+    if text_layer is not None:
+        text_layer.close_document()
+
+
+def _manifest_dir(pdf_paths, save_dir):
+    if save_dir is not None:
+        return save_dir
+    folders = [os.path.dirname(os.path.abspath(p)) for p in pdf_paths]
+    return os.path.commonpath(folders) if folders else '.'
+
+
+# Function to OCR many PDFs with their pages spread over a process pool.
+# Outputs go to save_dir, or next to each PDF when it is None. Every
+# finished page is checkpointed in a job manifest, so a rerun after a crash
+# only OCRs the pages that are missing. Each file's outputs are built from
+# the stored pages, in order, as soon as its last page is done. Files whose
+# outputs all exist are skipped unless skip_existing is False, or the
+# manifest has them as failed or unfinished.
+# With auto_language, `language` is only a hint: each page is OCRed with
+# the smallest language set for the script detected on it.
+# Blank pages are found without OCR and handled as blank_pages says (see
+# BLANK_PAGE_MODES); blank_thresholds overrides max_ink and max_marks of
+# blank_page.is_blank.
+# With duplicate_distance set, a page within that many bits of a page OCRed
+# before (see page_index) reuses its text and tables instead of being
+# OCRed; None OCRs every page.
+# With orient_pages, pages scanned sideways or upside down are turned
+# upright before OCR (see preprocess.estimate_rotation); otherwise they are
+# only straightened.
+# file_callback(pdf_path, success) is called as each file is done, and a
+# RunControl passed as control can pause or cancel the run.
+# Returns the list of files that failed, including files with failed
+# pages.
+def convert_pdfs(pdf_paths, language, save_dir=None, progress_callback=None,
+                 workers=None, formats=('docx',), use_text_layer=True,
+                 dpi=ADAPTIVE_DPI, table_mode='off', skip_existing=True,
+                 file_callback=None, control=None, auto_language=False,
+                 blank_pages='empty', blank_thresholds=None,
+                 duplicate_distance=None, orient_pages=False):
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output formats: {sorted(unknown)}")
+    if table_mode not in TABLE_MODES:
+        raise ValueError(f"Unknown table mode: {table_mode}")
+    if blank_pages not in BLANK_PAGE_MODES:
+        raise ValueError(f"Unknown blank page mode: {blank_pages}")
+    if duplicate_distance is not None:
+        from .page_index import MAX_DISTANCE
+        if not 0 <= duplicate_distance <= MAX_DISTANCE:
+            raise ValueError(
+                f"Duplicate distance must be between 0 and {MAX_DISTANCE}")
+    pdf_paths = list(pdf_paths)
+    if not pdf_paths:
+        return []
+
+    failed_files = []
+    manifest = JobManifest(manifest_path_for(_manifest_dir(pdf_paths,
+                                                           save_dir)))
+    page_counts = {}
+    remaining = {}
+    for pdf_path in pdf_paths:
+        # Outputs of a file that failed or was interrupted are not skipped,
+        # so its unfinished pages are tried again
+        if skip_existing and all(
+                os.path.exists(output_path_for(pdf_path, save_dir, fmt))
+                for fmt in formats) and manifest.file_status(
+                    pdf_path) in (None, 'done'):
+            continue
+        try:
+            with instrumentation.stage('open', file=pdf_path,
+                                       language=language) as event:
+                page_counts[pdf_path] = count_pages(pdf_path)
+                finished = manifest.start_file(
+                    pdf_path, output_path_for(pdf_path, save_dir, formats[0]),
+                    page_counts[pdf_path])
+                event['bytes'] = os.path.getsize(pdf_path)
+        except Exception:
+            failed_files.append(pdf_path)
+            page_counts.pop(pdf_path, None)
+            if file_callback:
+                file_callback(pdf_path, False)
+            continue
+        remaining[pdf_path] = [n for n in range(1, page_counts[pdf_path] + 1)
+                               if n not in finished]
+
+    def finish(pdf_path):
+        close_text_layer()
+        pages = []
+        try:
+            with instrumentation.stage('write', file=pdf_path,
+                                       language=language) as event:
+                pages = manifest.page_results(pdf_path)
+                success = write_outputs(output_pages(pages, blank_pages),
+                                        pdf_path, save_dir, formats,
+                                        document_is_rtl(pages, language))
+                paths = [output_path_for(pdf_path, save_dir, fmt)
+                         for fmt in formats]
+                event['bytes'] = sum(os.path.getsize(path) for path in paths
+                                     if os.path.exists(path))
+                if not success:
+                    event['error'] = 'the output files could not be written'
+        except Exception:
+            success = False
+        # The outputs of a file with failed pages are kept, but the file
+        # counts as failed
+        if any(page.get('error') for page in pages):
+            success = False
+        manifest.finish_file(pdf_path, success)
+        if not success:
+            failed_files.append(pdf_path)
+        if file_callback:
+            file_callback(pdf_path, success)
+
+    total_pages = sum(page_counts.values())
+    done_pages = total_pages - sum(len(pages) for pages in remaining.values())
+    # Files whose pages were all checkpointed by an earlier run
+    for pdf_path, pages in remaining.items():
+        if not pages:
+            finish(pdf_path)
+    if progress_callback and done_pages:
+        progress_callback(done_pages / total_pages * 100)
+
+    # With pages in parallel, table cells of one page are OCRed serially
+    options = {'language': language, 'use_text_layer': use_text_layer,
+               'dpi': dpi, 'table_mode': table_mode,
+               'parallel_cells': workers == 1,
+               'auto_language': auto_language,
+               'blank_pages': blank_pages,
+               'blank_thresholds': dict(blank_thresholds or {}),
+               'duplicate_distance': duplicate_distance,
+               'orient_pages': orient_pages}
+    tasks = ((pdf_path, page_number, options)
+             for pdf_path, pages in remaining.items()
+             for page_number in pages)
+    if control is not None:
+        tasks = control.gate(tasks, (workers or os.cpu_count() or 1) * 2)
+    pending = {pdf_path: len(pages) for pdf_path, pages in remaining.items()}
+
+    if workers != 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+    else:
+        pool = None
+    try:
+        results = pool.imap_unordered(process_page, tasks) if pool else map(
+            process_page, tasks)
+        for pdf_path, page in results:
+            if control is not None:
+                control.task_done()
+            instrumentation.emit(page.pop('events'))
+            manifest.record_page(pdf_path, page)
+
+            done_pages += 1
+            if progress_callback:
+                progress_callback(done_pages / total_pages * 100)
+
+            pending[pdf_path] -= 1
+            if pending[pdf_path] == 0:
+                finish(pdf_path)
+            if control is not None and control.cancelled:
+                # The pool is terminated below, with the pages in flight
+                break
+    finally:
+        if control is not None:
+            control.close()
+        if pool:
+            pool.terminate()
+            pool.join()
+        close_text_layer()
+        manifest.close()
+
+    return failed_files
+
+
+def convert_pdf_to_word(pdf_path, language, save_dir=None,
+                        progress_callback=None, workers=1, **options):
+    return not convert_pdfs([pdf_path], language, save_dir, progress_callback,
+                            workers, **options)
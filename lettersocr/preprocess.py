@@ -0,0 +1,306 @@
+import threading
+
+import cv2
+import numpy as np
+
+# The old PIL chain, convert('L') -> ImageEnhance.Contrast(2) ->
+# ImageFilter.SHARPEN with the same strengths, after straightening the page.
+# ORIENT_STEPS also turns pages scanned sideways or upside down upright.
+DEFAULT_STEPS = ('grayscale', 'deskew', 'contrast', 'sharpen')
+ORIENT_STEPS = ('grayscale', 'orient', 'contrast', 'sharpen')
+CONTRAST = 2.0
+# PIL's SHARPEN kernel
+SHARPEN_KERNEL = np.array([[-2, -2, -2],
+                           [-2, 32, -2],
+                           [-2, -2, -2]], dtype=np.float32) / 16
+BINARIZE_BLOCK_SIZE = 31
+BINARIZE_C = 15
+DENOISE_KERNEL = 3
+
+# Skew and orientation are estimated on a copy this size (long side)
+DESKEW_SIZE = 800
+# Skew angles searched, in degrees either way, coarse step then fine step
+MAX_SKEW = 15.0
+COARSE_STEP = 1.0
+FINE_STEP = 0.1
+# Smaller skews are left alone, they cost tesseract nothing
+MIN_SKEW = 0.2
+# Text pixels sampled for the projection profiles, and the fewest worth
+# estimating from
+MAX_SAMPLES = 8000
+MIN_POINTS = 100
+# Lines must score this much better down the page than across it, per row
+# of the profile, for the page to be taken as turned by 90 degrees, and as
+# much better across it to be taken as level. Pages in between are not
+# turned.
+QUARTER_TURN_RATIO = 1.25
+# Ink above the dense middle band of a text line minus ink below it, as a
+# share of both: ascenders and capitals outweigh descenders in Latin and
+# Persian alike. A page reads one way up when the median line leans that
+# way by LINE_BALANCE and LINE_AGREEMENT of its lines agree. Pages with
+# fewer lines, like most tables, are left as they are.
+LINE_BALANCE = 0.15
+LINE_AGREEMENT = 0.6
+MIN_LINES = 10
+# A row is a rule, not text, when this share of it between its first and
+# last ink pixel is inked. A line is a table row when one column is inked
+# this much from RULE_OVERHANG rows above the line to as many below it.
+RULE_FILL = 0.85
+RULE_OVERHANG = 3
+
+
+def _profile_scores(ys, xs, angles, per_row=False):
+    # Sharpness of the row profile of the points rotated by each angle:
+    # highest when the text lines are level. All angles go through one
+    # bincount, each angle's rows offset into its own range.
+    angles = np.radians(angles).astype(np.float32)
+    rows = (np.outer(np.cos(angles), ys) -
+            np.outer(np.sin(angles), xs)).astype(np.int32)
+    rows -= rows.min(axis=1, keepdims=True)
+    spans = rows.max(axis=1) + 1
+    span = int(spans.max())
+    rows += np.arange(len(angles), dtype=np.int32)[:, None] * span
+    counts = np.bincount(rows.ravel(), minlength=len(angles) * span)
+    counts = counts.reshape(len(angles), span).astype(np.float64)
+    scores = np.einsum('ij,ij->i', counts, counts)
+    if per_row:
+        # Relative to the points spread evenly over the profile's rows. The
+        # raw sum grows with the ink per row, so a column of short lines
+        # would outscore its own lines seen across.
+        scores *= spans / float(len(ys)) ** 2
+    return scores
+
+
+def _refine_skew(ys, xs, coarse):
+    # One step past either end for the averaging below
+    reach = COARSE_STEP + FINE_STEP
+    fine = np.arange(coarse - reach, coarse + reach + FINE_STEP / 2,
+                     FINE_STEP)
+    # Short lines only move by a whole row every few tenths of a degree:
+    # their profile stays flat around the level angle, with narrow peaks
+    # from rounding beside it. Averaged over neighbouring angles the flat
+    # stretch wins, and the middle of it is taken.
+    scores = np.convolve(_profile_scores(ys, xs, fine), np.ones(3) / 3,
+                         mode='valid')
+    best = np.flatnonzero(scores >= scores.max() * (1 - 1e-9))
+    return float(fine[1 + best[len(best) // 2]])
+
+
+def _line_balances(binary):
+    rows = binary.sum(axis=1)
+    # Rows of table and underline rules would pass for the dense band of a
+    # line. They are inked almost from their first ink pixel to their last,
+    # text has gaps between letters and words. Thin rules are split over
+    # neighbouring rows on the small copy, so rows are taken three at a time.
+    width = binary.shape[1]
+    merged = cv2.dilate(binary, np.ones((3, 1), np.uint8))
+    first = np.argmax(merged, axis=1)
+    span = width - np.argmax(merged[:, ::-1], axis=1) - first
+    rules = (span > width // 20) & (merged.sum(axis=1) > span * RULE_FILL)
+    rows[cv2.dilate(rules.astype(np.uint8), np.ones((3, 1), np.uint8))
+         .ravel() > 0] = 0
+    text_rows = rows > rows.max() * 0.02
+    # Starts and ends of the runs of text rows
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], text_rows, [0]))))
+    balances = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < 3:
+            continue
+        # A table row: a vertical rule runs through it and on past its
+        # edges, where a letter would stop. The rule may be broken.
+        around = binary[max(start - RULE_OVERHANG, 0):end + RULE_OVERHANG]
+        if around.sum(axis=0).max() >= len(around) * RULE_FILL:
+            continue
+        # Without the ink spread evenly over the line, like scanner noise
+        line = rows[start:end] - rows[start:end].min()
+        dense = np.flatnonzero(line >= line.max() / 2)
+        above = int(line[:dense[0]].sum())
+        below = int(line[dense[-1] + 1:].sum())
+        if above + below:
+            balances.append((above - below) / (above + below))
+    return np.array(balances)
+
+
+# Function to tell which way up the text lines of a level page read: 1 when
+# upright, -1 when upside down, 0 when unsure
+def _reading_direction(binary):
+    balances = _line_balances(binary)
+    if len(balances) < MIN_LINES:
+        return 0
+    for direction in (1, -1):
+        if (np.median(balances) * direction >= LINE_BALANCE and
+                np.mean(balances * direction > 0) >= LINE_AGREEMENT):
+            return direction
+    return 0
+
+
+# Function to estimate how far a page is turned. Works on a small binarized
+# copy and costs a few milliseconds. Returns (angle, quarter_turns): rotating
+# the page counterclockwise by quarter_turns * 90 + angle degrees (as
+# cv2.getRotationMatrix2D does) makes it upright and level. Without orient
+# only the skew is estimated and quarter_turns is 0. Pages are only turned
+# when both the direction of their lines and which way up they read are
+# clear.
+def estimate_rotation(gray, orient=True):
+    # Bilinear sampling is several times cheaper than area averaging and
+    # keeps enough of the strokes for the line profiles
+    scale = DESKEW_SIZE / max(gray.shape)
+    small = cv2.resize(gray, None, fx=scale, fy=scale,
+                       interpolation=cv2.INTER_LINEAR) if scale < 1 else gray
+    binary = cv2.threshold(small, 0, 1,
+                           cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    points = cv2.findNonZero(binary)
+    if points is None or len(points) < MIN_POINTS:
+        return 0.0, 0
+    points = points.reshape(-1, 2)
+    points = points[::len(points) // MAX_SAMPLES + 1].astype(np.float32)
+    xs, ys = points[:, 0], points[:, 1]
+
+    # Level text lines across the page, or running down it
+    coarse = np.arange(-MAX_SKEW, MAX_SKEW + COARSE_STEP / 2, COARSE_STEP)
+    across = _profile_scores(ys, xs, coarse, per_row=True)
+    if not orient:
+        return _refine_skew(ys, xs, coarse[int(np.argmax(across))]), 0
+    down = _profile_scores(xs, -ys, coarse, per_row=True)
+    sideways = max(down) > max(across) * QUARTER_TURN_RATIO
+    if sideways:
+        quarter_turns = 1
+        angle = _refine_skew(xs, -ys, coarse[int(np.argmax(down))])
+    else:
+        quarter_turns = 0
+        angle = _refine_skew(ys, xs, coarse[int(np.argmax(across))])
+        # Measured across, the letters of a page turned by 90 degrees would
+        # pass for many short lines
+        if max(across) <= max(down) * QUARTER_TURN_RATIO:
+            return angle, 0
+
+    matrix = cv2.getRotationMatrix2D(
+        (small.shape[1] / 2, small.shape[0] / 2), quarter_turns * 90 + angle,
+        1.0)
+    size = small.shape[::-1] if quarter_turns % 2 == 0 else small.shape
+    leveled = cv2.warpAffine(binary, _centered(matrix, small.shape, size),
+                             size, flags=cv2.INTER_NEAREST)
+    direction = _reading_direction(leveled)
+    if direction < 0:
+        quarter_turns += 2
+    elif direction == 0 and sideways:
+        # Turning either way could as well leave the page upside down.
+        # The angle levels the lines running down the page just as well.
+        quarter_turns = 0
+    return angle, quarter_turns
+
+
+def _centered(matrix, shape, size):
+    # Moves the rotated page's center to the center of the output size
+    matrix[0, 2] += size[0] / 2 - shape[1] / 2
+    matrix[1, 2] += size[1] / 2 - shape[0] / 2
+    return matrix
+
+
+# Runs the preprocessing steps on one grayscale uint8 buffer. Scratch arrays
+# are kept between calls and reused while the page size stays the same, so
+# the returned array is overwritten by the next call; copy it to keep it.
+# Instances are not thread-safe, see preprocess_image.
+class Preprocessor:
+    def __init__(self, steps=DEFAULT_STEPS, contrast=CONTRAST):
+        unknown = set(steps) - set(self.STEPS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing steps: {sorted(unknown)}")
+        self.steps = tuple(steps)
+        self.contrast = contrast
+        self._buffers = [None, None]
+
+    def _scratch(self, index, shape):
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[index] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _grayscale(self, image):
+        if isinstance(image, np.ndarray):
+            array = image
+        else:
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            array = np.asarray(image)
+        if array.ndim == 2:
+            gray = self._scratch(0, array.shape)
+            np.copyto(gray, array)
+            return gray
+        gray = self._scratch(0, array.shape[:2])
+        code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        return cv2.cvtColor(array, code, dst=gray)
+
+    def _other(self, gray):
+        return self._scratch(1 if gray is self._buffers[0] else 0, gray.shape)
+
+    def _contrast(self, gray):
+        # Same as ImageEnhance.Contrast: blend towards the mean grey level
+        mean = int(cv2.mean(gray)[0] + 0.5)
+        return cv2.addWeighted(gray, self.contrast, gray, 0,
+                               mean * (1 - self.contrast), dst=gray)
+
+    def _sharpen(self, gray):
+        return cv2.filter2D(gray, -1, SHARPEN_KERNEL, dst=self._other(gray),
+                            borderType=cv2.BORDER_REPLICATE)
+
+    # One affine warp of the full page from the estimate on a small copy
+    def _deskew(self, gray, orient=False):
+        angle, quarter_turns = estimate_rotation(gray, orient)
+        if abs(angle) < MIN_SKEW:
+            angle = 0.0
+            if quarter_turns == 0:
+                return gray
+        height, width = gray.shape
+        size = (width, height) if quarter_turns % 2 == 0 else (height, width)
+        matrix = _centered(cv2.getRotationMatrix2D(
+            (width / 2, height / 2), quarter_turns * 90 + angle, 1.0),
+            gray.shape, size)
+        out = self._scratch(1 if gray is self._buffers[0] else 0, size[::-1])
+        return cv2.warpAffine(gray, matrix, size, dst=out,
+                              flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
+
+    def _orient(self, gray):
+        return self._deskew(gray, orient=True)
+
+    def _denoise(self, gray):
+        return cv2.medianBlur(gray, DENOISE_KERNEL, dst=self._other(gray))
+
+    def _binarize(self, gray):
+        return cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+            BINARIZE_BLOCK_SIZE, BINARIZE_C, dst=self._other(gray))
+
+    STEPS = {
+        'deskew': _deskew,
+        'orient': _orient,
+        'contrast': _contrast,
+        'sharpen': _sharpen,
+        'denoise': _denoise,
+        'binarize': _binarize,
+        'grayscale': None,
+    }
+
+    def __call__(self, image):
+        gray = self._grayscale(image)
+        for step in self.steps:
+            if step != 'grayscale':
+                gray = self.STEPS[step](self, gray)
+        return gray
+
+
+_local = threading.local()
+
+
+# Function to preprocess a page (PIL image or array) into a grayscale uint8
+# array, using one Preprocessor per thread
+def preprocess_image(image, steps=DEFAULT_STEPS):
+    steps = tuple(steps)
+    preprocessors = getattr(_local, 'preprocessors', None)
+    if preprocessors is None:
+        preprocessors = _local.preprocessors = {}
+    preprocessor = preprocessors.get(steps)
+    if preprocessor is None:
+        preprocessor = preprocessors[steps] = Preprocessor(steps)
+    return preprocessor(image)
@@ -0,0 +1,153 @@
+import collections
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+from PIL import Image
+
+from .letter_fields import (SUBJECT_CLEANUP, extract_letter_fields,
+                            field_texts, fitz_lock)
+
+logger = logging.getLogger(__name__)
+
+# Producer/consumer pipeline for reviewing letters: worker threads OCR the
+# letterhead and render small page previews of the next `ahead` letters
+# while the operator checks the current one, and confirmed letters are
+# renamed on a separate thread. Rendering is serialized by
+# letter_fields.fitz_lock, since PyMuPDF is not thread-safe; the OCR runs
+# in parallel. Nothing here touches Tk; the GUI polls the
+# futures from its own loop.
+
+# Letters prepared ahead of the one under review
+DEFAULT_AHEAD = 3
+# Bounding box (pixels) of one page preview
+THUMBNAIL_SIZE = (360, 510)
+# Pages previewed per letter, the rest are only counted
+MAX_PREVIEW_PAGES = 4
+
+
+# Function to render downscaled previews of the first pages of a PDF,
+# straight at preview size instead of rendering full pages and shrinking them
+def render_thumbnails(pdf_path, size=THUMBNAIL_SIZE,
+                      max_pages=MAX_PREVIEW_PAGES):
+    thumbnails = []
+    with fitz_lock, fitz.open(pdf_path) as pdf_doc:
+        page_count = pdf_doc.page_count
+        for page in pdf_doc.pages(0, min(page_count, max_pages)):
+            zoom = min(size[0] / page.rect.width, size[1] / page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            thumbnails.append(Image.frombytes(
+                'RGB', (pix.width, pix.height), pix.samples))
+    return thumbnails, page_count
+
+
+# Function to OCR a letter's fields and render its previews. Runs on a
+# worker thread; failures are reported in the returned dict.
+def prepare_letter(pdf_path, lang='fas'):
+    letter = {'path': pdf_path, 'fields': None, 'subject': '', 'date': '',
+              'thumbnails': [], 'page_count': 0, 'error': None}
+    try:
+        letter['thumbnails'], letter['page_count'] = render_thumbnails(
+            pdf_path)
+        letter['fields'] = extract_letter_fields(pdf_path, lang)
+        subject, letter['date'] = field_texts(letter['fields'])
+        if subject:
+            # Add PDF name to the beginning of the subject with a hyphen
+            subject = f"{os.path.splitext(os.path.basename(pdf_path))[0]}-{subject}"
+        letter['subject'] = subject
+    except Exception as e:
+        letter['error'] = str(e)
+    return letter
+
+
+# Function to convert Jalali date to Gregorian
+def convert_to_gregorian(persian_date):
+    from persiantools.jdatetime import JalaliDate
+
+    try:
+        year, month, day = map(int, persian_date.split('-'))
+        gregorian_date = JalaliDate(year, month, day).to_gregorian()
+        return gregorian_date.strftime("%d/%m/%Y")
+    except Exception as e:
+        logger.error("Error converting date %s to Gregorian: %s",
+                     persian_date, e)
+        return ''
+
+
+# Function to apply a confirmed review: rename the PDF after its subject and
+# return the (subject, date, Gregorian date) row for the export. A subject
+# with nothing left after cleanup keeps the original file name.
+def apply_review(letter, subject, date_str):
+    date_gregorian = convert_to_gregorian(date_str)
+    # Rename the PDF file with the new subject
+    stem = SUBJECT_CLEANUP.sub('-', subject or '').strip(' -')
+    if stem:
+        new_pdf_path = os.path.join(os.path.dirname(letter['path']),
+                                    f"{stem}.pdf")
+        os.rename(letter['path'], new_pdf_path)
+    return subject, date_str, date_gregorian
+
+
+class ReviewPipeline:
+    def __init__(self, pdf_paths, lang='fas', ahead=DEFAULT_AHEAD,
+                 workers=None):
+        self.lang = lang
+        self.total = len(pdf_paths)
+        self._paths = iter(pdf_paths)
+        self._preparing = collections.deque()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or min(ahead, os.cpu_count() or 1),
+            thread_name_prefix='review-prepare')
+        # One thread, so renames happen in the order they were confirmed
+        self._applier = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='review-apply')
+        self._applied = []
+        for _ in range(max(1, ahead)):
+            self._prepare_next()
+
+    def _prepare_next(self):
+        pdf_path = next(self._paths, None)
+        if pdf_path is not None:
+            self._preparing.append(
+                self._pool.submit(prepare_letter, pdf_path, self.lang))
+
+    # Function to take the future of the next letter, None when all letters
+    # have been handed out. Taking one starts preparing another.
+    def next_letter(self):
+        if not self._preparing:
+            return None
+        future = self._preparing.popleft()
+        self._prepare_next()
+        return future
+
+    # Letters already prepared and waiting for the operator
+    def ready_count(self):
+        return sum(future.done() for future in self._preparing)
+
+    # Function to queue a confirmed letter for renaming, returns its future
+    def confirm(self, letter, subject, date_str):
+        future = self._applier.submit(apply_review, letter, subject, date_str)
+        self._applied.append((letter, future))
+        return future
+
+    def pending_confirmations(self):
+        return sum(not future.done() for _, future in self._applied)
+
+    # Function to collect the export rows of all confirmed letters, in
+    # review order; waits for the renames still running
+    def results(self):
+        rows = []
+        for letter, future in self._applied:
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                logger.error("Error processing %s: %s", letter['path'], e)
+        return rows
+
+    def close(self):
+        for future in self._preparing:
+            future.cancel()
+        self._preparing.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._applier.shutdown(wait=True)
@@ -0,0 +1,77 @@
+# Cheap script detection so each page is OCRed with only the models it
+# needs. Arabic-script words are joined into long connected subwords, while
+# Latin letters stand alone and are rarely much wider than tall, so the
+# share of wide connected components on a downscaled page tells the two
+# apart in a few milliseconds. Pages the classifier is unsure about
+# (mixed, tables, too little text) keep the full language set of the hint.
+
+# Long side of the downscaled copy the statistics are taken on
+DETECT_SIZE = 1000
+# A component is wide when it is this many times the typical glyph height
+WIDE_FACTOR = 1.6
+# Share of wide components at or above which a page is Arabic script, and
+# at or below which it is Latin script
+ARABIC_MIN_WIDE = 0.08
+LATIN_MAX_WIDE = 0.03
+# Fewer glyph-sized components than this is too little text to judge
+MIN_COMPONENTS = 50
+
+# Tesseract languages used for a detected script, per UI language hint.
+# Hints not listed here (e.g. 'math', whose equation model cannot be
+# detected) always get their full set.
+SCRIPT_LANGUAGES = {
+    'fas': {'Arabic': 'fas', 'Latin': 'eng'},
+    'eng': {'Arabic': 'fas', 'Latin': 'eng'},
+    'deu': {'Arabic': 'fas', 'Latin': 'deu'},
+}
+
+
+# Function to classify the script of a page image (PIL or uint8 array).
+# Returns ('Arabic' or 'Latin', confidence 0-1), or (None, 0.0) when the
+# page gives no clear answer.
+def detect_script(image):
+    import cv2
+    import numpy as np
+
+    gray = np.asarray(image)
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+    scale = DETECT_SIZE / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA)
+    binary = cv2.threshold(
+        gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary,
+                                                      connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Drop specks, rules, table borders and pictures
+    keep = (heights >= 2) & (heights <= gray.shape[0] // 20)
+    heights, widths = heights[keep], widths[keep]
+    if len(heights) < MIN_COMPONENTS:
+        return None, 0.0
+
+    # Typical height of a full glyph, ignoring dots and diacritics
+    glyph_height = float(np.median(heights[heights >= np.median(heights)]))
+    glyphs = heights >= glyph_height / 2
+    if glyphs.sum() < MIN_COMPONENTS:
+        return None, 0.0
+    wide = float((widths[glyphs] > glyph_height * WIDE_FACTOR).mean())
+
+    if wide >= ARABIC_MIN_WIDE:
+        return 'Arabic', min(1.0, wide / (2 * ARABIC_MIN_WIDE))
+    if wide <= LATIN_MAX_WIDE:
+        return 'Latin', 1.0 - wide / (2 * LATIN_MAX_WIDE)
+    return None, 0.0
+
+
+# Function to pick the smallest tesseract language set for a page, given
+# the UI language as a hint. Returns None when the hint's full set should be
+# used.
+def detect_languages(image, hint):
+    choices = SCRIPT_LANGUAGES.get(hint)
+    if choices is None:
+        return None
+    script, _ = detect_script(image)
+    return choices.get(script)
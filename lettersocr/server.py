@@ -0,0 +1,535 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from . import instrumentation
+from .page_index import MAX_DISTANCE
+from .page_source import ADAPTIVE_DPI, count_pages
+from .pipeline import (BLANK_PAGE_MODES, TABLE_MODES, close_text_layer,
+                       document_is_rtl, output_pages, process_page)
+from .writers import OUTPUT_FORMATS, output_path_for, write_outputs
+
+logger = logging.getLogger(__name__)
+
+# Local OCR job service: python -m lettersocr.server [--port 8765]
+#
+#   POST   /jobs                 queue a job; the body is either the PDF
+#                                itself (Content-Type: application/pdf) or
+#                                JSON {"path": "C:/letters/a.pdf"}
+#                                (Content-Type: application/json). Options
+#                                (language, formats, tables, dpi, text_layer,
+#                                auto_language, orient_pages, blank_pages,
+#                                blank_max_ink, blank_max_marks,
+#                                duplicate_distance) go in the query string
+#                                or the JSON body.
+#                                ?wait=SECONDS waits for queue space instead
+#                                of failing at once.
+#   GET    /jobs                 all jobs
+#   GET    /jobs/<id>            state and per-page progress
+#   GET    /jobs/<id>/result.<format>
+#   DELETE /jobs/<id>            cancel the job and delete its files
+#   GET    /health               queue depth and capacity
+#
+# Every caller shares one pool of warm worker processes. Pages are the unit
+# of work, so a long PDF does not hold up a short one queued after it. When
+# the queue is full new jobs get 503 with Retry-After, before their upload
+# is read.
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 32
+# Jobs OCRed at the same time; their pages share the pool
+DEFAULT_CONCURRENT_JOBS = 2
+DEFAULT_MAX_UPLOAD_MB = 200
+# Finished jobs and their files are removed after this long
+DEFAULT_KEEP_HOURS = 24
+RETRY_AFTER_SECONDS = 5
+READ_CHUNK = 1024 * 1024
+
+CONTENT_TYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.'
+            'wordprocessingml.document',
+    'txt': 'text/plain; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 403: 'Forbidden',
+           404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+           411: 'Length Required', 413: 'Payload Too Large',
+           415: 'Unsupported Media Type', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Job:
+    def __init__(self, job_id, job_dir, options):
+        self.id = job_id
+        self.dir = job_dir
+        self.options = options
+        self.pdf_path = None
+        self.state = 'queued'
+        self.error = None
+        self.pages_total = None
+        self.pages = {}
+        self.outputs = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def status(self):
+        done = len(self.pages)
+        return {
+            'id': self.id,
+            'state': self.state,
+            'file': os.path.basename(self.pdf_path or ''),
+            'options': self.options,
+            'pages_total': self.pages_total,
+            'pages_done': done,
+            'progress': done / self.pages_total * 100 if self.pages_total else
+            (100.0 if self.state == 'done' else 0.0),
+            'page_errors': {str(n): page['error']
+                            for n, page in sorted(self.pages.items())
+                            if page['error']},
+            'results': {fmt: f"/jobs/{self.id}/result.{fmt}"
+                        for fmt in self.outputs},
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+# Function to turn request options into pipeline options, raising a 400 for
+# anything the pipeline would reject
+def parse_options(values):
+    def value(name, default):
+        raw = values.get(name, default)
+        return raw[-1] if isinstance(raw, list) else raw
+
+    formats = value('formats', 'docx')
+    if isinstance(formats, str):
+        formats = [f.strip() for f in formats.split(',') if f.strip()]
+    dpi = value('dpi', ADAPTIVE_DPI)
+    text_layer = value('text_layer', True)
+    auto_language = value('auto_language', False)
+    orient_pages = value('orient_pages', False)
+    options = {
+        'language': str(value('language', 'fas')),
+        'formats': list(formats),
+        'table_mode': str(value('tables', 'off')),
+        'dpi': dpi,
+        'use_text_layer': text_layer not in (False, 'false', '0', 'no'),
+        'auto_language': auto_language not in (False, 'false', '0', 'no'),
+        'orient_pages': orient_pages not in (False, 'false', '0', 'no'),
+        'blank_pages': str(value('blank_pages', 'empty')),
+        'blank_thresholds': {},
+        'duplicate_distance': None,
+    }
+    if not options['formats'] or set(options['formats']) - set(OUTPUT_FORMATS):
+        raise HttpError(400, f"formats must be some of {', '.join(OUTPUT_FORMATS)}")
+    if options['table_mode'] not in TABLE_MODES:
+        raise HttpError(400, f"tables must be one of {', '.join(TABLE_MODES)}")
+    if options['blank_pages'] not in BLANK_PAGE_MODES:
+        raise HttpError(
+            400, f"blank_pages must be one of {', '.join(BLANK_PAGE_MODES)}")
+    for name, convert in (('max_ink', float), ('max_marks', int)):
+        threshold = value('blank_' + name, None)
+        if threshold is not None:
+            try:
+                options['blank_thresholds'][name] = convert(threshold)
+            except (TypeError, ValueError):
+                raise HttpError(400, f"blank_{name} must be a number")
+    distance = value('duplicate_distance', None)
+    if distance is not None:
+        try:
+            distance = int(distance)
+        except (TypeError, ValueError):
+            distance = None
+        if distance is None or not 0 <= distance <= MAX_DISTANCE:
+            raise HttpError(400, "duplicate_distance must be a number of "
+                                 f"bits from 0 to {MAX_DISTANCE}")
+        options['duplicate_distance'] = distance
+    if dpi != ADAPTIVE_DPI:
+        try:
+            options['dpi'] = int(dpi)
+        except (TypeError, ValueError):
+            raise HttpError(400, f"dpi must be a number or '{ADAPTIVE_DPI}'")
+    return options
+
+
+# Function to tell whether a host (an address or a name such as
+# 'localhost') only stands for loopback addresses
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror as e:
+        raise ValueError(f"Cannot resolve {host}: {e}")
+    # Scoped IPv6 addresses carry their interface after a '%'
+    return bool(infos) and all(
+        ipaddress.ip_address(info[4][0].split('%')[0]).is_loopback
+        for info in infos)
+
+
+# Pool worker entry point for job pages. The workers outlive the jobs, whose
+# files are deleted with them, so the PDF the text layer reader opened is
+# closed again after each page instead of being kept open.
+def process_job_page(task):
+    try:
+        return process_page(task)
+    finally:
+        close_text_layer()
+
+
+class JobServer:
+    def __init__(self, work_dir, workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 concurrent_jobs=DEFAULT_CONCURRENT_JOBS,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024,
+                 keep_seconds=DEFAULT_KEEP_HOURS * 3600, allowed_dirs=()):
+        self.work_dir = work_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.concurrent_jobs = concurrent_jobs
+        self.max_upload_bytes = max_upload_bytes
+        self.keep_seconds = keep_seconds
+        self.allowed_dirs = [os.path.realpath(d) for d in allowed_dirs]
+        self.jobs = {}
+        self._queue = None
+        self._page_slots = None
+        self._pool = None
+        self._server = None
+        self._runners = []
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        if not is_loopback(host):
+            raise ValueError(f"Refusing to listen on non-loopback address {host}")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Keep every worker busy, with one page waiting behind each
+        self._page_slots = asyncio.Semaphore(self.workers * 2)
+        from .startup import warm_up
+        self._pool = ProcessPoolExecutor(self.workers, initializer=warm_up)
+        self._runners = [asyncio.ensure_future(self._run_jobs())
+                         for _ in range(self.concurrent_jobs)]
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port)
+        return self._server
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1')
+                if not request_line.strip():
+                    return
+                method, target, _ = request_line.split(' ', 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1')
+                    if line in ('\r\n', '\n', ''):
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                status, body, extra = await self._route(
+                    method.upper(), target, headers, reader)
+            except HttpError as e:
+                status, body, extra = e.status, {'error': str(e)}, e.headers
+            except (ValueError, UnicodeDecodeError) as e:
+                status, body, extra = 400, {'error': str(e)}, {}
+            except Exception as e:
+                logger.error("Error handling request: %s", e)
+                status, body, extra = 500, {'error': str(e)}, {}
+            await self._respond(writer, status, body, extra)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, headers):
+        headers = dict(headers)
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json; charset=utf-8')
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Length: {len(body)}", 'Connection: close']
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _route(self, method, target, headers, reader):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split('/') if p]
+
+        if parts == ['health'] and method == 'GET':
+            return 200, self.health(), {}
+        if parts == ['jobs']:
+            if method == 'POST':
+                return await self._create_job(query, headers, reader)
+            if method == 'GET':
+                return 200, [job.status() for job in self.jobs.values()], {}
+            raise HttpError(405, 'use GET or POST')
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HttpError(404, f"no job {parts[1]}")
+            if len(parts) == 2 and method == 'GET':
+                return 200, job.status(), {}
+            if len(parts) == 2 and method == 'DELETE':
+                self.delete_job(job)
+                return 200, job.status(), {}
+            if len(parts) == 3 and method == 'GET' and \
+                    parts[2].startswith('result.'):
+                return self._result(job, parts[2][len('result.'):])
+            raise HttpError(405, 'unsupported method for this path')
+        raise HttpError(404, 'unknown path')
+
+    def health(self):
+        return {'queued': self._queue.qsize(), 'queue_size': self.queue_size,
+                'workers': self.workers,
+                'running': sum(1 for job in self.jobs.values()
+                               if job.state == 'running'),
+                'jobs': len(self.jobs)}
+
+    def _result(self, job, fmt):
+        if fmt not in OUTPUT_FORMATS:
+            raise HttpError(404, f"unknown format {fmt}")
+        if job.state != 'done':
+            raise HttpError(409, f"job is {job.state}")
+        path = job.outputs.get(fmt)
+        if path is None or not os.path.exists(path):
+            raise HttpError(404, f"the job did not produce {fmt}")
+        with open(path, 'rb') as f:
+            body = f.read()
+        name = os.path.basename(path).encode('ascii', 'replace').decode()
+        return 200, body, {'Content-Type': CONTENT_TYPES[fmt],
+                           'Content-Disposition': f'attachment; filename="{name}"'}
+
+    def _check_path(self, path):
+        real = os.path.realpath(path)
+        if self.allowed_dirs and not any(
+                os.path.commonpath([real, d]) == d for d in self.allowed_dirs):
+            raise HttpError(403, 'path is outside the allowed folders')
+        if not os.path.isfile(real):
+            raise HttpError(400, f"no such file: {path}")
+        return real
+
+    async def _create_job(self, query, headers, reader):
+        self._prune()
+        wait = float(query.get('wait', ['0'])[-1])
+        # Backpressure before the upload is read: a full queue costs the
+        # caller one round trip, not a transfer
+        if self._queue.full() and wait <= 0:
+            raise HttpError(503, 'the job queue is full',
+                            {'Retry-After': str(RETRY_AFTER_SECONDS)})
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            raise HttpError(411, 'send a Content-Length')
+        length = int(headers.get('content-length', '0'))
+        if length > self.max_upload_bytes:
+            raise HttpError(413, 'the upload is too large')
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.work_dir, job_id)
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        if content_type == 'application/json':
+            request = json.loads(await reader.readexactly(length) or b'{}')
+            if not isinstance(request, dict) or not request.get('path'):
+                raise HttpError(400, 'expected {"path": ...}')
+            job = Job(job_id, job_dir, parse_options(dict(query, **request)))
+            job.pdf_path = self._check_path(request['path'])
+            os.makedirs(job_dir)
+        elif content_type == 'application/pdf':
+            if not length:
+                raise HttpError(400, 'empty upload')
+            job = Job(job_id, job_dir, parse_options(query))
+            name = os.path.basename(query.get('name', ['upload.pdf'])[-1])
+            if not name.lower().endswith('.pdf'):
+                name += '.pdf'
+            os.makedirs(job_dir)
+            job.pdf_path = os.path.join(job_dir, name)
+            try:
+                with open(job.pdf_path, 'wb') as f:
+                    remaining = length
+                    while remaining:
+                        chunk = await reader.read(min(READ_CHUNK, remaining))
+                        if not chunk:
+                            raise HttpError(400, 'the upload was cut short')
+                        f.write(chunk)
+                        remaining -= len(chunk)
+            except BaseException:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+        else:
+            raise HttpError(415, 'send the PDF as application/pdf or a path '
+                                 'as application/json')
+
+        try:
+            if wait > 0:
+                await asyncio.wait_for(self._queue.put(job), wait)
+            else:
+                self._queue.put_nowait(job)
+        except (asyncio.TimeoutError, asyncio.QueueFull):
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise HttpError(503, 'the job queue is full',
+                            {'Retry-After': str(RETRY_AFTER_SECONDS)})
+        self.jobs[job_id] = job
+        return 202, job.status(), {'Location': f"/jobs/{job_id}"}
+
+    def delete_job(self, job):
+        if job.state in ('queued', 'running'):
+            # The runner skips it, or stops before its next page
+            job.state = 'cancelled'
+            job.finished = time.time()
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.dir, ignore_errors=True)
+
+    def _prune(self):
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.finished and now - job.finished > self.keep_seconds:
+                self.delete_job(job)
+
+    async def _run_jobs(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.state == 'queued':
+                    await self._run_job(job)
+            except Exception as e:
+                job.state, job.error = 'failed', str(e)
+                job.finished = time.time()
+            finally:
+                self._queue.task_done()
+
+    async def _run_page(self, job, task):
+        loop = asyncio.get_running_loop()
+        try:
+            _, page = await loop.run_in_executor(self._pool, process_job_page,
+                                                 task)
+        finally:
+            self._page_slots.release()
+        instrumentation.emit(page.pop('events'))
+        job.pages[page['page']] = page
+
+    async def _run_job(self, job):
+        loop = asyncio.get_running_loop()
+        job.state, job.started = 'running', time.time()
+        job.pages_total = await loop.run_in_executor(
+            None, count_pages, job.pdf_path)
+        options = dict(job.options, parallel_cells=False)
+        del options['formats']
+        running = []
+        for page_number in range(1, job.pages_total + 1):
+            await self._page_slots.acquire()
+            if job.state == 'cancelled':
+                self._page_slots.release()
+                break
+            running.append(asyncio.ensure_future(self._run_page(
+                job, (job.pdf_path, page_number, options))))
+        await asyncio.gather(*running)
+        if job.state == 'cancelled':
+            return
+
+        pages = [job.pages[n] for n in sorted(job.pages)]
+        formats = job.options['formats']
+        success = await loop.run_in_executor(
+            None, write_outputs,
+            output_pages(pages, job.options['blank_pages']), job.pdf_path,
+            job.dir, formats,
+            document_is_rtl(pages, job.options['language']))
+        job.outputs = {fmt: output_path_for(job.pdf_path, job.dir, fmt)
+                       for fmt in formats}
+        job.state = 'done' if success else 'failed'
+        if not success:
+            job.error = 'the output files could not be written'
+        job.finished = time.time()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m lettersocr.server',
+        description='Serve OCR jobs to local programs over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='loopback address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--work-dir',
+                        help='folder for uploads and results (default: a '
+                             'temporary folder removed on exit)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='queued jobs before new ones are refused')
+    parser.add_argument('--concurrent-jobs', type=int,
+                        default=DEFAULT_CONCURRENT_JOBS,
+                        help='jobs whose pages are OCRed at the same time')
+    parser.add_argument('--max-upload-mb', type=float,
+                        default=DEFAULT_MAX_UPLOAD_MB)
+    parser.add_argument('--keep-hours', type=float, default=DEFAULT_KEEP_HOURS,
+                        help='how long finished jobs and their files are kept')
+    parser.add_argument('--allow-dir', action='append', default=[],
+                        help='only accept path jobs inside this folder '
+                             '(repeatable; default: any readable file)')
+    return parser
+
+
+async def serve(args, work_dir):
+    server = JobServer(work_dir, args.jobs, args.queue_size,
+                       args.concurrent_jobs,
+                       int(args.max_upload_mb * 1024 * 1024),
+                       args.keep_hours * 3600, args.allow_dir)
+    await server.start(args.host, args.port)
+    print(f"Serving OCR jobs on http://{args.host}:{args.port} "
+          f"with {server.workers} workers", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.work_dir:
+        work_dir, temp_dir = args.work_dir, None
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix='lettersocr-server-')
+        work_dir = temp_dir.name
+    try:
+        asyncio.run(serve(args, work_dir))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
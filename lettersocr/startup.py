@@ -0,0 +1,123 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# What warm_up imports, in the order the first conversion needs it. Each one
+# is timed separately in a startup profile.
+WARM_UP_MODULES = (
+    'numpy',
+    'PIL.Image',
+    'cv2',
+    'pdf2image',
+    'fitz',
+    'pytesseract',
+    'lettersocr.ocr_engine',
+    'lettersocr.ocr_cache',
+    'lettersocr.preprocess',
+    'lettersocr.text_layer',
+    'lettersocr.tables',
+    'docx',
+)
+
+
+# Function to read how long ago the operating system started this process,
+# in seconds, so a profile includes the time before Python ran our first
+# line (e.g. the PyInstaller bootloader). Returns None when unknown.
+def process_age():
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        def to_ticks(filetime):
+            return filetime.dwHighDateTime << 32 | filetime.dwLowDateTime
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        creation, exited, kernel, user, now = (wintypes.FILETIME()
+                                               for _ in range(5))
+        if not kernel32.GetProcessTimes(
+                kernel32.GetCurrentProcess(), ctypes.byref(creation),
+                ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+        kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+        # FILETIMEs count 100 ns ticks
+        return (to_ticks(now) - to_ticks(creation)) / 1e7
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22, counted after the parenthesized command name
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# Timeline of named startup events. `started` is a time.perf_counter()
+# value taken as early as possible in the script; times are reported from
+# process launch when the platform tells us when that was.
+class StartupProfile:
+    def __init__(self, started=None):
+        now = time.perf_counter()
+        self.started = now if started is None else started
+        age = process_age()
+        self.launched = now - age if age is not None else None
+        self.marks = []
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            self.marks.append((name, time.perf_counter()))
+
+    def _origin(self):
+        if self.launched is not None and self.launched < self.started:
+            return self.launched
+        return self.started
+
+    def report(self):
+        origin = self._origin()
+        lines = []
+        if origin != self.started:
+            lines.append(f"{(self.started - origin) * 1000:8.1f} ms  "
+                         "interpreter ready")
+        with self._lock:
+            marks = sorted(self.marks, key=lambda mark: mark[1])
+        previous = self.started
+        for name, moment in marks:
+            lines.append(f"{(moment - origin) * 1000:8.1f} ms  {name} "
+                         f"(+{(moment - previous) * 1000:.1f} ms)")
+            previous = moment
+        return '\n'.join(lines)
+
+
+# Function to import the OCR stack and load libtesseract ahead of the first
+# conversion. Missing optional pieces are reported and skipped; the
+# conversion itself will raise the real error.
+def warm_up(profile=None):
+    for module in WARM_UP_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning("Error importing %s: %s", module, e)
+        if profile:
+            profile.mark(f"import {module}")
+    try:
+        from . import ocr_engine
+        ocr_engine.load_library()
+    except Exception as e:
+        logger.warning("Error loading tesseract: %s", e)
+    if profile:
+        profile.mark('tesseract library loaded')
+
+
+# Function to run warm_up on a daemon thread, returns the thread
+def warm_up_in_background(profile=None):
+    thread = threading.Thread(target=warm_up, args=(profile,),
+                              name='lettersocr-warm-up', daemon=True)
+    thread.start()
+    return thread
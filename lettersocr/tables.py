@@ -0,0 +1,223 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from . import ocr_cache
+from .preprocess import preprocess_image
+
+# Table detection runs on a pyramid level no wider than this (pixels)
+DETECTION_MAX_WIDTH = 1000
+# Length of the line-finding kernels at full resolution, and the minimum
+# they are scaled down to
+LINE_KERNEL = 40
+MIN_LINE_KERNEL = 8
+# Crossings closer than this (pixels) belong to the same grid line
+GRID_TOLERANCE = 8
+# Blank rows (pixels) needed between two text lines inside a cell
+LINE_GAP = 4
+# Cells with fewer dark pixels are treated as empty and not OCRed
+MIN_CELL_INK = 15
+# Cells are small, so a few threads keep tesseract busy without crowding out
+# the page workers
+CELL_WORKERS = min(os.cpu_count() or 1, 4)
+PSM_OPTION = re.compile(r'\s*--psm\s+\d+')
+
+_cell_executor = None
+
+
+# Function to halve an image, keeping the darkest pixel of every 2x2 block so
+# thin ruling lines survive the downscale
+def min_pool(gray):
+    gray = gray[:gray.shape[0] // 2 * 2, :gray.shape[1] // 2 * 2]
+    return np.minimum(np.minimum(gray[0::2, 0::2], gray[1::2, 0::2]),
+                      np.minimum(gray[0::2, 1::2], gray[1::2, 1::2]))
+
+
+def line_masks(thresh, length):
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, length))
+    horizontal_lines = cv2.morphologyEx(
+        thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+    vertical_lines = cv2.morphologyEx(
+        thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+    return horizontal_lines, vertical_lines
+
+
+# Function to find table bounding boxes on a downscaled pyramid level, with
+# kernels and areas scaled to match. Returns full resolution boxes and the
+# Otsu threshold so the refinement binarizes the same way.
+def find_table_boxes(gray):
+    small = gray
+    factor = 1
+    while small.shape[1] > DETECTION_MAX_WIDTH:
+        small = min_pool(small)
+        factor *= 2
+
+    threshold, thresh = cv2.threshold(
+        small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    horizontal_lines, vertical_lines = line_masks(
+        thresh, max(LINE_KERNEL // factor, MIN_LINE_KERNEL))
+
+    table_mask = cv2.bitwise_or(horizontal_lines, vertical_lines)
+    contours, _ = cv2.findContours(
+        table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    pad = 2 * factor
+    height, width = gray.shape
+    for contour in contours:
+        if cv2.contourArea(contour) * factor * factor <= 1000:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        left, top = max(x * factor - pad, 0), max(y * factor - pad, 0)
+        right = min((x + w) * factor + pad, width)
+        bottom = min((y + h) * factor + pad, height)
+        boxes.append((left, top, right - left, bottom - top))
+    return boxes, threshold
+
+
+def detect_and_process_tables(image):
+    # Takes the grayscale array from preprocess_image; PIL pages are converted
+    gray = image if isinstance(image, np.ndarray) else preprocess_image(
+        image, steps=('grayscale',))
+    boxes, threshold = find_table_boxes(gray)
+
+    # Full resolution work happens only inside the detected boxes
+    tables = []
+    for x, y, w, h in boxes:
+        roi = gray[y:y+h, x:x+w]
+        thresh = cv2.threshold(roi, threshold, 255, cv2.THRESH_BINARY_INV)[1]
+        horizontal_lines, vertical_lines = line_masks(thresh, LINE_KERNEL)
+        points = cv2.findNonZero(
+            cv2.bitwise_or(horizontal_lines, vertical_lines))
+        if points is None:
+            continue
+        x, y, w, h = cv2.boundingRect(points)
+        table = find_table_cells(
+            horizontal_lines[y:y+h, x:x+w], vertical_lines[y:y+h, x:x+w])
+        for cell in table['cells']:
+            top, bottom, left, right = cell.pop('box')
+            cell['image'] = roi[y+top:y+bottom, x+left:x+right]
+            cell['mask'] = thresh[y+top:y+bottom, x+left:x+right]
+        tables.append(table)
+
+    return tables
+
+
+# Function to merge nearly equal coordinates into one grid line each
+def cluster_positions(values, tolerance=GRID_TOLERANCE):
+    positions = []
+    for value in sorted(values):
+        if positions and value - positions[-1][-1] <= tolerance:
+            positions[-1].append(value)
+        else:
+            positions.append([value])
+    return [int(round(sum(group) / len(group))) for group in positions]
+
+
+# Function to tell whether a ruling line runs along most of a cell edge
+def has_line(mask, start, end, position, vertical):
+    low = max(position - GRID_TOLERANCE, 0)
+    high = position + GRID_TOLERANCE + 1
+    if vertical:
+        strip = mask[start:end, low:high].max(axis=1, initial=0)
+    else:
+        strip = mask[low:high, start:end].max(axis=0, initial=0)
+    return strip.size > 0 and np.count_nonzero(strip) >= strip.size * 0.5
+
+
+# Function to find the cell grid of one table from its line masks. The grid
+# lines are where horizontal and vertical rulings cross; cells whose shared
+# edge has no ruling are merged into one spanning cell.
+def find_table_cells(horizontal_lines, vertical_lines):
+    height, width = horizontal_lines.shape
+    joints = cv2.dilate(cv2.bitwise_and(horizontal_lines, vertical_lines),
+                        np.ones((5, 5), np.uint8))
+    count, _, _, centroids = cv2.connectedComponentsWithStats(joints)
+    xs = cluster_positions([0, width - 1] + [c[0] for c in centroids[1:]])
+    ys = cluster_positions([0, height - 1] + [c[1] for c in centroids[1:]])
+    rows, cols = len(ys) - 1, len(xs) - 1
+
+    cells = []
+    covered = np.zeros((rows, cols), dtype=bool)
+    for row in range(rows):
+        for col in range(cols):
+            if covered[row, col]:
+                continue
+            col_end = col + 1
+            while col_end < cols and not covered[row, col_end] and not has_line(
+                    vertical_lines, ys[row], ys[row + 1], xs[col_end], True):
+                col_end += 1
+            row_end = row + 1
+            while row_end < rows and not covered[row_end, col:col_end].any() \
+                    and not has_line(horizontal_lines, xs[col], xs[col_end],
+                                     ys[row_end], False):
+                row_end += 1
+            covered[row:row_end, col:col_end] = True
+            # Keep the ruling lines themselves out of the crop
+            inset = GRID_TOLERANCE // 2
+            cells.append({
+                'row': row, 'col': col,
+                'row_span': row_end - row, 'col_span': col_end - col,
+                'box': (ys[row] + inset, max(ys[row_end] - inset, ys[row] + inset + 1),
+                        xs[col] + inset, max(xs[col_end] - inset, xs[col] + inset + 1)),
+            })
+
+    return {'rows': rows, 'cols': cols, 'cells': cells}
+
+
+# Function to count the bands of inked rows in a cell, ignoring the small
+# gaps between a line and its dots or diacritics
+def count_text_lines(mask):
+    lines = 0
+    gap = LINE_GAP
+    for inked in np.count_nonzero(mask, axis=1) > 0:
+        if inked:
+            if gap >= LINE_GAP:
+                lines += 1
+            gap = 0
+        else:
+            gap += 1
+    return lines
+
+
+def _ocr_cell(cell, config):
+    if cv2.countNonZero(cell['mask']) < MIN_CELL_INK:
+        return ''
+    # Single-line cells are read as one text line, others as one block
+    psm = '7' if count_text_lines(cell['mask']) <= 1 else '6'
+    config = f"{PSM_OPTION.sub('', config).strip()} --psm {psm}".strip()
+    text = ocr_cache.image_to_string(cell['image'], config=config)
+    return text.strip()
+
+
+# Function to OCR all cells of a table in cell order, on a shared thread
+# pool unless parallel is False (e.g. when pages already run in parallel)
+def ocr_table_cells(table, config, parallel=True):
+    global _cell_executor
+    if not parallel:
+        return [_ocr_cell(cell, config) for cell in table['cells']]
+    if _cell_executor is None:
+        _cell_executor = ThreadPoolExecutor(max_workers=CELL_WORKERS)
+    return list(_cell_executor.map(
+        lambda cell: _ocr_cell(cell, config), table['cells']))
+
+
+# Function to detect and OCR the tables of a preprocessed page. Returns plain
+# data: [{'rows', 'cols', 'cells': [{'row', 'col', 'row_span', 'col_span',
+# 'text'}]}]
+def extract_tables(gray, config, parallel=True):
+    tables = []
+    for table in detect_and_process_tables(gray):
+        texts = ocr_table_cells(table, config, parallel)
+        tables.append({
+            'rows': table['rows'], 'cols': table['cols'],
+            'cells': [{'row': cell['row'], 'col': cell['col'],
+                       'row_span': cell['row_span'],
+                       'col_span': cell['col_span'], 'text': text}
+                      for cell, text in zip(table['cells'], texts)],
+        })
+    return tables
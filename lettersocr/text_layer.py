@@ -0,0 +1,77 @@
+import os
+
+import fitz
+
+# A page's own text is used only when it has at least this many letters/digits
+MIN_CHARS = 20
+# ...and at least this share of its characters look like real text
+MIN_QUALITY = 0.9
+# Pages mostly covered by images (scans) need text over at least this share
+# of the image area, otherwise the text is just a stamp or a header
+MIN_IMAGE_TEXT_RATIO = 0.3
+IMAGE_PAGE_COVERAGE = 0.5
+
+_open_doc = None
+_open_key = None
+
+
+# Keeps the last opened document around, since pages arrive file by file.
+# Size and modification time are part of the key, so a file rewritten at
+# the same path is opened again.
+def _document(pdf_path):
+    global _open_doc, _open_key
+    stat = os.stat(pdf_path)
+    key = (pdf_path, stat.st_size, stat.st_mtime_ns)
+    if _open_doc is None or _open_key != key:
+        close_document()
+        _open_doc = fitz.open(pdf_path)
+        _open_key = key
+    return _open_doc
+
+
+# Function to close the kept document, so the PDF is not held open (and
+# locked on Windows) once its pages are done
+def close_document():
+    global _open_doc, _open_key
+    if _open_doc is not None:
+        _open_doc.close()
+    _open_doc = _open_key = None
+
+
+def _area(rect):
+    return max(0, rect.x1 - rect.x0) * max(0, rect.y1 - rect.y0)
+
+
+# Share of non-space characters that are printable and not replacement or
+# private-use glyphs, which broken font encodings produce
+def text_quality(text):
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    good = sum(1 for c in chars
+               if c != '\ufffd' and c.isprintable()
+               and not '\ue000' <= c <= '\uf8ff')
+    return good / len(chars)
+
+
+# Function to return the usable text layer of a page (1-based) as paragraphs
+# separated by blank lines, or None when the page has to be OCRed
+def page_text(pdf_path, page_number):
+    page = _document(pdf_path)[page_number - 1]
+    page_area = _area(page.rect) or 1
+
+    blocks = page.get_text('blocks', sort=True)
+    text_blocks = [b for b in blocks if b[6] == 0 and b[4].strip()]
+    text = '\n\n'.join(b[4].strip() for b in text_blocks)
+    if sum(1 for c in text if c.isalnum()) < MIN_CHARS:
+        return None
+    if text_quality(text) < MIN_QUALITY:
+        return None
+
+    image_area = sum(_area(fitz.Rect(b[:4]) & page.rect)
+                     for b in blocks if b[6] == 1)
+    if image_area / page_area >= IMAGE_PAGE_COVERAGE:
+        text_area = sum(_area(fitz.Rect(b[:4])) for b in text_blocks)
+        if text_area / image_area < MIN_IMAGE_TEXT_RATIO:
+            return None
+    return text
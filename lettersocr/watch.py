@@ -0,0 +1,398 @@
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from .cli import parse_formats
+from .page_index import DEFAULT_MAX_DISTANCE, MAX_DISTANCE
+from .pipeline import BLANK_PAGE_MODES, TABLE_MODES, convert_pdfs
+
+logger = logging.getLogger(__name__)
+
+# Watch-folder daemon: python -m lettersocr.watch SCANS_FOLDER [-o OUT]
+#
+# Converts PDFs as they arrive instead of rescanning the whole tree. New or
+# changed files are found with inotify on Linux, or by polling elsewhere
+# (and on network shares, where inotify sees nothing; use --poll). A file is
+# converted once its size and mtime have not changed for --settle seconds,
+# so half-written scans are left alone. Every file's size and mtime is kept
+# in an index, so a restart only looks at files that changed meanwhile.
+
+INDEX_NAME = '.lettersocr_watch.sqlite'
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 10.0
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_pdf(name):
+    return name.lower().endswith('.pdf') and not name.startswith('~$')
+
+
+# Function to yield (path, stat) for every PDF under the folders, without
+# following symlinked folders
+def scan_pdfs(folders):
+    stack = list(folders)
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif is_pdf(entry.name) and entry.is_file():
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+
+# SQLite record of the size, mtime and outcome of every PDF seen, loaded
+# into memory at start so checking tens of thousands of files is a dict
+# lookup each
+class WatchIndex:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL
+            )''')
+        self.entries = {row[0]: (row[1], row[2], row[3]) for row in
+                        self._conn.execute(
+                            'SELECT path, size, mtime_ns, status FROM files')}
+
+    # A file is current when it was converted at exactly this size and
+    # mtime; failed files are tried again by the catch-up scan at the next
+    # start, or as soon as they change
+    def is_current(self, path, stat):
+        entry = self.entries.get(path)
+        return entry == (stat.st_size, stat.st_mtime_ns, 'done')
+
+    def record(self, path, size, mtime_ns, status):
+        with self._lock:
+            self.entries[path] = (size, mtime_ns, status)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (path, size, mtime_ns, status, time.time()))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Reports changed PDFs through inotify. Folders created later are watched
+# as they appear.
+class InotifyWatcher:
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        self._libc = libc
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._folders = {}
+        for folder in folders:
+            self._watch_tree(folder)
+
+    def _watch(self, folder):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder),
+                                          WATCH_MASK)
+        if wd < 0:
+            # e.g. fs.inotify.max_user_watches reached
+            logger.error("Error watching %s: %s", folder,
+                         os.strerror(ctypes.get_errno()))
+            return
+        self._folders[wd] = folder
+
+    def _watch_tree(self, folder):
+        self._watch(folder)
+        for root, dirs, _ in os.walk(folder):
+            for name in dirs:
+                self._watch(os.path.join(root, name))
+
+    # Function to wait up to `timeout` seconds for changes. Returns the
+    # changed PDF paths, or None when events were lost and the caller must
+    # rescan.
+    def changes(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the watch existed
+                    self._watch_tree(path)
+                    paths.extend(p for p, _ in scan_pdfs([path]))
+            elif is_pdf(name):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+# Reports changed PDFs by rescanning the folders every `interval` seconds
+class PollingWatcher:
+    def __init__(self, folders, interval=DEFAULT_POLL_SECONDS):
+        self.folders = folders
+        self.interval = interval
+        self._seen = {path: (stat.st_size, stat.st_mtime_ns)
+                      for path, stat in scan_pdfs(folders)}
+        self._next_scan = time.monotonic() + interval
+
+    def changes(self, timeout):
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self.interval
+        seen = {path: (stat.st_size, stat.st_mtime_ns)
+                for path, stat in scan_pdfs(self.folders)}
+        changed = [path for path, state in seen.items()
+                   if self._seen.get(path) != state]
+        self._seen = seen
+        return changed
+
+    def close(self):
+        pass
+
+
+# Holds candidate files until their size and mtime stop changing
+class Debouncer:
+    def __init__(self, settle=DEFAULT_SETTLE_SECONDS):
+        self.settle = settle
+        self.pending = {}
+
+    def observe(self, path):
+        if path not in self.pending:
+            self.pending[path] = (None, time.monotonic())
+
+    # Function to return the files that have been stable for `settle`
+    # seconds, with their stat, and forget them
+    def ready(self):
+        now = time.monotonic()
+        ready = []
+        for path, (state, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted or renamed before it settled
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != state:
+                self.pending[path] = (current, now)
+            elif stat.st_size and now - since >= self.settle:
+                del self.pending[path]
+                ready.append((path, stat))
+        return ready
+
+
+def _readable(path):
+    # Windows scanners keep the file locked while writing it
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    def __init__(self, folders, index_path, convert_options,
+                 settle=DEFAULT_SETTLE_SECONDS, poll=False,
+                 poll_interval=DEFAULT_POLL_SECONDS):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.index = WatchIndex(index_path)
+        self.convert_options = convert_options
+        self.debouncer = Debouncer(settle)
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.watcher = None
+
+    def _start_watcher(self):
+        if not self.poll and sys.platform.startswith('linux'):
+            try:
+                return InotifyWatcher(self.folders)
+            except (OSError, AttributeError) as e:
+                logger.warning("inotify unavailable, polling instead: %s", e)
+        return PollingWatcher(self.folders, self.poll_interval)
+
+    def _enqueue_changed(self, paths=None):
+        if paths is None:
+            candidates = scan_pdfs(self.folders)
+        else:
+            candidates = []
+            for path in paths:
+                try:
+                    candidates.append((path, os.stat(path)))
+                except OSError:
+                    continue
+        for path, stat in candidates:
+            if not self.index.is_current(path, stat):
+                self.debouncer.observe(path)
+
+    def _process(self, ready):
+        ready = [(path, stat) for path, stat in ready if _readable(path)]
+        if not ready:
+            return
+        print(f"Converting {len(ready)} new or changed file(s)")
+        paths = [path for path, _ in ready]
+        try:
+            # The index decided these need work, so existing outputs are
+            # stale
+            failed_files = set(convert_pdfs(paths, skip_existing=False,
+                                            **self.convert_options))
+        except Exception as e:
+            # Keep watching; the files are recorded as failed below
+            logger.error("Error converting files: %s", e)
+            failed_files = set(paths)
+        for path, stat in ready:
+            status = 'failed' if path in failed_files else 'done'
+            try:
+                self.index.record(path, stat.st_size, stat.st_mtime_ns,
+                                  status)
+            except sqlite3.Error as e:
+                logger.error("Error recording %s in the index: %s", path, e)
+            print(f"{status}: {path}")
+
+    # Function to run until stop() or Ctrl+C
+    def run(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        # Start watching before the catch-up scan so nothing slips between
+        self.watcher = self._start_watcher()
+        self._enqueue_changed()
+        timeout = min(self.debouncer.settle / 2, self.poll_interval)
+        try:
+            while not stop_event.is_set():
+                changed = self.watcher.changes(timeout)
+                # None: the kernel dropped events, fall back to one rescan
+                self._enqueue_changed(changed)
+                self._process(self.debouncer.ready())
+        finally:
+            self.watcher.close()
+            self.index.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m lettersocr.watch',
+        description='Convert PDFs dropped into folders as soon as they are '
+                    'completely written.')
+    parser.add_argument('folders', nargs='+', help='folders to watch')
+    parser.add_argument('-l', '--language', default='fas')
+    parser.add_argument('-o', '--output-dir',
+                        help='folder for the output files (default: next to '
+                             'each PDF)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('-f', '--formats', type=parse_formats,
+                        default=('docx',),
+                        help='comma separated output formats (default: docx)')
+    parser.add_argument('--tables', choices=TABLE_MODES, default='off')
+    parser.add_argument('--auto-language', action='store_true',
+                        help='treat --language as a hint and OCR each page '
+                             'with only the models for its script')
+    parser.add_argument('--orient-pages', action='store_true',
+                        help='turn sideways and upside down pages upright')
+    parser.add_argument('--blank-pages', choices=BLANK_PAGE_MODES,
+                        default='empty',
+                        help='keep blank pages empty, drop them, or OCR '
+                             'them (default: empty)')
+    parser.add_argument('--reuse-duplicates', action='store_true',
+                        help='reuse the OCR result of near-duplicate pages '
+                             'read before')
+    parser.add_argument('--duplicate-distance', type=int,
+                        default=DEFAULT_MAX_DISTANCE,
+                        choices=range(MAX_DISTANCE + 1), metavar='BITS')
+    parser.add_argument('--index',
+                        help=f"index file (default: {INDEX_NAME} in the "
+                             "first folder)")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help='seconds a file must stay unchanged before it '
+                             'is converted')
+    parser.add_argument('--poll', action='store_true',
+                        help='poll instead of using inotify (network shares)')
+    parser.add_argument('--poll-interval', type=float,
+                        default=DEFAULT_POLL_SECONDS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    convert_options = {
+        'language': args.language, 'save_dir': args.output_dir,
+        'workers': max(1, args.jobs),
+        'formats': args.formats,
+        'table_mode': args.tables,
+        'auto_language': args.auto_language,
+        'orient_pages': args.orient_pages,
+        'blank_pages': args.blank_pages,
+        'duplicate_distance': (args.duplicate_distance
+                               if args.reuse_duplicates else None),
+    }
+    index_path = args.index or os.path.join(args.folders[0], INDEX_NAME)
+    watcher = FolderWatcher(args.folders, index_path, convert_options,
+                            args.settle, args.poll, args.poll_interval)
+    print(f"Watching {', '.join(watcher.folders)}", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
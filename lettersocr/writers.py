@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Output formats convert_pdfs can write, by file extension
+OUTPUT_FORMATS = ('docx', 'txt', 'json')
+
+
+# Core properties hold at most this many characters
+MAX_COMMENTS_LENGTH = 255
+
+
+# Function to describe which source produced each (page, source) pair, with
+# runs of pages collapsed ("1-12:ocr 13:text"), cut to fit the comments
+# property
+def page_sources(sources):
+    runs = []
+    for page_number, source in sources:
+        if runs and runs[-1][2] == source and runs[-1][1] + 1 == page_number:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number, source])
+    text = 'page sources: ' + ' '.join(
+        f"{first}:{source}" if first == last else f"{first}-{last}:{source}"
+        for first, last, source in runs)
+    if len(text) > MAX_COMMENTS_LENGTH:
+        text = text[:MAX_COMMENTS_LENGTH - 3].rsplit(' ', 1)[0] + ' ..'
+    return text
+
+
+# Function to write page results as a Word document, one page per page.
+# Paragraphs and tables are streamed into the file page by page, so
+# `pages` may be any iterable and memory does not grow with the page count.
+# Returns False when the written file fails the structural check.
+def write_docx(pages, output_path, rtl=False):
+    from .docx_stream import DocxStreamWriter
+
+    writer = DocxStreamWriter(output_path, rtl)
+    sources = []
+    try:
+        for i, page in enumerate(pages):
+            # Record per page whether the text layer or OCR produced it
+            sources.append((page['page'], page['source']))
+            if i > 0:
+                writer.add_page_break()
+            # Split text into paragraphs and add them to the document
+            for para_text in page['text'].split('\n\n'):
+                if para_text.strip():
+                    writer.add_paragraph(para_text.strip())
+            for table in page.get('tables', ()):
+                writer.add_table(table)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close(page_sources(sources))
+
+
+# Function to write plain text, pages separated by form feeds
+def write_txt(pages, output_path, rtl=False):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\f'.join(page['text'] for page in pages))
+    return True
+
+
+def write_json(pages, output_path, rtl=False):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'pages': pages}, f, ensure_ascii=False, indent=1)
+    return True
+
+
+WRITERS = {'docx': write_docx, 'txt': write_txt, 'json': write_json}
+
+
+def output_path_for(pdf_path, save_dir, fmt='docx'):
+    if save_dir is None:
+        save_dir = os.path.dirname(pdf_path)
+    return os.path.join(save_dir, os.path.basename(
+        os.path.splitext(pdf_path)[0]) + '.' + fmt)
+
+
+# Function to write every requested format, returns True if all succeeded
+def write_outputs(pages, pdf_path, save_dir, formats=('docx',), rtl=False):
+    success = True
+    for fmt in formats:
+        output_path = output_path_for(pdf_path, save_dir, fmt)
+        try:
+            success = WRITERS[fmt](pages, output_path, rtl) and success
+        except Exception as e:
+            logger.error("Error writing %s: %s", output_path, e)
+            success = False
+    return success
@@ -1,63 +1,77 @@
+import multiprocessing
 import os
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-from docx import Document
-from tkinter import Tk, Label, Button, filedialog
+from lettersocr.gui_runner import BackgroundConversion
+from lettersocr.startup import warm_up_in_background
+from lettersocr.writers import output_path_for
+from tkinter import Tk, Label, Button, filedialog, messagebox
+
+conversion = None
+
 
 # Function to check if a corresponding docx file exists
 def docx_exists(pdf_path):
-    docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-    return os.path.exists(docx_path)
+    return os.path.exists(output_path_for(pdf_path, None, 'docx'))
 
-# Function to convert PDF to Word document only if a corresponding docx file doesn't exist
-def convert_pdf_to_word(pdf_path):
-    if not docx_exists(pdf_path):
-        # Convert the PDF to images
-        images = convert_from_path(pdf_path)
 
-        # Create a new Word document
-        doc = Document()
+# Shows an error of the background conversion; runs on the Tk thread
+def show_error(message):
+    messagebox.showerror("Error", message)
 
-        # Loop through each image and extract text using OCR
-        for i, image in enumerate(images):
-            # Save the image as a temporary file
-            image_path = f'temp_image_{i}.jpg'
-            image.save(image_path, 'JPEG')
 
-            # Extract text using OCR
-            text = pytesseract.image_to_string(Image.open(image_path), lang='fas+equ')
+def conversion_done(file_path, failed_files, cancelled):
+    convert_button.config(state='normal')
+    if failed_files:
+        result_label.config(text=f"Conversion failed for {file_path}.")
+    else:
+        result_label.config(text=f"Conversion complete for {file_path}.")
 
-            # Add the extracted text to the Word document
-            doc.add_paragraph(text)
 
-        # Save the Word document with the same name as the PDF file
-        docx_path = os.path.splitext(pdf_path)[0] + '.docx'
-        doc.save(docx_path)
-
-# Function to handle file selection and conversion
+# Function to handle file selection and conversion. The file is converted in
+# the background, so the window stays responsive.
 def select_and_convert():
+    global conversion
     file_path = filedialog.askopenfilename(filetypes=[("PDF files", "*.pdf")])
     if file_path:
         if not docx_exists(file_path):
-            convert_pdf_to_word(file_path)
-            result_label.config(text=f"Conversion complete for {file_path}.")
+            conversion = BackgroundConversion(
+                root, on_error=show_error,
+                on_done=lambda failed_files, cancelled: conversion_done(
+                    file_path, failed_files, cancelled))
+            conversion.start([file_path], 'fas+equ')
+            convert_button.config(state='disabled')
+            result_label.config(text=f"Converting {file_path}...")
         else:
             result_label.config(text=f"Docx file already exists for {file_path}. Skipping OCR.")
 
-# Create UI
-root = Tk()
-root.title("PDF to Docx Converter")
 
-# UI elements
-label = Label(root, text="Select a PDF file to convert:")
-label.pack(pady=10)
+# Stops a running conversion before the window goes away
+def close():
+    if conversion is not None:
+        conversion.cancel()
+    root.destroy()
+
+
+if __name__ == "__main__":
+    # Needed for the worker pool in the frozen executable
+    multiprocessing.freeze_support()
+
+    # Create UI
+    root = Tk()
+    root.title("PDF to Docx Converter")
+    root.protocol("WM_DELETE_WINDOW", close)
+
+    # UI elements
+    label = Label(root, text="Select a PDF file to convert:")
+    label.pack(pady=10)
+
+    convert_button = Button(root, text="Select and Convert", command=select_and_convert)
+    convert_button.pack(pady=10)
 
-convert_button = Button(root, text="Select and Convert", command=select_and_convert)
-convert_button.pack(pady=10)
+    result_label = Label(root, text="")
+    result_label.pack(pady=10)
 
-result_label = Label(root, text="")
-result_label.pack(pady=10)
+    # Load the OCR stack while the user picks a file
+    warm_up_in_background()
 
-# Run the UI loop
-root.mainloop()
+    # Run the UI loop
+    root.mainloop()
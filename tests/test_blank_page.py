@@ -0,0 +1,56 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from lettersocr import benchmark, blank_page
+
+
+def empty_sheet(seed=0, noise=6):
+    rng = np.random.default_rng(seed)
+    page = np.full((2200, 1700), 235, np.float32)
+    page += rng.normal(0, noise, page.shape)
+    return np.clip(page, 0, 255).astype(np.uint8)
+
+
+class BlankPageTest(unittest.TestCase):
+    def test_written_pages_are_not_blank(self):
+        for kind in ('fas_letter', 'eng', 'table'):
+            page = benchmark.draw_page(kind, 200, benchmark._rng(1, kind))
+            self.assertFalse(blank_page.is_blank(page), kind)
+            self.assertFalse(blank_page.is_blank(page.convert('RGB')), kind)
+
+    def test_noisy_empty_sheet_is_blank(self):
+        self.assertTrue(blank_page.is_blank(empty_sheet()))
+
+    def test_border_shadow_dust_and_show_through_are_ignored(self):
+        page = empty_sheet(1)
+        # Edge shadow and punch holes inside the ignored border
+        page[:, :40] = 30
+        cv2.circle(page, (50, 600), 25, 0, -1)
+        cv2.circle(page, (50, 1600), 25, 0, -1)
+        # Specks of dust, and faint text from the back of the sheet
+        for x, y in ((400, 500), (900, 1200), (1300, 300)):
+            page[y:y + 2, x:x + 2] = 0
+        cv2.putText(page, 'show through', (300, 1000),
+                    cv2.FONT_HERSHEY_SIMPLEX, 3, 200, 6)
+        self.assertTrue(blank_page.is_blank(page))
+
+    def test_single_short_line_is_not_blank(self):
+        page = empty_sheet(2)
+        cv2.putText(page, 'Page 2', (700, 1100), cv2.FONT_HERSHEY_SIMPLEX,
+                    2, 0, 4)
+        self.assertFalse(blank_page.is_blank(page))
+        # ...unless the thresholds allow that many marks
+        self.assertTrue(blank_page.is_blank(page, max_marks=10))
+
+    def test_count_marks_ignores_dust(self):
+        ink = np.zeros((100, 100), np.uint8)
+        ink[10, 10] = 1
+        ink[50:53, 50:53] = 1
+        ink[80:82, 20:22] = 1
+        self.assertEqual(blank_page.count_marks(ink), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
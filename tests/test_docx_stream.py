@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import docx
+from docx.oxml.ns import qn
+
+from lettersocr import writers
+from lettersocr.docx_stream import DocxStreamWriter
+
+TABLE = {'rows': 3, 'cols': 3, 'cells': [
+    {'row': 0, 'col': 0, 'row_span': 1, 'col_span': 2, 'text': 'Header'},
+    {'row': 0, 'col': 2, 'row_span': 2, 'col_span': 1, 'text': 'Tall'},
+    {'row': 1, 'col': 0, 'row_span': 1, 'col_span': 1, 'text': '1'},
+    {'row': 1, 'col': 1, 'row_span': 1, 'col_span': 1, 'text': '2'},
+    {'row': 2, 'col': 0, 'row_span': 1, 'col_span': 1, 'text': '3'},
+    {'row': 2, 'col': 1, 'row_span': 1, 'col_span': 1, 'text': '4'},
+    {'row': 2, 'col': 2, 'row_span': 1, 'col_span': 1, 'text': '5'},
+]}
+
+
+class DocxStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'letter.docx')
+
+    def test_round_trip_through_python_docx(self):
+        pages = [
+            {'page': 1, 'source': 'ocr',
+             'text': 'First paragraph\n\nTab\there & <there>\nnext line'},
+            {'page': 2, 'source': 'text', 'text': 'Second page\x0c',
+             'tables': [TABLE]},
+        ]
+        self.assertTrue(writers.write_docx(pages, self.path))
+
+        document = docx.Document(self.path)
+        texts = [p.text for p in document.paragraphs]
+        self.assertEqual(texts[:2], ['First paragraph',
+                                     'Tab\there & <there>\nnext line'])
+        # Page break, then the second page with the invalid char dropped
+        self.assertEqual(texts[3], 'Second page')
+        breaks = document.element.body.findall('.//' + qn('w:br'))
+        self.assertEqual([b.get(qn('w:type')) for b in breaks],
+                         [None, 'page'])
+        self.assertEqual(document.core_properties.comments,
+                         'page sources: 1:ocr 2:text')
+        self.assertEqual(document.styles['Normal'].font.name, 'Arial')
+
+        table = document.tables[0]
+        self.assertEqual((len(table.rows), len(table.columns)), (3, 3))
+        self.assertEqual([[cell.text for cell in row.cells]
+                          for row in table.rows],
+                         [['Header', 'Header', 'Tall'],
+                          ['1', '2', 'Tall'],
+                          ['3', '4', '5']])
+        self.assertIs(table.cell(0, 0)._tc, table.cell(0, 1)._tc)
+        self.assertEqual(table.style.name, 'Table Grid')
+
+    def test_rtl_paragraphs(self):
+        writer = DocxStreamWriter(self.path, rtl=True)
+        writer.add_paragraph('موضوع: گزارش')
+        self.assertTrue(writer.close())
+
+        document = docx.Document(self.path)
+        paragraph = document.paragraphs[0]
+        self.assertEqual(paragraph.text, 'موضوع: گزارش')
+        self.assertIsNotNone(paragraph._p.pPr.find(qn('w:bidi')))
+        self.assertEqual(paragraph.alignment, 2)
+        self.assertEqual(document.styles['Normal'].font.name, 'B Nazanin')
+
+    def test_verify_catches_a_truncated_document(self):
+        writer = DocxStreamWriter(self.path)
+        writer.add_paragraph('text')
+        self.assertTrue(writer.close())
+        writer._written += 1
+        with self.assertLogs('lettersocr.docx_stream', 'ERROR'):
+            self.assertFalse(writer.verify())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from lettersocr import instrumentation
+
+
+class BrokenSink:
+    def handle(self, event):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+
+class EmitTest(unittest.TestCase):
+    def test_failures_are_logged(self):
+        sink = instrumentation.add_sink(BrokenSink())
+        self.addCleanup(instrumentation.remove_sink, sink)
+        with self.assertLogs('lettersocr.instrumentation', 'ERROR') as logs:
+            with self.assertRaises(ValueError):
+                with instrumentation.stage('page', file='a.pdf', page=3):
+                    raise ValueError('bad scan')
+        self.assertEqual(logs.output, [
+            'ERROR:lettersocr.instrumentation:Error processing page 3 of '
+            'a.pdf: bad scan',
+            'ERROR:lettersocr.instrumentation:Error in instrumentation sink '
+            'BrokenSink: disk full'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fitz
+from persiantools.jdatetime import JalaliDate
+
+from lettersocr import letter_fields
+
+TSV_HEADER = ('level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t'
+              'left\ttop\twidth\theight\tconf\ttext')
+
+
+def word(text, left, top=100, width=60, height=20, conf=90):
+    return '\t'.join(map(str, (5, 1, 1, 1, 1, 1, left, top, width, height,
+                                conf, text)))
+
+
+def tsv(*words):
+    # A line-level row and an empty word are skipped by the parser
+    return '\n'.join((TSV_HEADER, '4\t1\t1\t1\t1\t0\t0\t0\t900\t40\t-1\t',
+                      word(' ', 10)) + words)
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_digits_letters_and_marks(self):
+        self.assertEqual(letter_fields.normalize('۱۴۰۲/٠٥/١٢'), '1402/05/12')
+        self.assertEqual(letter_fields.normalize('علي كتاب'), 'علی کتاب')
+        self.assertEqual(letter_fields.normalize('مـوضـوع‏'), 'موضوع')
+        self.assertEqual(letter_fields.normalize('تَاريخ'), 'تاریخ')
+
+
+class ParseDateTest(unittest.TestCase):
+    def test_dates(self):
+        self.assertEqual(letter_fields.parse_date('1402/05/12'),
+                         (JalaliDate(1402, 5, 12), False))
+        self.assertEqual(letter_fields.parse_date('date 1402-5-9 ref'),
+                         (JalaliDate(1402, 5, 9), False))
+        # Day first and two digit years are repaired
+        self.assertEqual(letter_fields.parse_date('12.05.1402'),
+                         (JalaliDate(1402, 5, 12), True))
+        self.assertEqual(letter_fields.parse_date('02/05/12'),
+                         (JalaliDate(1402, 5, 12), True))
+        self.assertEqual(letter_fields.parse_date('99/01/01'),
+                         (JalaliDate(1399, 1, 1), True))
+
+    def test_invalid_dates(self):
+        self.assertIsNone(letter_fields.parse_date('1402/13/40'))
+        self.assertIsNone(letter_fields.parse_date('no date here'))
+        # The first valid date wins
+        self.assertEqual(letter_fields.parse_date('1402/13/40 1401/1/1')[0],
+                         JalaliDate(1401, 1, 1))
+
+
+class FindFieldsTest(unittest.TestCase):
+    def test_labeled_fields_right_to_left(self):
+        fields = letter_fields.find_fields(tsv(
+            word('موضوع:', 800), word('گزارش', 730), word('ماهانه', 660),
+            # Far beyond the value: the next column of the letterhead
+            word('شماره', 300),
+            word('تاریخ:', 800, top=150), word('۱۴۰۲/۰۵/۱۲', 690, top=150,
+                                              width=100, conf=80)))
+        self.assertEqual(letter_fields.field_texts(fields),
+                         ('گزارش ماهانه', '1402-05-12'))
+        self.assertEqual(fields['subject']['box'], (660, 100, 130, 20))
+        self.assertEqual(fields['subject']['confidence'], 0.9)
+        self.assertEqual(fields['date']['value'], JalaliDate(1402, 5, 12))
+        self.assertEqual(fields['date']['confidence'], 0.8)
+
+    def test_value_glued_to_label(self):
+        fields = letter_fields.find_fields(tsv(
+            word('موضوع:درخواست/مرخصی', 700, width=160)))
+        self.assertEqual(fields['subject']['value'], 'درخواست-مرخصی')
+        self.assertIsNone(fields['date'])
+
+    def test_subject_is_cut_to_length(self):
+        words = [word('موضوع', 900)] + [word('کلمه', 840 - 60 * i)
+                                        for i in range(10)]
+        subject = letter_fields.find_fields(tsv(*words))['subject']['value']
+        self.assertLessEqual(len(subject), letter_fields.SUBJECT_LENGTH)
+        self.assertTrue(subject.startswith('کلمه کلمه'))
+
+    def test_unlabeled_and_repaired_date(self):
+        fields = letter_fields.find_fields(tsv(word('12/05/1402', 100)))
+        self.assertEqual(fields['date']['text'], '1402-05-12')
+        self.assertEqual(fields['date']['confidence'], round(
+            0.9 * letter_fields.UNLABELED_WEIGHT *
+            letter_fields.REPAIRED_WEIGHT, 3))
+
+    def test_left_to_right(self):
+        fields = letter_fields.find_fields(tsv(
+            word('موضوع', 100), word('Budget', 170), word('2024', 240)),
+            rtl=False)
+        self.assertEqual(fields['subject']['value'], 'Budget 2024')
+
+    def test_merge_keeps_more_confident_field(self):
+        header = {'subject': None, 'date': {'text': 'a', 'confidence': 0.5}}
+        page = {'subject': {'text': 'b', 'confidence': 0.4},
+                'date': {'text': 'c', 'confidence': 0.9}}
+        self.assertEqual(letter_fields.field_texts(
+            letter_fields.merge_fields(header, page)), ('b', 'c'))
+
+
+class ExtractLetterFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'letter.pdf')
+        document = fitz.open()
+        document.new_page()
+        document.save(self.path)
+        document.close()
+
+    def test_only_the_header_is_read_when_it_has_both_fields(self):
+        header = tsv(word('موضوع:', 800), word('گزارش', 730),
+                     word('تاریخ:', 800, top=150),
+                     word('1402/05/12', 690, top=150, width=100))
+        with mock.patch.object(letter_fields.ocr_engine, 'image_to_data',
+                               return_value=header) as ocr:
+            self.assertEqual(letter_fields.extract_fields(self.path),
+                             ('گزارش', '1402-05-12'))
+        self.assertEqual(ocr.call_count, 1)
+        image = ocr.call_args[0][0]
+        # The top of an A4 page, at the header resolution
+        self.assertAlmostEqual(image.width, 595 * 300 / 72, delta=2)
+        self.assertAlmostEqual(image.height, 842 * 300 / 72 *
+                               letter_fields.HEADER_FRACTION, delta=2)
+
+    def test_full_page_is_read_for_missing_fields(self):
+        pages = [tsv(word('موضوع:', 800), word('گزارش', 730)),
+                 tsv(word('1402/05/12', 100))]
+        with mock.patch.object(letter_fields.ocr_engine, 'image_to_data',
+                               side_effect=pages) as ocr:
+            self.assertEqual(letter_fields.extract_fields(self.path),
+                             ('گزارش', '1402-05-12'))
+        self.assertEqual(ocr.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
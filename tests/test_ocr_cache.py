@@ -0,0 +1,104 @@
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from lettersocr import ocr_cache
+
+# Key, text and no TSV: 40 + 60 bytes per entry
+ENTRY_SIZE = 100
+
+
+def key(name):
+    return name * 40
+
+
+class OcrCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), ocr_cache.CACHE_FILE)
+        # A clock that always moves on, so use order never ties
+        clock = itertools.count(1)
+        patcher = mock.patch.object(ocr_cache.time, 'time',
+                                    lambda: next(clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open(self, max_bytes):
+        cache = ocr_cache.OcrCache(self.path, max_bytes)
+        self.addCleanup(cache.close)
+        return cache
+
+    # Function to list the names of the stored entries and their total size,
+    # checking it against the entries themselves
+    def stored(self, cache):
+        names = sorted(row[0][0] for row in cache._conn.execute(
+            'SELECT key FROM pages'))
+        total = cache._conn.execute('SELECT total FROM meta').fetchone()[0]
+        sizes = cache._conn.execute('SELECT SUM(size) FROM pages').fetchone()
+        self.assertEqual(total, sizes[0] or 0)
+        return names, total
+
+    def test_size_accounting(self):
+        cache = self.open(10 * ENTRY_SIZE)
+        cache.put(key('a'), 'x' * 60)
+        cache.put(key('b'), 'x' * 30, 'y' * 30)
+        self.assertEqual(self.stored(cache), (['a', 'b'], 2 * ENTRY_SIZE))
+        # Replacing an entry counts only its new size
+        cache.put(key('a'), 'x' * 10)
+        self.assertEqual(self.stored(cache), (['a', 'b'], 150))
+        self.assertEqual(cache.get(key('b')), {'text': 'x' * 30,
+                                               'tsv': 'y' * 30})
+        self.assertIsNone(cache.get(key('c')))
+
+    def test_evicts_least_recently_used(self):
+        cache = self.open(3 * ENTRY_SIZE)
+        for name in 'abc':
+            cache.put(key(name), 'x' * 60)
+        cache.get(key('a'))
+        # Over the limit: the least recently used entries go until at most
+        # 90% of it is left
+        cache.put(key('d'), 'x' * 60)
+        self.assertEqual(self.stored(cache), (['a', 'd'], 2 * ENTRY_SIZE))
+        # At the limit nothing is evicted
+        cache.put(key('e'), 'x' * 60)
+        self.assertEqual(self.stored(cache), (['a', 'd', 'e'],
+                                              3 * ENTRY_SIZE))
+        cache.put(key('f'), 'x' * 60)
+        self.assertEqual(self.stored(cache), (['e', 'f'], 2 * ENTRY_SIZE))
+
+    def test_entries_survive_reopening(self):
+        cache = self.open(10 * ENTRY_SIZE)
+        cache.put(key('a'), 'text')
+        cache.close()
+        self.assertEqual(self.open(10 * ENTRY_SIZE).get(key('a'))['text'],
+                         'text')
+
+    def test_key_covers_pixels_layout_and_config(self):
+        image = np.zeros((4, 6), np.uint8)
+        first = ocr_cache.cache_key(image, '--psm 6')
+        self.assertEqual(first, ocr_cache.cache_key(image.copy(), '--psm 6'))
+        self.assertNotEqual(first, ocr_cache.cache_key(image, '--psm 7'))
+        self.assertNotEqual(first, ocr_cache.cache_key(image.reshape(6, 4),
+                                                       '--psm 6'))
+        image[0, 0] = 1
+        self.assertNotEqual(first, ocr_cache.cache_key(image, '--psm 6'))
+
+    def test_image_to_string_reads_through_cache(self):
+        cache = self.open(10 * ENTRY_SIZE)
+        image = np.full((4, 6), 255, np.uint8)
+        with mock.patch.object(ocr_cache.ocr_engine, 'get_engine',
+                               return_value=None), \
+                mock.patch.object(ocr_cache.ocr_engine, 'image_to_string',
+                                  return_value='letter') as engine:
+            for _ in range(2):
+                self.assertEqual(
+                    ocr_cache.image_to_string(image, '--psm 6', cache),
+                    'letter')
+        self.assertEqual(engine.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lettersocr import benchmark, page_index
+
+
+def scan(kind, seed, dpi=200, skew=0, noise=0, rescan=0):
+    page = benchmark.draw_page(kind, dpi, benchmark._rng(seed, kind))
+    page = benchmark.degrade(page, skew, noise,
+                             benchmark._np_rng(seed, kind, rescan))
+    return np.asarray(page)
+
+
+class PageHashTest(unittest.TestCase):
+    def test_rescan_stays_close(self):
+        first = page_index.page_hash(scan('fas_letter', 1, 200))
+        for dpi, skew, noise in ((300, 0.5, 6), (150, -0.4, 10)):
+            rescan = page_index.page_hash(
+                scan('fas_letter', 1, dpi, skew, noise, rescan=1))
+            self.assertLessEqual(page_index.hash_distance(first, rescan),
+                                 page_index.DEFAULT_MAX_DISTANCE)
+
+    def test_same_pixels_same_hash(self):
+        page = scan('table', 2, noise=5)
+        self.assertEqual(page_index.page_hash(page),
+                         page_index.page_hash(page.copy()))
+
+    def test_different_pages_are_far_apart(self):
+        hashes = [page_index.page_hash(scan(kind, seed))
+                  for kind in ('fas_letter', 'eng', 'table')
+                  for seed in (1, 2)]
+        for i, first in enumerate(hashes):
+            self.assertEqual(len(first), page_index.HASH_BITS // 8)
+            for second in hashes[i + 1:]:
+                self.assertGreater(page_index.hash_distance(first, second),
+                                   page_index.DEFAULT_MAX_DISTANCE)
+
+    def test_blank_page_has_no_hash(self):
+        self.assertIsNone(page_index.page_hash(
+            np.full((600, 400), 255, np.uint8)))
+
+
+class PageIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = page_index.PageIndex(
+            os.path.join(tempfile.mkdtemp(), page_index.INDEX_FILE))
+        self.addCleanup(self.index.close)
+        self.hash = page_index.page_hash(scan('eng', 3))
+
+    def test_finds_near_duplicate(self):
+        self.index.add(self.hash, 'eng', 'letter text', '[]', 'a.pdf#1')
+        other = page_index.page_hash(scan('eng', 4))
+        self.index.add(other, 'eng', 'other text', None, 'b.pdf#1')
+        rescan = page_index.page_hash(scan('eng', 3, 300, 0.5, 8, rescan=1))
+        found = self.index.find(rescan, 'eng')
+        self.assertEqual(
+            (found['text'], found['tables'], found['origin']),
+            ('letter text', '[]', 'a.pdf#1'))
+        self.assertEqual(found['distance'],
+                         page_index.hash_distance(self.hash, rescan))
+        self.assertEqual(len(self.index), 2)
+
+    def test_picks_closest_page(self):
+        flipped = bytearray(self.hash)
+        flipped[0] ^= 0xff
+        self.index.add(bytes(flipped), 'eng', 'far', None, 'a.pdf#1')
+        flipped[0] ^= 0x0f
+        self.index.add(bytes(flipped), 'eng', 'near', None, 'b.pdf#1')
+        found = self.index.find(self.hash, 'eng')
+        self.assertEqual((found['text'], found['distance']), ('near', 4))
+
+    def test_config_and_distance_limit(self):
+        self.index.add(self.hash, 'eng', 'text', None, 'a.pdf#1')
+        self.assertIsNone(self.index.find(self.hash, 'fas'))
+        flipped = bytearray(self.hash)
+        flipped[:2] = bytes(b ^ 0xff for b in flipped[:2])
+        self.assertIsNone(self.index.find(bytes(flipped), 'eng', 8))
+        with self.assertRaises(ValueError):
+            self.index.find(self.hash, 'eng', page_index.MAX_DISTANCE + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from lettersocr import page_index, pipeline
+
+PAGES = 40
+
+
+def fake_process_page(task):
+    pdf_path, page_number, options = task
+    # Slow enough that the gate is waiting for a free slot at the error
+    time.sleep(0.05)
+    return pdf_path, {'page': page_number, 'text': f"page {page_number}",
+                      'source': 'ocr', 'error': None, 'events': []}
+
+
+class GatedRunTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.folder, 'letters.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+
+    # An error in the result loop must come out of convert_pdfs, not leave
+    # the pool's task thread waiting in the gate forever
+    def test_callback_error_ends_gated_run(self):
+        calls = []
+
+        def progress(value):
+            calls.append(value)
+            if len(calls) == 3:
+                # Let the gate take the freed slot and wait for the next one
+                time.sleep(0.3)
+                raise RuntimeError('disk full')
+
+        outcome = {}
+
+        def run():
+            try:
+                pipeline.convert_pdfs(
+                    [self.pdf_path], 'eng', self.folder, progress,
+                    workers=2, formats=('txt',), skip_existing=False,
+                    control=control)
+            except Exception as e:
+                outcome['error'] = e
+
+        control = pipeline.RunControl()
+        with mock.patch.object(pipeline, 'count_pages',
+                               return_value=PAGES), \
+                mock.patch.object(pipeline, 'process_page',
+                                  fake_process_page):
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            thread.join(timeout=30)
+        self.assertFalse(thread.is_alive(), 'convert_pdfs did not return')
+        self.assertIsInstance(outcome.get('error'), RuntimeError)
+        self.assertFalse(control.cancelled)
+
+    def test_close_ends_paused_gate(self):
+        control = pipeline.RunControl()
+        control.pause()
+        tasks = control.gate(iter(range(PAGES)), 2)
+        threading.Timer(0.2, control.close).start()
+        self.assertEqual(list(tasks), [])
+
+
+class DuplicateReuseTest(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), 'index.sqlite')
+        patcher = mock.patch.dict(os.environ, {'LETTERSOCR_PAGE_INDEX': path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Open a fresh index for this test, and drop it afterwards
+        page_index._index_pid = None
+        self.addCleanup(setattr, page_index, '_index_pid', None)
+
+    # A rescan at another DPI, as adaptive rendering produces, still
+    # reuses the stored page
+    def test_rescan_at_other_dpi_is_reused(self):
+        from lettersocr import benchmark
+
+        page = benchmark.draw_page('fas_letter', 200,
+                                   benchmark._rng(5, 'fas_letter'))
+        rescan = benchmark.draw_page('fas_letter', 300,
+                                     benchmark._rng(5, 'fas_letter'))
+        configs = []
+
+        def ocr_preprocessed(image, language, config, table_mode,
+                             parallel_cells):
+            configs.append(config)
+            return 'letter text', []
+
+        with mock.patch.object(pipeline, '_ocr_preprocessed',
+                               ocr_preprocessed):
+            first = pipeline._ocr_or_reuse(page, 'fas', 200, None, 'off',
+                                           False, False, 24, 'a.pdf#1')
+            second = pipeline._ocr_or_reuse(rescan, 'fas', 300, None, 'off',
+                                            False, False, 24, 'b.pdf#1')
+        self.assertEqual(first, ('letter text', [], None))
+        self.assertEqual(second, ('letter text', [], 'a.pdf#1'))
+        self.assertEqual(configs, [
+            pipeline.build_config('fas', 200)])
+
+
+class FailedPageTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.folder, 'letters.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+        self.calls = []
+
+    def convert(self, failing_page):
+        def process_page(task):
+            pdf_path, page_number, options = task
+            self.calls.append(page_number)
+            error = 'tesseract crashed' if page_number == failing_page \
+                else None
+            return pdf_path, {'page': page_number, 'text': 'text',
+                              'source': 'ocr', 'error': error, 'events': []}
+
+        with mock.patch.object(pipeline, 'count_pages', return_value=3), \
+                mock.patch.object(pipeline, 'process_page', process_page):
+            return pipeline.convert_pdfs([self.pdf_path], 'eng', workers=1,
+                                         formats=('txt',))
+
+    # The output is written, but the file is reported as failed and its
+    # failed page is tried again by the next run
+    def test_failed_page_fails_file_and_is_retried(self):
+        self.assertEqual(self.convert(failing_page=2), [self.pdf_path])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.folder, 'letters.txt')))
+        self.assertEqual(self.convert(failing_page=None), [])
+        self.assertEqual(self.calls, [1, 2, 3, 2])
+        # A finished file is skipped
+        self.assertEqual(self.convert(failing_page=None), [])
+        self.assertEqual(self.calls, [1, 2, 3, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from lettersocr import benchmark, preprocess
+
+
+def scan(kind, seed=0, skew=0.0, turns=0, dpi=200):
+    page = benchmark.draw_page(kind, dpi, benchmark._rng(seed, kind))
+    page = benchmark.degrade(page, skew, 4, benchmark._np_rng(seed, kind))
+    # np.rot90 turns counterclockwise, like the estimate
+    return np.ascontiguousarray(np.rot90(np.asarray(page), turns))
+
+
+# A page of one word per line, as in lists and forms
+def word_list(seed=0, dpi=200, lines=15):
+    rng = benchmark._rng(seed, 'list')
+    width, height = (int(inches * dpi) for inches in benchmark.PAGE_SIZE)
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    size = round(12 * dpi / 72)
+    font = benchmark.load_font(size)
+    for line in range(lines):
+        draw.text((dpi, dpi + line * int(size * 1.6)),
+                  rng.choice(benchmark.ENG_WORDS).capitalize(), fill=0,
+                  font=font)
+    return np.asarray(page)
+
+
+class EstimateRotationTest(unittest.TestCase):
+    def test_upright_pages_are_not_turned(self):
+        pages = [scan(kind, seed) for kind in ('fas_letter', 'eng', 'table')
+                 for seed in range(3)]
+        pages += [word_list(seed) for seed in range(3)]
+        for number, page in enumerate(pages):
+            self.assertEqual(preprocess.estimate_rotation(page)[1], 0, number)
+
+    def test_quarter_turns_and_skew(self):
+        for kind in ('fas_letter', 'eng', 'deu'):
+            for turns in range(4):
+                angle, quarter_turns = preprocess.estimate_rotation(
+                    scan(kind, skew=2.0, turns=turns))
+                self.assertEqual(quarter_turns, -turns % 4, (kind, turns))
+                self.assertAlmostEqual(angle, -2.0, delta=0.3)
+
+    def test_unsure_pages_are_left_unturned(self):
+        # A table has too few text lines to tell which way up it reads, and
+        # turning it either way could leave it upside down
+        for turns in (1, 2):
+            self.assertEqual(preprocess.estimate_rotation(
+                scan('table', turns=turns))[1], 0)
+        self.assertEqual(preprocess.estimate_rotation(
+            np.full((2200, 1700), 255, np.uint8)), (0.0, 0))
+
+    def test_skew_only(self):
+        angle, quarter_turns = preprocess.estimate_rotation(
+            scan('eng', skew=-3.0, turns=2), orient=False)
+        self.assertEqual(quarter_turns, 0)
+        self.assertAlmostEqual(angle, 3.0, delta=0.3)
+
+
+class PreprocessImageTest(unittest.TestCase):
+    def test_only_orient_steps_turn_pages(self):
+        page = scan('eng', turns=1)
+        self.assertEqual(preprocess.preprocess_image(page).shape, page.shape)
+        turned = preprocess.preprocess_image(page, preprocess.ORIENT_STEPS)
+        self.assertEqual(turned.shape, page.shape[::-1])
+        # Text lines run across the page again
+        self.assertGreater(np.std((turned < 128).sum(axis=1)),
+                           np.std((turned < 128).sum(axis=0)))
+
+    def test_unknown_step(self):
+        with self.assertRaises(ValueError):
+            preprocess.Preprocessor(('grayscale', 'rotate'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import os
+import tempfile
+import unittest
+
+from lettersocr import review
+
+
+class ApplyReviewTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'scan.pdf')
+        open(self.path, 'wb').close()
+
+    def test_renames_after_subject(self):
+        row = review.apply_review({'path': self.path}, 'Budget/2024',
+                                  '1402-01-15')
+        self.assertEqual(os.listdir(self.folder), ['Budget-2024.pdf'])
+        self.assertEqual(row, ('Budget/2024', '1402-01-15', '04/04/2023'))
+
+    def test_blank_subject_keeps_file_name(self):
+        for subject in ('', '   ', '//', None):
+            review.apply_review({'path': self.path}, subject, '')
+            self.assertEqual(os.listdir(self.folder), ['scan.pdf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
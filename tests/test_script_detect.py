@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from lettersocr import benchmark, script_detect
+
+
+def scan(kind, seed, dpi):
+    page = benchmark.draw_page(kind, dpi, benchmark._rng(seed, kind))
+    return benchmark.degrade(page, 0.5 * seed, 5 * seed,
+                             benchmark._np_rng(seed, kind))
+
+
+class DetectScriptTest(unittest.TestCase):
+    def test_scripts_of_synthetic_scans(self):
+        for kind, script in (('fas_letter', 'Arabic'), ('eng', 'Latin'),
+                             ('deu', 'Latin')):
+            for seed in range(3):
+                for dpi in (150, 300):
+                    found, confidence = script_detect.detect_script(
+                        scan(kind, seed, dpi))
+                    self.assertEqual(found, script, (kind, seed, dpi))
+                    self.assertGreater(confidence, 0.5)
+
+    def test_color_pages(self):
+        page = scan('eng', 0, 200).convert('RGB')
+        self.assertEqual(script_detect.detect_script(page)[0], 'Latin')
+
+    def test_too_little_text_is_unsure(self):
+        self.assertEqual(script_detect.detect_script(
+            np.full((2200, 1700), 255, np.uint8)), (None, 0.0))
+
+
+class DetectLanguagesTest(unittest.TestCase):
+    def test_models_follow_hint(self):
+        persian, english = scan('fas_letter', 0, 200), scan('eng', 0, 200)
+        self.assertEqual(script_detect.detect_languages(persian, 'fas'),
+                         'fas')
+        self.assertEqual(script_detect.detect_languages(english, 'fas'),
+                         'eng')
+        self.assertEqual(script_detect.detect_languages(english, 'deu'),
+                         'deu')
+        # Hints without a detectable script keep their full set
+        self.assertIsNone(script_detect.detect_languages(persian, 'math'))
+
+    def test_unsure_page_keeps_full_set(self):
+        blank = np.full((2200, 1700), 255, np.uint8)
+        self.assertIsNone(script_detect.detect_languages(blank, 'fas'))
+
+
+if __name__ == '__main__':
+    unittest.main()
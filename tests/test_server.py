@@ -0,0 +1,45 @@
+import asyncio
+import tempfile
+import unittest
+
+from lettersocr import server
+
+
+async def post(port, content_type, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write((f"POST /jobs HTTP/1.1\r\nContent-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+class JobServerTest(unittest.TestCase):
+    def test_loopback_names(self):
+        self.assertTrue(server.is_loopback('127.0.0.1'))
+        self.assertTrue(server.is_loopback('::1'))
+        self.assertTrue(server.is_loopback('localhost'))
+        self.assertFalse(server.is_loopback('0.0.0.0'))
+        self.assertFalse(server.is_loopback('192.168.1.10'))
+
+    def test_upload_needs_pdf_content_type(self):
+        async def run():
+            job_server = server.JobServer(tempfile.mkdtemp(), workers=1)
+            listener = await job_server.start('localhost', 0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                return await post(port, 'text/plain', b'%PDF-1.4\n')
+            finally:
+                await job_server.close()
+
+        self.assertEqual(asyncio.run(run()), 415)
+
+    def test_refuses_public_address(self):
+        job_server = server.JobServer(tempfile.mkdtemp(), workers=1)
+        with self.assertRaises(ValueError):
+            asyncio.run(job_server.start('0.0.0.0', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from lettersocr import tables
+
+# Grid lines of the drawn table, on a page wide enough to be detected on a
+# downscaled pyramid level
+XS = (300, 900, 1500, 2100)
+YS = (400, 550, 700, 850)
+
+
+def draw_table():
+    page = np.full((1400, 2400), 255, np.uint8)
+    for x in XS:
+        cv2.line(page, (x, YS[0]), (x, YS[-1]), 0, 3)
+    for y in YS:
+        cv2.line(page, (XS[0], y), (XS[-1], y), 0, 3)
+    # Cover the rule between the first two cells of the top row, so they
+    # form one spanning cell
+    cv2.line(page, (XS[1], YS[0] + 3), (XS[1], YS[1] - 3), 255, 7)
+    cv2.putText(page, 'Total', (XS[0] + 40, YS[0] + 100),
+                cv2.FONT_HERSHEY_SIMPLEX, 2, 0, 4)
+    cv2.putText(page, 'one', (XS[2] + 40, YS[2] + 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    cv2.putText(page, 'two', (XS[2] + 40, YS[2] + 130),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    return page
+
+
+class TableGridTest(unittest.TestCase):
+    def test_grid_with_spanning_cell(self):
+        found = tables.detect_and_process_tables(draw_table())
+        self.assertEqual(len(found), 1)
+        table = found[0]
+        self.assertEqual((table['rows'], table['cols']), (3, 3))
+        spans = {(cell['row'], cell['col']):
+                 (cell['row_span'], cell['col_span'])
+                 for cell in table['cells']}
+        self.assertEqual(spans[0, 0], (1, 2))
+        self.assertNotIn((0, 1), spans)
+        self.assertEqual(len(spans), 8)
+
+    def test_empty_page_has_no_tables(self):
+        page = np.full((1400, 2400), 255, np.uint8)
+        self.assertEqual(tables.detect_and_process_tables(page), [])
+
+    def test_cells_get_their_own_psm(self):
+        configs = []
+
+        def image_to_string(image, config=''):
+            configs.append(config)
+            return ' text '
+
+        with mock.patch.object(tables.ocr_cache, 'image_to_string',
+                               image_to_string):
+            found = tables.extract_tables(
+                draw_table(), '--oem 3 --psm 3 -l eng', parallel=False)
+        cells = {(cell['row'], cell['col']): cell['text']
+                 for cell in found[0]['cells']}
+        self.assertEqual(cells[0, 0], 'text')
+        # Empty cells are not OCRed
+        self.assertEqual(cells[1, 1], '')
+        self.assertEqual(sorted(configs), ['--oem 3 -l eng --psm 6',
+                                           '--oem 3 -l eng --psm 7'])
+
+
+if __name__ == '__main__':
+    unittest.main()
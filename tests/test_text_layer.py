@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from lettersocr import text_layer
+
+
+def write_pdf(path, text):
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), text)
+    document.save(path)
+    document.close()
+
+
+class PageTextTest(unittest.TestCase):
+    def tearDown(self):
+        text_layer.close_document()
+
+    def test_rewritten_file_is_read_again(self):
+        path = os.path.join(tempfile.mkdtemp(), 'same.pdf')
+        write_pdf(path, 'The first version of this letter text.')
+        self.assertIn('first version', text_layer.page_text(path, 1))
+        write_pdf(path, 'A different second version of the letter.')
+        # Same size is possible, so also move the modification time
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIn('second version', text_layer.page_text(path, 1))
+
+    def test_close_document(self):
+        path = os.path.join(tempfile.mkdtemp(), 'letter.pdf')
+        write_pdf(path, 'Some letter text that is long enough.')
+        text_layer.page_text(path, 1)
+        text_layer.close_document()
+        self.assertIsNone(text_layer._open_doc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from lettersocr import watch
+
+
+class FolderWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.folder, 'letter.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+        self.watcher = watch.FolderWatcher(
+            [self.folder], os.path.join(self.folder, watch.INDEX_NAME),
+            {'language': 'fas', 'formats': ('docx',)}, settle=0)
+        self.addCleanup(self.watcher.index.close)
+
+    def test_conversion_error_keeps_watching(self):
+        stat = os.stat(self.pdf_path)
+        with mock.patch.object(watch, 'convert_pdfs',
+                               side_effect=ValueError('broken batch')):
+            self.watcher._process([(self.pdf_path, stat)])
+        # Recorded as failed, so it is not skipped as current
+        self.assertEqual(self.watcher.index.entries[self.pdf_path][2],
+                         'failed')
+        self.assertFalse(self.watcher.index.is_current(self.pdf_path, stat))
+
+        with mock.patch.object(watch, 'convert_pdfs', return_value=[]):
+            self.watcher._process([(self.pdf_path, stat)])
+        self.assertTrue(self.watcher.index.is_current(self.pdf_path, stat))
+
+    def test_unknown_format_is_rejected_at_startup(self):
+        with mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+            watch.build_parser().parse_args([self.folder, '-f', 'docx,xls'])
+
+
+if __name__ == '__main__':
+    unittest.main()